@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+"""asyncio interface to the OneDrive API client.
+
+``AsyncOneDriveAPIClient`` mirrors ``onedrive.api.OneDriveAPIClient``
+with coroutines (and asynchronous iterators for ``iterchildren``,
+``walk`` and ``walkn``). Calls are carried out by a wrapped synchronous
+client on a bounded pool of worker threads, so authentication, token
+refreshes, retries, rate limiting and caching behave exactly the same,
+and the event loop is never blocked. Any number of operations may be
+awaited concurrently; at most ``max_workers`` of them are in flight at
+any time (each holding at most one connection, or a few for segmented
+transfers), and the rest wait in line without holding a thread.
+
+Copy monitoring is the exception: it polls natively on the event loop,
+so thousands of copy jobs can be monitored without tying up workers.
+
+Example::
+
+    async def main():
+        async with onedrive.aio.AsyncOneDriveAPIClient() as client:
+            sizes = await asyncio.gather(*[client.getsize(path) for path in paths])
+            async for level, root, dirs, files in client.walkn("Pictures", paths_only=True):
+                print(root)
+
+This module requires Python 3.7 or later.
+
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import threading
+
+import onedrive.api
+
+def _delegate(name):
+    """Make a coroutine method delegating to the synchronous method ``name``."""
+    async def method(self, *args, **kwargs):
+        # pylint: disable=missing-docstring
+        return await self.run(getattr(self.client, name), *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = ("Coroutine version of ``onedrive.api.OneDriveAPIClient.%s``." % name)
+    return method
+
+def _delegate_iterator(name):
+    """Make a method returning an asynchronous iterator over ``name``."""
+    def method(self, *args, **kwargs):
+        # pylint: disable=missing-docstring
+        return _AsyncIterator(self, functools.partial(getattr(self.client, name),
+                                                      *args, **kwargs))
+    method.__name__ = name
+    method.__doc__ = ("Asynchronous iterator version of "
+                      "``onedrive.api.OneDriveAPIClient.%s``." % name)
+    return method
+
+class _AsyncIterator(object):
+    """Asynchronous iterator over a synchronous iterator.
+
+    The synchronous iterator is created, advanced, and closed, on the
+    worker threads of the client; it is closed once exhausted, when the
+    consumer is cancelled, or when this object is closed (``aclose``)
+    or dropped, so that generators holding resources (e.g., the thread
+    pool of a concurrent walk) are cleaned up without waiting for GC.
+
+    """
+
+    def __init__(self, aclient, make_iterator):
+        """Init."""
+        self._aclient = aclient
+        self._make_iterator = make_iterator
+        self._iterator = None
+        self._closed = False
+        # serializes steps and closing of the synchronous iterator, which
+        # may happen on different worker threads
+        self._lock = threading.Lock()
+
+    def __del__(self):
+        """Close the synchronous iterator, in the background."""
+        if not self._closed and self._iterator is not None:
+            self._close_in_background()
+
+    def __aiter__(self):
+        """Return self."""
+        return self
+
+    async def __anext__(self):
+        """Get the next item."""
+        sentinel = object()
+        try:
+            item = await self._aclient.run(self._next, sentinel)
+        except asyncio.CancelledError:
+            # the step in flight cannot be interrupted; close afterwards
+            self._close_in_background()
+            raise
+        if item is sentinel:
+            await self.aclose()
+            raise StopAsyncIteration
+        return item
+
+    async def aclose(self):
+        """Close the synchronous iterator (e.g., when stopping early)."""
+        if not self._closed:
+            await self._aclient.run(self._close)
+
+    def _next(self, sentinel):
+        """Advance the synchronous iterator (on a worker thread)."""
+        with self._lock:
+            if self._closed:
+                return sentinel
+            if self._iterator is None:
+                self._iterator = self._make_iterator()
+            return next(self._iterator, sentinel)
+
+    def _close(self):
+        """Close the synchronous iterator (on a worker thread)."""
+        with self._lock:
+            self._closed = True
+            close = getattr(self._iterator, "close", None)
+            self._iterator = None
+        if close is not None:
+            close()
+
+    def _close_in_background(self):
+        """Schedule ``_close`` on a worker thread, without waiting."""
+        try:
+            self._aclient._executor.submit(self._close)  # pylint: disable=protected-access
+        except RuntimeError:
+            # the client is closed
+            pass
+
+class AsyncOneDriveAPIClient(object):
+    """asyncio interface to ``onedrive.api.OneDriveAPIClient``.
+
+    Can be used as an asynchronous context manager, which closes the
+    client on exit.
+
+    This is not a native asyncio transport: every call (except for copy
+    monitoring) occupies a worker thread while in flight, so no matter
+    how many operations are awaited at once, at most ``max_workers`` of
+    them make progress at any time, and the others wait in line. What
+    it saves is the boilerplate of running the synchronous client in an
+    executor, not threads.
+
+    Asynchronous iterators should be closed with ``aclose`` when not
+    consumed to the end (they are also closed when dropped).
+
+    Parameters
+    ----------
+    client : onedrive.api.OneDriveAPIClient, optional
+        Synchronous client to wrap. Default is a new client, built with
+        ``client_kwargs``.
+    max_workers : int, optional
+        Maximum number of operations in flight (worker threads). The
+        connection pools of the client are sized accordingly. Default
+        is 32.
+
+    Other Parameters
+    ----------------
+    client_kwargs
+        Keyword arguments passed to ``onedrive.api.OneDriveAPIClient``
+        if ``client`` is not given.
+
+    Attributes
+    ----------
+    client : onedrive.api.OneDriveAPIClient
+    max_workers : int
+
+    """
+
+    # pylint: disable=too-many-public-methods
+
+    def __init__(self, client=None, max_workers=32, **client_kwargs):
+        """Init."""
+        if client is None:
+            client = onedrive.api.OneDriveAPIClient(**client_kwargs)
+        self.client = client
+        self.max_workers = max_workers
+        client.set_pool_size(max(10, max_workers))
+        client.set_download_pool_size(max(10, max_workers))
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    async def __aenter__(self):
+        """Enter context."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Close the client."""
+        self.close()
+
+    def close(self):
+        """Stop the worker threads (operations in flight are not waited for)."""
+        self._executor.shutdown(wait=False)
+
+    async def run(self, func, *args, **kwargs):
+        """Run an arbitrary blocking call on a worker thread.
+
+        Useful for calling methods of ``client`` not mirrored by this
+        class.
+
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor,
+                                          functools.partial(func, *args, **kwargs))
+
+    # metadata and listing
+    metadata = _delegate("metadata")
+    metadata_many = _delegate("metadata_many")
+    assert_exists = _delegate("assert_exists")
+    assert_file = _delegate("assert_file")
+    assert_dir = _delegate("assert_dir")
+    exists = _delegate("exists")
+    isfile = _delegate("isfile")
+    isdir = _delegate("isdir")
+    getsize = _delegate("getsize")
+    getmtime = _delegate("getmtime")
+    geturl = _delegate("geturl")
+    children = _delegate("children")
+    iterchildren = _delegate_iterator("iterchildren")
+    listdir = _delegate("listdir")
+    walk = _delegate_iterator("walk")
+    walkn = _delegate_iterator("walkn")
+
+    # transfers
+    upload = _delegate("upload")
+    download = _delegate("download")
+
+    # directories and removal
+    makedirs = _delegate("makedirs")
+    makedirs_many = _delegate("makedirs_many")
+    mkdir = _delegate("mkdir")
+    mkdir_many = _delegate("mkdir_many")
+    rm = _delegate("rm")
+    rm_many = _delegate("rm_many")
+    rmdir_many = _delegate("rmdir_many")
+    remove = _delegate("remove")
+    rmtree = _delegate("rmtree")
+    rmdir = _delegate("rmdir")
+    removedirs = _delegate("removedirs")
+
+    # move and copy
+    move_or_copy = _delegate("move_or_copy")
+    move = _delegate("move")
+    move_many = _delegate("move_many")
+    rename = _delegate("rename")
+    renames = _delegate("renames")
+    rename_many = _delegate("rename_many")
+    batch = _delegate("batch")
+
+    async def copy(self, src, dst, **kwargs):
+        """Coroutine version of ``onedrive.api.OneDriveAPIClient.copy``.
+
+        If ``block`` is ``True`` (default), the copy is monitored with
+        ``monitor_copy`` on the event loop, instead of on a worker
+        thread; ``show_progress`` is not supported.
+
+        """
+        block = kwargs.pop("block", True)
+        monitor_interval = kwargs.pop("monitor_interval", 1)
+        kwargs.pop("show_progress", None)
+        monitor_url = await self.run(self.client.copy, src, dst, block=False, **kwargs)
+        if not block:
+            return monitor_url
+        await self.monitor_copy(monitor_url, monitor_interval=monitor_interval,
+                                src=src, dst=dst)
+
+    async def monitor_copy(self, monitor_url, monitor_interval=1, src=None, dst=None):
+        """Coroutine version of ``onedrive.api.OneDriveAPIClient.monitor_copy``.
+
+        Polls on the event loop (only status requests are made on worker
+        threads); ``show_progress`` is not supported.
+
+        Raises
+        ------
+        onedrive.exceptions.CopyError
+           If the copy operation failed or was cancelled.
+
+        """
+        # pylint: disable=protected-access
+        while True:
+            status_response = await self.run(self.client._get_copy_status, monitor_url)
+            state, text = self.client._copy_status(status_response)
+            if state == "completed":
+                if dst is not None:
+                    self.client._invalidate_metadata(dst, subtree=True)
+                return
+            elif state != "inProgress":
+                raise self.client._copy_error(state, text, status_response, src=src, dst=dst)
+            await asyncio.sleep(max(monitor_interval,
+                                    self.client.retry_policy.retry_after(status_response) or 0))
@@ -4,11 +4,13 @@
 
 # pylint: disable=too-many-lines
 
+import concurrent.futures
 import os
 import logging
 import posixpath
 import subprocess
 import sys
+import threading
 import time
 import urllib.parse
 
@@ -20,20 +22,202 @@ import zmwangx.hash
 import zmwangx.pbar
 
 import onedrive.auth
+import onedrive.batch
+import onedrive.download_helper
 import onedrive.exceptions
+import onedrive.hash_cache
+import onedrive.hash_helper
+import onedrive.index
 import onedrive.log
+import onedrive.metadata_cache
+import onedrive.rename_helper
 import onedrive.save
 import onedrive.upload_helper
 import onedrive.util
+import onedrive.walk_helper
+
+# Presets for the ``fields`` parameter (``$select``) of ``metadata``,
+# ``children``, ``walk``, etc.
+#
+# Fields needed for walking a tree by names only.
+SELECT_PATHS_ONLY = ("name", "folder")
+# Fields needed for the long format of onedrive-ls.
+SELECT_LS_LONG = ("name", "size", "folder")
+# Fields needed for telling files from directories (and empty ones).
+SELECT_ITEM_TYPE = ("name", "file", "folder")
+# Fields needed for downloading a file without another metadata request.
+SELECT_DOWNLOAD = ("name", "size", "folder", "file", "@content.downloadUrl")
+
+def _select_params(fields, required=()):
+    """Build query parameters selecting ``fields`` (plus ``required``).
+
+    Returns
+    -------
+    params : dict or None
+        ``None`` if ``fields`` is ``None`` (i.e., all fields).
+
+    """
+    if fields is None:
+        return None
+    fields = list(fields)
+    fields.extend(field for field in required if field not in fields)
+    return {"$select": ",".join(fields)}
+
+def _in_background(func, *args):
+    """Call ``func(*args)`` in a thread of its own.
+
+    Returns
+    -------
+    future : concurrent.futures.Future
+
+    """
+    future = concurrent.futures.Future()
+
+    def run():
+        """Run the call, unless cancelled."""
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args))
+        except BaseException as err:  # pylint: disable=broad-except
+            future.set_exception(err)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return future
 
 class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
-    """OneDrive API client."""
+    """OneDrive API client.
+
+    Parameters
+    ----------
+    hash_cache : bool or onedrive.hash_cache.HashCache, optional
+        Whether to cache SHA-1 digests of local files on disk (see
+        ``onedrive.hash_cache``), so that unchanged files are not hashed
+        again across uploads, downloads and CLI sessions. A
+        ``HashCache`` instance may be passed to customize the location
+        or size of the cache. Default is ``True``.
+    download_pool_size : int, optional
+        Maximum number of connections kept alive per host by the session
+        used for downloading file content. Default is 10.
+    metadata_cache : bool or onedrive.metadata_cache.MetadataCache, optional
+        Whether to cache metadata objects in memory (see
+        ``onedrive.metadata_cache``), so that repeated lookups of the
+        same path (``metadata``, ``exists``, ``isdir``, etc.) don't hit
+        the network each time. The cache is also populated from
+        ``children`` (hence ``listdir`` and ``walk``), and invalidated
+        by changes made through this client. A ``MetadataCache``
+        instance may be passed to customize the time-to-live or size of
+        the cache. Default is ``False``.
+    index : bool or onedrive.index.RemoteIndex, optional
+        Whether to answer lookups (``metadata`` with selected fields,
+        ``exists``, ``isdir``, ``getsize``, ``listdir`` with names only,
+        etc.) from the local index of remote trees (see
+        ``onedrive.index``) when it covers the path. A ``RemoteIndex``
+        instance may be passed to customize the location or staleness
+        bound of the index. Default is ``None``, i.e., built from the
+        ``index`` section of the config file, if any.
+    retry_policy : onedrive.retry.RetryPolicy, optional
+        Policy for retrying failed requests, chunk uploads and downloads.
+        See ``onedrive.auth.OneDriveOAuthClient``.
+    rate_limiter : onedrive.ratelimit.RateLimiter, optional
+        Client-side limiter of API requests and of bytes uploaded and
+        downloaded. See ``onedrive.auth.OneDriveOAuthClient``.
+    background_refresh : bool, optional
+        Whether to refresh the access token ahead of expiration in a
+        background thread. See ``onedrive.auth.OneDriveOAuthClient``.
+
+    Attributes
+    ----------
+    hash_cache : onedrive.hash_cache.HashCache
+        ``None`` if the hash cache is disabled.
+    download_client : requests.Session
+        Session used for downloading file content (from
+        ``@content.downloadUrl``, which is on a different host than the
+        API). Connections are pooled and reused across downloads.
+    metadata_cache : onedrive.metadata_cache.MetadataCache
+        ``None`` if the metadata cache is disabled.
+    index : onedrive.index.RemoteIndex
+        ``None`` if the index is not used.
+
+    """
 
     # pylint: disable=too-many-public-methods
 
-    def __init__(self):
+    # Status codes with which the download host rejects an expired
+    # download URL.
+    EXPIRED_DOWNLOAD_URL_STATUS_CODES = frozenset([401, 403, 404, 410])
+
+    def __init__(self, hash_cache=True, download_pool_size=10, metadata_cache=False,
+                 index=None, retry_policy=None, rate_limiter=None, background_refresh=False):
         """Init."""
-        super().__init__()
+        super().__init__(retry_policy=retry_policy, rate_limiter=rate_limiter,
+                         background_refresh=background_refresh)
+        if hash_cache is True:
+            hash_cache = onedrive.hash_cache.HashCache()
+        self.hash_cache = hash_cache if hash_cache else None
+        if metadata_cache is True:
+            metadata_cache = onedrive.metadata_cache.MetadataCache()
+        self.metadata_cache = metadata_cache if metadata_cache else None
+        if index is None:
+            index = onedrive.index.RemoteIndex.from_config(self._conf)
+        elif index is True:
+            index = onedrive.index.RemoteIndex()
+        self.index = index if index else None
+        self.download_client = requests.Session()
+        self.set_download_pool_size(download_pool_size)
+
+    def set_download_pool_size(self, pool_size):
+        """Set the connection pool size of ``download_client``.
+
+        Parameters
+        ----------
+        pool_size : int
+            Maximum number of connections kept alive per host.
+
+        """
+        onedrive.util.mount_pooled_adapter(self.download_client, pool_size)
+
+    def _local_sha1sum(self, local_path, show_progress=False):
+        """Get the SHA-1 digest of a local file, from the hash cache if possible.
+
+        Returns
+        -------
+        sha1sum : str
+            Lowercase hexadecimal SHA-1 digest.
+
+        """
+        if self.hash_cache is not None:
+            return self.hash_cache.file_sha1(local_path, show_progress=show_progress)
+        return zmwangx.hash.file_hash(local_path, "sha1", show_progress=show_progress).lower()
+
+    def _invalidate_metadata(self, path, subtree=False):
+        """Drop cached metadata affected by a change to ``path``.
+
+        See ``onedrive.metadata_cache.MetadataCache.invalidate`` and
+        ``onedrive.index.RemoteIndex.invalidate``.
+
+        """
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate(path, subtree=subtree)
+        if self.index is not None:
+            self.index.invalidate(path, subtree=subtree)
+
+    def _lookup(self, path):
+        """Get the metadata of ``path`` needed for type, size and mtime checks.
+
+        Answered from the index if it covers ``path``; otherwise, see
+        ``metadata``.
+
+        """
+        if self.index is not None:
+            hit, metadata = self.index.get(path)
+            if hit:
+                if metadata is None:
+                    raise onedrive.exceptions.FileNotFoundError(path=path)
+                return metadata
+        return self.metadata(path)
 
     def upload(self, directory, local_path, **kwargs):
         """
@@ -86,6 +270,24 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             should only consider setting this to ``True`` when memory
             usage is a serious concern. Only applies to resumable
             upload (simple upload is always streamed).
+        parallel_chunks : int, optional
+            Number of chunks to keep in flight concurrently on the same
+            upload session. Default is 1, i.e., chunks are uploaded one
+            after another. With a value greater than 1, up to that many
+            chunks are held in memory at once (unless ``stream`` is
+            ``True``), and missing ranges reported by the server are
+            resent until the upload completes. Only applies to
+            resumable upload.
+        hash_pipeline : bool, optional
+            Whether to compute the SHA-1 digest of the local file from
+            the chunks as they are read for upload, instead of reading
+            the whole file once more beforehand. Default is ``False``.
+            Only applies to resumable upload with ``compare_hash``, and
+            only when no remote file is in the way (otherwise the digest
+            is needed upfront). In this mode saved sessions are keyed by
+            the size and mtime of the local file instead of its digest;
+            when such a session is resumed, the already uploaded prefix
+            is hashed from disk in the background.
         show_progress : bool, optional
             Whether to print progress information to stderr. Default is
             ``False``. This option applies to both simple and resumable
@@ -118,6 +320,8 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         chunk_size = kwargs.pop("chunk_size", 10485760)
         timeout = kwargs.pop("timeout", 15)
         stream = kwargs.pop("stream", False)
+        parallel_chunks = max(1, kwargs.pop("parallel_chunks", 1))
+        hash_pipeline = kwargs.pop("hash_pipeline", False)
         show_progress = kwargs.pop("show_progress", False)
 
         if conflict_behavior not in {"fail", "replace", "rename"}:
@@ -176,12 +380,20 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
                                        show_progress=show_progress,
                                        remote_metadata=remote_metadata)
 
-        # calculate local file hash
-        if compare_hash:
+        # calculate local file hash (unless it is to be computed on the fly)
+        pipeline = compare_hash and hash_pipeline and remote_metadata is None
+        if pipeline and self.hash_cache is not None and self.hash_cache.get(local_path):
+            # digest already known, no need to compute it on the fly
+            pipeline = False
+        if pipeline:
+            # the digest is unknown until the upload is done, so the
+            # saved session is located by the stat fingerprint instead
+            fingerprint = onedrive.hash_helper.file_fingerprint(local_path)
+            session = onedrive.save.SavedUploadSession(path, fingerprint=fingerprint)
+        elif compare_hash:
             if show_progress:
                 print("%s: hashing progress:" % filename, file=sys.stderr)
-            local_sha1sum = zmwangx.hash.file_hash(
-                local_path, "sha1", show_progress=show_progress).lower()
+            local_sha1sum = self._local_sha1sum(local_path, show_progress=show_progress)
             logging.info("SHA-1 digest of local file '%s': %s", local_path, local_sha1sum)
 
             # if remote exists
@@ -206,97 +418,167 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         else:
             session = None
 
+        total = os.path.getsize(os.path.realpath(local_path))
         if session:
             if show_progress:
                 print("%s: loaded unfinished session from disk" % filename, file=sys.stderr)
                 print("%s: retrieving upload session" % filename, file=sys.stderr)
             upload_url = session.upload_url
-            position = self._get_upload_position(path, upload_url, session)
+            if parallel_chunks > 1:
+                pending = self._get_upload_ranges(path, upload_url, total, session)
+                position = total - sum(end - start for start, end in pending)
+            else:
+                position = self._get_upload_position(path, upload_url, session)
         else:
             upload_url = self._initiate_upload_session(path, conflict_behavior, session)
+            pending = [(0, total)]
             position = 0
 
-        # initiliaze progress bar for the upload
-        total = os.path.getsize(os.path.realpath(local_path))
-        if show_progress:
-            if compare_hash:
-                # print "upload progress:" to distinguish from hashing progress
-                print("%s: upload progress:" % filename, file=sys.stderr)
-            pbar = zmwangx.pbar.ProgressBar(total, preprocessed=position)
-
-        with open(os.path.realpath(local_path), "rb") as fileobj:
-            response = None
-            weird_error = False
-            while position < total:
-                size = min(chunk_size, total - position)
-                if stream:
-                    response = onedrive.upload_helper.stream_put_file_segment(
-                        self, upload_url, fileobj, position, size, total,
-                        timeout=timeout, path=path)
-                else:
-                    fileobj.seek(position)
-                    segment = fileobj.read(size)
-                    response = onedrive.upload_helper.put_file_segment(
-                        self, upload_url, segment, position, size, total,
-                        timeout=timeout, path=path)
+        hasher = None
+        if pipeline:
+            hash_start = position if parallel_chunks == 1 else (pending[0][0] if pending else total)
+            hasher = onedrive.hash_helper.IncrementalHasher(local_path, start=hash_start)
 
-                if response.status_code in {200, 201, 202}:
-                    weird_error = False
-                    position += size
-                    if show_progress:
-                        pbar.update(size)
-                    continue
-                elif response.status_code == 404:
-                    # start over
-                    weird_error = False
-                    upload_url = self._initiate_upload_session(path, conflict_behavior, session)
-                    position = 0
-                    if show_progress:
-                        pbar.force_update(position)
-                    continue
-                elif self._is_weird_upload_error(response):
-                    if weird_error:
-                        # twice in a row, raise
+        try:
+            # initiliaze progress bar for the upload
+            pbar = None
+            if show_progress:
+                if compare_hash and not pipeline:
+                    # print "upload progress:" to distinguish from hashing progress
+                    print("%s: upload progress:" % filename, file=sys.stderr)
+                pbar = zmwangx.pbar.ProgressBar(total, preprocessed=position)
+
+            if parallel_chunks > 1:
+                response, remote_metadata = self._upload_parallel(
+                    path, local_path, upload_url, pending, total,
+                    chunk_size=chunk_size, parallel_chunks=parallel_chunks, timeout=timeout,
+                    stream=stream, conflict_behavior=conflict_behavior, session=session,
+                    hasher=hasher, pbar=pbar)
+                if show_progress:
+                    pbar.finish()
+                if hasher is not None:
+                    local_sha1sum = self._finish_hash_pipeline(local_path, hasher, fingerprint)
+                if compare_hash:
+                    self._upload_verify_hash(local_sha1sum, remote_metadata,
+                                             local_path=local_path, remote_path=path,
+                                             response=response, saved_session=session)
+                if session:
+                    session.discard()
+                self._invalidate_metadata(path)
+                return
+
+            with open(os.path.realpath(local_path), "rb") as fileobj:
+                response = None
+                weird_error = False
+                # number of consecutive failed attempts
+                failures = 0
+                while position < total:
+                    size = min(chunk_size, total - position)
+                    if stream:
+                        response = onedrive.upload_helper.stream_put_file_segment(
+                            self, upload_url, fileobj, position, size, total,
+                            timeout=timeout, path=path, hasher=hasher)
+                    else:
+                        fileobj.seek(position)
+                        segment = fileobj.read(size)
+                        if hasher is not None:
+                            hasher.feed(position, segment)
+                        response = onedrive.upload_helper.put_file_segment(
+                            self, upload_url, segment, position, size, total,
+                            timeout=timeout, path=path)
+
+                    if response.status_code in {200, 201, 202}:
+                        weird_error = False
+                        failures = 0
+                        position += size
+                        if show_progress:
+                            pbar.update(size)
+                        continue
+                    elif response.status_code == 404:
+                        # start over
+                        weird_error = False
+                        failures = 0
+                        upload_url = self._initiate_upload_session(path, conflict_behavior,
+                                                                   session)
+                        position = 0
+                        if show_progress:
+                            pbar.force_update(position)
+                        continue
+                    elif self._is_weird_upload_error(response):
+                        if weird_error:
+                            # twice in a row, raise
+                            raise onedrive.exceptions.UploadError(
+                                path=path, response=response, saved_session=session,
+                                request_desc="chunk upload request")
+                        else:
+                            # set the weird_error flag
+                            weird_error = True
+                    else:
+                        # errored, but not weird
+                        weird_error = False
+
+                    # errored, wait and retry (within the attempt budget)
+                    failures += 1
+                    if failures >= self.retry_policy.upload_max_attempts:
                         raise onedrive.exceptions.UploadError(
                             path=path, response=response, saved_session=session,
                             request_desc="chunk upload request")
-                    else:
-                        # set the weird_error flag and wait
-                        weird_error = True
-                        time.sleep(30)
-                else:
-                    # errored, but not weird
-                    weird_error = False
+                    self.retry_policy.sleep(failures, response,
+                                            max_attempts=self.retry_policy.upload_max_attempts)
+                    position = self._get_upload_position(path, upload_url, session)
+                    if show_progress:
+                        pbar.force_update(position)
 
-                # errored, retry
-                if response.status_code >= 500:
-                    time.sleep(30)
-                else:
-                    time.sleep(3)
-                position = self._get_upload_position(path, upload_url, session)
-                if show_progress:
-                    pbar.force_update(position)
+            # finished uploading the entire file
+            if show_progress:
+                pbar.finish()
+            self._invalidate_metadata(path)
 
-        # finished uploading the entire file
-        if show_progress:
-            pbar.finish()
+            # already uploaded all available chunks, but the status code
+            # returned for the last chunk is not 200 OK or 201 Created
+            if response.status_code not in {200, 201}:
+                raise onedrive.exceptions.UploadError(
+                    path=path, response=response, saved_session=session,
+                    request_desc="chunk upload request")
 
-        # already uploaded all available chunks, but the status code
-        # returned for the last chunk is not 200 OK or 201 Created
-        if response.status_code not in {200, 201}:
-            raise onedrive.exceptions.UploadError(
-                path=path, response=response, saved_session=session,
-                request_desc="chunk upload request")
+            # verify file hash
+            if hasher is not None:
+                local_sha1sum = self._finish_hash_pipeline(local_path, hasher, fingerprint)
+            if compare_hash:
+                kwargs = {"local_path": local_path, "remote_path": path,
+                          "response": response, "saved_session": session}
+                self._upload_verify_hash(local_sha1sum, response.json(), **kwargs)
 
-        # verify file hash
-        if compare_hash:
-            kwargs = {"local_path": local_path, "remote_path": path,
-                      "response": response, "saved_session": session}
-            self._upload_verify_hash(local_sha1sum, response.json(), **kwargs)
+            # success
+            if session:
+                session.discard()
+        finally:
+            if hasher is not None:
+                hasher.close()
 
-        # success
-        if session:
-            session.discard()
+    def _finish_hash_pipeline(self, local_path, hasher, fingerprint):
+        """Get the digest from a hash pipeline and record it in the hash cache.
+
+        Parameters
+        ----------
+        local_path : str
+        hasher : onedrive.hash_helper.IncrementalHasher
+        fingerprint : str
+            Fingerprint of the local file when the upload started. The
+            digest is only cached if the file hasn't changed since.
+
+        Returns
+        -------
+        sha1sum : str
+            Lowercase hexadecimal SHA-1 digest.
+
+        """
+        local_sha1sum = hasher.hexdigest()
+        logging.info("SHA-1 digest of local file '%s': %s", local_path, local_sha1sum)
+        if (self.hash_cache is not None and
+                onedrive.hash_helper.file_fingerprint(local_path) == fingerprint):
+            self.hash_cache.put(local_path, local_sha1sum)
+        return local_sha1sum
 
     def _simple_upload(self, directory, local_path, **kwargs):
         """
@@ -326,7 +608,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         if compare_hash:
             if show_progress:
                 sys.stderr.write("\r%s: hashing..." % filename)
-            local_sha1sum = zmwangx.hash.file_hash(local_path, "sha1").lower()
+            local_sha1sum = self._local_sha1sum(local_path)
             logging.info("SHA-1 digest of local file '%s': %s", local_path, local_sha1sum)
 
             # if remote exists
@@ -351,6 +633,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             put_response = self.put("drive/root:/%s:/content" % encoded_path,
                                     params={"@name.conflictBehavior": conflict_behavior},
                                     data=fileobj)
+            self._invalidate_metadata(path)
             if put_response.status_code in {200, 201}:
                 if show_progress:
                     sys.stderr.write("\r%s: upload complete" % filename)
@@ -437,21 +720,11 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         onedrive.exceptions.UploadError
 
         """
-        try:
-            status_response = self.get(upload_url, path=path)
-        except requests.exceptions.RequestException as err:
-            logging.error(str(err))
-            raise
-        if status_response.status_code != 200:
-            raise onedrive.exceptions.UploadError(
-                path=path, response=status_response, saved_session=session,
-                request_desc="upload session status request")
-        expected_ranges = status_response.json()["nextExpectedRanges"]
+        expected_ranges, status_response = self._get_expected_ranges(path, upload_url, session)
 
         # no remaining range
         if not expected_ranges:
-            time.sleep(30)
-            if self.exists(path):
+            if self._wait_for_item(path) is not None:
                 return
             else:
                 raise onedrive.exceptions.UploadError(
@@ -467,6 +740,257 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         # single range, return position
         return int(expected_ranges[0].split("-")[0])
 
+    def _get_expected_ranges(self, path, upload_url, session=None):
+        """Query the status of an upload session.
+
+        Parameters
+        ----------
+        path : str
+            Remote path being uploaded to.
+        upload_url : str
+            The upload URL (without access code) as returned by the upload API.
+        session : onedrive.save.SavedUploadSession
+
+        Returns
+        -------
+        expected_ranges : list
+            The ``nextExpectedRanges`` list of strings, e.g.,
+            ``["0-1023", "4096-"]``.
+        status_response : requests.Response
+
+        Raises
+        ------
+        onedrive.exceptions.UploadError
+
+        """
+        try:
+            status_response = self.get(upload_url, path=path)
+        except requests.exceptions.RequestException as err:
+            logging.error(str(err))
+            raise
+        if status_response.status_code != 200:
+            raise onedrive.exceptions.UploadError(
+                path=path, response=status_response, saved_session=session,
+                request_desc="upload session status request")
+        return status_response.json()["nextExpectedRanges"], status_response
+
+    def _get_upload_ranges(self, path, upload_url, total, session=None):
+        """Get the byte ranges still missing from an upload session.
+
+        Parameters
+        ----------
+        path : str
+            Remote path being uploaded to.
+        upload_url : str
+            The upload URL (without access code) as returned by the upload API.
+        total : int
+            Total size of the file being uploaded.
+        session : onedrive.save.SavedUploadSession
+
+        Returns
+        -------
+        ranges : list
+            A list of ``(start, end)`` pairs, where ``end`` is the last
+            missing byte plus one.
+
+        Raises
+        ------
+        onedrive.exceptions.UploadError
+
+        """
+        expected_ranges, _ = self._get_expected_ranges(path, upload_url, session)
+        ranges = []
+        for expected_range in expected_ranges:
+            start, _, end = expected_range.partition("-")
+            ranges.append((int(start), int(end) + 1 if end else total))
+        return ranges
+
+    def _upload_parallel(self, path, local_path, upload_url, pending, total, **kwargs):
+        """Upload the missing ranges of a file with multiple chunks in flight.
+
+        Chunks are read from disk in order and handed to a thread pool
+        that keeps up to ``parallel_chunks`` PUT requests in flight on
+        the same upload URL. Whenever a round of chunks is exhausted
+        without completing the upload (e.g., because some chunks
+        errored out), the server is asked for the ranges still missing,
+        and those ranges are sent again.
+
+        Parameters
+        ----------
+        path : str
+            Remote path being uploaded to.
+        local_path : str
+            Path to the local file being uploaded.
+        upload_url : str
+            The upload URL (without access code).
+        pending : list
+            List of ``(start, end)`` pairs of ranges to upload.
+        total : int
+            Total size of the file.
+
+        Other Parameters
+        ----------------
+        chunk_size, parallel_chunks, timeout, stream, conflict_behavior
+            See ``upload``.
+        session : onedrive.save.SavedUploadSession, optional
+        hasher : onedrive.hash_helper.IncrementalHasher, optional
+            Hasher fed with each chunk read for upload.
+        pbar : zmwangx.pbar.ProgressBar, optional
+
+        Returns
+        -------
+        response : requests.Response
+            The response that finished the upload session.
+        remote_metadata : dict
+            Metadata object of the uploaded file.
+
+        Raises
+        ------
+        onedrive.exceptions.UploadError
+
+        """
+        chunk_size = kwargs.pop("chunk_size")
+        parallel_chunks = kwargs.pop("parallel_chunks")
+        timeout = kwargs.pop("timeout", None)
+        stream = kwargs.pop("stream", False)
+        conflict_behavior = kwargs.pop("conflict_behavior", "fail")
+        session = kwargs.pop("session", None)
+        hasher = kwargs.pop("hasher", None)
+        pbar = kwargs.pop("pbar", None)
+
+        def put_chunk(start, length, segment=None):
+            """PUT a single chunk; runs in a worker thread."""
+            if segment is not None:
+                return onedrive.upload_helper.put_file_segment(
+                    self, upload_url, segment, start, length, total,
+                    timeout=timeout, path=path)
+            # streaming: each worker needs its own file object
+            with open(local_path, "rb") as chunk_fileobj:
+                return onedrive.upload_helper.stream_put_file_segment(
+                    self, upload_url, chunk_fileobj, start, length, total,
+                    timeout=timeout, path=path, hasher=hasher)
+
+        weird_error = False
+        # number of consecutive rounds with failed chunks
+        failures = 0
+        with open(local_path, "rb") as fileobj, \
+             concurrent.futures.ThreadPoolExecutor(max_workers=parallel_chunks) as executor:
+            while True:
+                chunks = ((start, min(chunk_size, range_end - start))
+                          for range_start, range_end in pending
+                          for start in range(range_start, range_end, chunk_size))
+                in_flight = {}
+                finished_response = None
+                failed_response = None
+                session_lost = False
+                weird_in_round = False
+                while True:
+                    # top up the pipeline, unless the session is gone
+                    while len(in_flight) < parallel_chunks and not session_lost:
+                        try:
+                            start, length = next(chunks)
+                        except StopIteration:
+                            break
+                        if stream:
+                            future = executor.submit(put_chunk, start, length)
+                        else:
+                            fileobj.seek(start)
+                            segment = fileobj.read(length)
+                            if hasher is not None:
+                                hasher.feed(start, segment)
+                            future = executor.submit(put_chunk, start, length, segment)
+                        in_flight[future] = (start, length)
+                    if not in_flight:
+                        break
+
+                    done, _ = concurrent.futures.wait(
+                        in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        start, length = in_flight.pop(future)
+                        response = future.result()
+                        if response.status_code in {200, 201, 202}:
+                            if response.status_code in {200, 201}:
+                                finished_response = response
+                            if pbar is not None:
+                                pbar.update(length)
+                        elif response.status_code == 404:
+                            session_lost = True
+                        else:
+                            failed_response = response
+                            if self._is_weird_upload_error(response):
+                                weird_in_round = True
+
+                if finished_response is not None:
+                    return finished_response, finished_response.json()
+
+                if session_lost:
+                    # start over
+                    weird_error = False
+                    failures = 0
+                    upload_url = self._initiate_upload_session(path, conflict_behavior, session)
+                    pending = [(0, total)]
+                    if pbar is not None:
+                        pbar.force_update(0)
+                    continue
+
+                if weird_in_round:
+                    if weird_error:
+                        # twice in a row, raise
+                        raise onedrive.exceptions.UploadError(
+                            path=path, response=failed_response, saved_session=session,
+                            request_desc="chunk upload request")
+                    weird_error = True
+                else:
+                    weird_error = False
+
+                # errored (or the finishing response got lost), wait and
+                # query the server for the holes to fill
+                if failed_response is not None:
+                    failures += 1
+                    if failures >= self.retry_policy.upload_max_attempts:
+                        raise onedrive.exceptions.UploadError(
+                            path=path, response=failed_response, saved_session=session,
+                            request_desc="chunk upload request")
+                    self.retry_policy.sleep(
+                        failures, failed_response,
+                        max_attempts=self.retry_policy.upload_max_attempts)
+                else:
+                    failures = 0
+                pending = self._get_upload_ranges(path, upload_url, total, session)
+                if not pending:
+                    # every byte is there; the file should materialize shortly
+                    remote_metadata = self._wait_for_item(path)
+                    if remote_metadata is None:
+                        raise onedrive.exceptions.UploadError(
+                            msg="no missing ranges, but file still does not exist on OneDrive",
+                            path=path, saved_session=session)
+                    return failed_response, remote_metadata
+                if pbar is not None:
+                    pbar.force_update(total - sum(end - start for start, end in pending))
+
+    def _wait_for_item(self, path):
+        """Wait for an item to materialize (e.g., after an upload).
+
+        The item is polled with delays given by ``retry_policy``, within
+        its attempt budget.
+
+        Returns
+        -------
+        metadata : dict or None
+            Metadata object of the item, or ``None`` if it still doesn't
+            exist after the last attempt.
+
+        """
+        for attempt in range(1, self.retry_policy.max_attempts + 1):
+            self.retry_policy.sleep(attempt, reason="'%s' does not exist yet" % path)
+            # don't trust a cached negative
+            self._invalidate_metadata(path)
+            try:
+                return self.metadata(path)
+            except onedrive.exceptions.FileNotFoundError:
+                continue
+        return None
+
     @staticmethod
     def _is_weird_upload_error(response):
         """Check if a response got during resumable upload is unhandleable.
@@ -549,39 +1073,127 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             raise onedrive.exceptions.UploadError(
                 msg=msg, path=remote_path, response=response, saved_session=saved_session)
 
-    def metadata(self, path):
+    def metadata(self, path, fields=None):
         """Get metadata of a file or directory.
 
         Parameters
         ----------
         path : str
             Path of remote item.
+        fields : list, optional
+            Names of the (top-level) properties to request, e.g.,
+            ``["name", "size", "file"]`` (the ``$select`` query
+            parameter); see ``SELECT_*`` for presets. Default is
+            ``None``, i.e., all properties.
 
         Returns
         -------
         metadata : dict
             The JSON object as returned by the API:
-            https://dev.onedrive.com/items/get.htm.
+            https://dev.onedrive.com/items/get.htm. If ``fields`` is
+            specified, it may only contain the requested properties.
 
         Raises
         ------
         onedrive.exceptions.FileNotFoundError
             If requested item is not found.
 
+        Notes
+        -----
+        If the metadata cache is enabled, the returned object may be
+        shared with the cache, and should not be modified. A cached
+        object is returned in full even if ``fields`` is specified;
+        objects with only selected fields are not cached.
+
+        If the index is used and covers ``path``, requests with
+        ``fields`` among ``onedrive.index.INDEX_FIELDS`` are answered
+        from the index.
+
         """
+        if self.metadata_cache is not None:
+            hit, metadata = self.metadata_cache.get(path)
+            if hit:
+                if metadata is None:
+                    raise onedrive.exceptions.FileNotFoundError(path=path)
+                return metadata
+        if (self.index is not None and fields is not None and
+                set(fields) <= set(onedrive.index.INDEX_FIELDS)):
+            hit, metadata = self.index.get(path)
+            if hit:
+                if metadata is None:
+                    raise onedrive.exceptions.FileNotFoundError(path=path)
+                return metadata
+
         encoded_path = urllib.parse.quote(path)
         logging.info("requesting '%s'", encoded_path)
-        metadata_response = self.get("drive/root:/%s" % encoded_path)
+        metadata_response = self.get("drive/root:/%s" % encoded_path,
+                                     params=_select_params(fields))
+        return self._metadata_result(path, metadata_response, fields=fields)
+
+    def _metadata_result(self, path, metadata_response, fields=None):
+        """Interpret the response to a metadata request (see ``metadata``)."""
         status_code = metadata_response.status_code
         if status_code == 200:
-            return metadata_response.json()
+            metadata = metadata_response.json()
+            if self.metadata_cache is not None and fields is None:
+                self.metadata_cache.put(path, metadata)
+            return metadata
         elif status_code == 404:
+            if self.metadata_cache is not None:
+                self.metadata_cache.put_missing(path)
             raise onedrive.exceptions.FileNotFoundError(path=path)
         else:
             raise onedrive.exceptions.APIRequestError(
                 response=metadata_response,
                 request_desc="metadata request for '%s'" % path)
 
+    def metadata_many(self, paths, fields=None, jobs=1):
+        """Get metadata of multiple items, in batches.
+
+        Parameters
+        ----------
+        paths : list
+            Paths of remote items.
+        fields : list, optional
+            See ``metadata``.
+        jobs : int, optional
+            Number of batches in flight at once. Default is 1.
+
+        Returns
+        -------
+        results : list
+            For each path, in order, the metadata object, or the
+            exception instance that ``metadata`` would have raised
+            (e.g., ``onedrive.exceptions.FileNotFoundError``).
+
+        Raises
+        ------
+        onedrive.exceptions.APIRequestError
+            If a batch request itself fails.
+
+        """
+        results = [None] * len(paths)
+        pending = []
+        for index, path in enumerate(paths):
+            if self.metadata_cache is not None:
+                hit, metadata = self.metadata_cache.get(path)
+                if hit:
+                    results[index] = (metadata if metadata is not None else
+                                      onedrive.exceptions.FileNotFoundError(path=path))
+                    continue
+            pending.append(index)
+
+        sub_requests = [
+            onedrive.batch.BatchRequest("get", "drive/root:/%s" % urllib.parse.quote(paths[index]),
+                                        params=_select_params(fields))
+            for index in pending]
+        for index, response in zip(pending, self.batch(sub_requests, jobs=jobs)):
+            try:
+                results[index] = self._metadata_result(paths[index], response, fields=fields)
+            except onedrive.exceptions.GeneralAPIException as err:
+                results[index] = err
+        return results
+
     def assert_exists(self, path):
         """Assert that ``path`` exists on OneDrive.
 
@@ -597,7 +1209,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
 
         """
         try:
-            self.metadata(path)
+            self._lookup(path)
             return
         except onedrive.exceptions.FileNotFoundError:
             raise
@@ -619,7 +1231,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
 
         """
         try:
-            metadata = self.metadata(path)
+            metadata = self._lookup(path)
             if "file" not in metadata:
                 raise onedrive.exceptions.IsADirectoryError(path=path)
         except onedrive.exceptions.FileNotFoundError:
@@ -642,7 +1254,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
 
         """
         try:
-            metadata = self.metadata(path)
+            metadata = self._lookup(path)
             if "folder" not in metadata:
                 raise onedrive.exceptions.NotADirectoryError(path=path)
         except onedrive.exceptions.FileNotFoundError:
@@ -727,7 +1339,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
 
         """
         try:
-            metadata = self.metadata(path)
+            metadata = self._lookup(path)
             return metadata["size"]
         except onedrive.exceptions.FileNotFoundError:
             raise
@@ -752,7 +1364,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
 
         """
         try:
-            metadata = self.metadata(path)
+            metadata = self._lookup(path)
             return arrow.get(metadata["lastModifiedDateTime"]).timestamp
         except onedrive.exceptions.FileNotFoundError:
             raise
@@ -781,7 +1393,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         except onedrive.exceptions.FileNotFoundError:
             raise
 
-    def children(self, path):
+    def children(self, path, fields=None):
         """List children of an item.
 
         Note that no exception is raised when ``path`` points to a file;
@@ -791,6 +1403,9 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         ----------
         path : str
             Path of remote item.
+        fields : list, optional
+            Names of the properties to request for each child. See
+            ``metadata``. Default is ``None``, i.e., all properties.
 
         Returns
         -------
@@ -814,32 +1429,95 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         onedrive.exceptions.FileNotFoundError
             If the requested item is not found.
 
+        See Also
+        --------
+        iterchildren
+
+        """
+        return list(self.iterchildren(path, fields=fields))
+
+    def iterchildren(self, path, page_size=None, fields=None):
+        """Iterate over children of an item, page by page.
+
+        Unlike ``children``, items are generated as soon as the page
+        containing them arrives, and the next page (if any) is fetched
+        in a background thread while the caller works on the current
+        one. Only two pages are held in memory at any time.
+
+        Parameters
+        ----------
+        path : str
+            Path of remote item.
+        page_size : int, optional
+            Number of items per page (the ``$top`` query parameter).
+            Default is ``None``, i.e., the server default.
+        fields : list, optional
+            Names of the properties to request for each child. See
+            ``metadata``. Default is ``None``, i.e., all properties.
+
+        Yields
+        ------
+        dict
+            Objects as returned by the children API (see ``children``).
+            Nothing is generated if the requested item is a file.
+
+        Raises
+        ------
+        onedrive.exceptions.FileNotFoundError
+            If the requested item is not found (raised upon the first
+            iteration).
+
         """
         encoded_path = urllib.parse.quote(path)
         logging.info("requesting children of '%s'", encoded_path)
 
-        # handle paging
         request_url = "drive/root:/%s:/children" % encoded_path
-        children = []
-        while True:
-            children_response = self.get(request_url)
-            status_code = children_response.status_code
-            if status_code == 200:
-                response_json = children_response.json()
-                children.extend(response_json["value"])
+        params = _select_params(fields) or {}
+        if page_size is not None:
+            params["$top"] = page_size
+        # the first page is fetched right away, in this thread (most
+        # directories fit in a single page)
+        response_json = self._get_children_page(path, request_url, params)
+        page = None
+        try:
+            while response_json is not None:
+                # handle paging: prefetch the next page
                 if "@odata.nextLink" in response_json:
                     request_url = onedrive.util.pop_query_from_url(
                         response_json["@odata.nextLink"], "access_token")
+                    page = _in_background(self._get_children_page, path, request_url)
                 else:
-                    break
-            elif status_code == 404:
-                raise onedrive.exceptions.FileNotFoundError(path=path)
-            else:
-                raise onedrive.exceptions.APIRequestError(
-                    response=children_response,
-                    request_desc="children request for '%s'" % path)
+                    page = None
+                for child in response_json["value"]:
+                    if self.metadata_cache is not None and fields is None:
+                        self.metadata_cache.put(posixpath.join(path, child["name"]), child)
+                    yield child
+                response_json = page.result() if page is not None else None
+        finally:
+            if page is not None:
+                page.cancel()
+
+    def _get_children_page(self, path, request_url, params=None):
+        """Get a single page of children.
 
-        return children
+        Returns
+        -------
+        response_json : dict
+            The decoded JSON response, with the items in ``"value"``.
+
+        """
+        children_response = self.get(request_url, params=params)
+        status_code = children_response.status_code
+        if status_code == 200:
+            return children_response.json()
+        elif status_code == 404:
+            if self.metadata_cache is not None:
+                self.metadata_cache.put_missing(path)
+            raise onedrive.exceptions.FileNotFoundError(path=path)
+        else:
+            raise onedrive.exceptions.APIRequestError(
+                response=children_response,
+                request_desc="children request for '%s'" % path)
 
     def listdir(self, path, names_only=False):
         """List children of a directory.
@@ -853,7 +1531,8 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         path : str
             Path of remote directory.
         names_only : bool, optional
-            List names only. Default is ``False``.
+            List names only (from the index, if it covers ``path``).
+            Default is ``False``.
 
         Returns
         -------
@@ -870,15 +1549,25 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             If the requested item is not a directory.
 
         """
+        if names_only and self.index is not None:
+            hit, metadata = self.index.get(path)
+            if hit:
+                if metadata is None:
+                    raise onedrive.exceptions.FileNotFoundError(path=path)
+                if "folder" not in metadata:
+                    raise onedrive.exceptions.NotADirectoryError(path=path)
+                hit, children = self.index.children(path)
+                if hit and children is not None:
+                    return [child["name"] for child in children]
         self.assert_dir(path)
-        children = self.children(path)
         if names_only:
-            return [child["name"] for child in children]
+            return [child["name"] for child in self.iterchildren(path)]
         else:
-            return children
+            return self.children(path)
 
     def download(self, path, destdir=None, compare_hash=True,
-                 show_progress=False, resume=True, downloader=None):
+                 show_progress=False, resume=True, downloader=None, connections=1,
+                 metadata=None):
         """Download a file from OneDrive.
 
         Parameters
@@ -901,6 +1590,24 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             requests package; otherwise, use the specified external
             downloader for download (specified downloader has to be on
             ``PATH``). Default is ``None``.
+        connections : int, optional
+            Number of concurrent connections used to download the file
+            in segments (see ``onedrive.download_helper``); only applies
+            to the default downloader. With more than one connection,
+            the ``.part`` file is preallocated, and the missing ranges
+            are tracked on disk so that every segment is resumed after an
+            interruption. Default is 1.
+        metadata : dict, optional
+            Metadata object of the file, if already known (e.g., from a
+            listing with ``SELECT_DOWNLOAD`` fields), to save the
+            metadata request. It should contain at least ``name``,
+            ``size``, ``file`` (with the SHA-1 digest, if
+            ``compare_hash``) and ``@content.downloadUrl``; otherwise,
+            it is ignored. Download URLs are short-lived, so if the
+            download URL in ``metadata`` is rejected, fresh metadata is
+            requested once and the download carries on with the new
+            URL. Ignored by external downloaders (which cannot tell an
+            expired URL from any other failure). Default is ``None``.
 
         Raises
         ------
@@ -914,12 +1621,15 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             If the download appears corrupted (size or SHA-1 mismatch)
 
         """
-        try:
+        if downloader in ["curl", "wget"] or not self._is_download_metadata(
+                metadata, compare_hash=compare_hash):
+            metadata = None
+        # whether the download URL is known to be fresh
+        fresh_url = metadata is None
+        if metadata is None:
             metadata = self.metadata(path)
-            if "folder" in metadata:
-                raise onedrive.exceptions.IsADirectoryError(path=path)
-        except onedrive.exceptions.FileNotFoundError:
-            raise
+        if "folder" in metadata:
+            raise onedrive.exceptions.IsADirectoryError(path=path)
 
         destdir = os.path.abspath(os.getcwd() if destdir is None else destdir)
         local_path = os.path.join(destdir, metadata["name"])
@@ -928,20 +1638,106 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
 
         size = metadata["size"]
         tmp_path = "%s.part" % local_path
-        download_url = metadata["@content.downloadUrl"]
 
-        if downloader in ["curl", "wget"]:
-            if downloader == "curl":
-                cmd = ["curl", "--output", tmp_path]
-                if resume:
-                    cmd.extend(["--continue-at", "-"])
-                if show_progress:
-                    pass
+        while True:
+            try:
+                local_sha1sum = self._download_content(
+                    path, metadata["@content.downloadUrl"], tmp_path, size,
+                    compare_hash=compare_hash, show_progress=show_progress, resume=resume,
+                    downloader=downloader, connections=connections)
+                break
+            except onedrive.exceptions.APIRequestError as err:
+                if fresh_url or err.response is None or \
+                   err.response.status_code not in self.EXPIRED_DOWNLOAD_URL_STATUS_CODES:
+                    raise
+                logging.info("%s: download URL rejected with HTTP %d, requesting a new one",
+                             path, err.response.status_code)
+                self._invalidate_metadata(path)
+                stale_metadata = metadata
+                metadata = self.metadata(path)
+                if "folder" in metadata:
+                    raise onedrive.exceptions.IsADirectoryError(path=path)
+                fresh_url = True
+                size = metadata["size"]
+                if size == stale_metadata["size"] and \
+                   metadata["file"].get("hashes") == stale_metadata["file"].get("hashes"):
+                    # same content, keep what has been downloaded so far
+                    resume = True
                 else:
-                    cmd.extend(["--silent", "--show-error"])
-            elif downloader == "wget":
-                cmd = ["wget", "--output-document", tmp_path]
-                if resume:
+                    # the content changed, what has been downloaded so far
+                    # (and the range map, if any) is of no use
+                    resume = False
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    onedrive.download_helper.RangeMap(tmp_path, size).discard()
+
+        local_size = os.path.getsize(tmp_path)
+        if size != local_size:
+            raise onedrive.exceptions.CorruptedDownloadError(
+                path=path, remote_size=size, local_size=local_size)
+        if compare_hash:
+            remote_sha1sum = metadata["file"]["hashes"]["sha1Hash"].lower()
+            if downloader in ["curl", "wget"]:
+                # external downloaders leave the hashing to us
+                if show_progress:
+                    print("hashing progress:", file=sys.stderr)
+                local_sha1sum = zmwangx.hash.file_hash(
+                    tmp_path, "sha1", show_progress=show_progress).lower()
+            if remote_sha1sum != local_sha1sum:
+                raise onedrive.exceptions.CorruptedDownloadError(
+                    path=path, remote_sha1sum=remote_sha1sum, local_sha1sum=local_sha1sum)
+        os.rename(tmp_path, local_path)
+        if compare_hash and self.hash_cache is not None:
+            # verified digest of the downloaded file, good for future uploads
+            self.hash_cache.put(local_path, local_sha1sum)
+
+    @staticmethod
+    def _is_download_metadata(metadata, compare_hash=True):
+        """Whether a metadata object is complete enough for ``download``."""
+        if metadata is None or "folder" in metadata:
+            return False
+        if not all(key in metadata for key in ("name", "size", "file", "@content.downloadUrl")):
+            return False
+        return not compare_hash or "sha1Hash" in metadata["file"].get("hashes", {})
+
+    def _download_content(self, path, download_url, tmp_path, size, **kwargs):
+        """Download the content of a file to ``tmp_path``.
+
+        See ``download`` for the keyword arguments.
+
+        Returns
+        -------
+        local_sha1sum : str
+            SHA-1 digest of the downloaded file, computed on the fly;
+            ``None`` if ``compare_hash`` is ``False`` or an external
+            downloader is used.
+
+        Raises
+        ------
+        onedrive.exceptions.APIRequestError
+            If the download URL is rejected (or on any other
+            non-retryable error response).
+
+        """
+        compare_hash = kwargs.pop("compare_hash", True)
+        show_progress = kwargs.pop("show_progress", False)
+        resume = kwargs.pop("resume", True)
+        downloader = kwargs.pop("downloader", None)
+        connections = kwargs.pop("connections", 1)
+
+        local_sha1sum = None
+        if downloader in ["curl", "wget"]:
+            if downloader == "curl":
+                cmd = ["curl", "--output", tmp_path]
+                if resume:
+                    cmd.extend(["--continue-at", "-"])
+                if show_progress:
+                    pass
+                else:
+                    cmd.extend(["--silent", "--show-error"])
+            elif downloader == "wget":
+                cmd = ["wget", "--output-document", tmp_path]
+                if resume:
                     cmd.append("--continue")
                 if show_progress:
                     cmd.append("--verbose")
@@ -960,13 +1756,25 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
                        (path, downloader, downloaded_size, size))
                 raise onedrive.exceptions.CorruptedDownloadError(
                     msg=msg, path=path, remote_size=size, local_size=downloaded_size)
+        elif connections > 1:
+            if show_progress:
+                if compare_hash:
+                    print("download progress:", file=sys.stderr)
+                pbar = zmwangx.pbar.ProgressBar(size)
+            else:
+                pbar = None
+            local_sha1sum = onedrive.download_helper.segmented_download(
+                self.download_client, download_url, tmp_path, size, connections,
+                resume=resume, pbar=pbar, path=path, compute_hash=compare_hash,
+                retry_policy=self.retry_policy, rate_limiter=self.rate_limiter)
+            if show_progress:
+                pbar.finish()
         else:
             # use default downloader
             if resume and os.path.exists(tmp_path):
                 downloaded_size = os.path.getsize(tmp_path)
             else:
                 downloaded_size = 0
-            headers = {"Range": "bytes=%d-" % downloaded_size} if resume else {}
             open_mode = "ab" if resume else "wb"
 
             if show_progress:
@@ -974,31 +1782,97 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
                     print("download progress:", file=sys.stderr)
                 pbar = zmwangx.pbar.ProgressBar(size, preprocessed=downloaded_size)
 
-            download_request = requests.get(url=download_url, headers=headers, stream=True)
-            with open(tmp_path, open_mode) as fileobj:
-                chunk_size = 65536
-                for chunk in download_request.iter_content(chunk_size=chunk_size):
-                    if chunk:
-                        fileobj.write(chunk)
-                        if show_progress:
-                            pbar.update(len(chunk))
-            if show_progress:
-                pbar.finish()
+            # hash chunks as they arrive (the existing prefix, if any, is
+            # hashed from disk in the background)
+            hasher = (onedrive.hash_helper.IncrementalHasher(tmp_path, start=downloaded_size)
+                      if compare_hash else None)
+            try:
+                with open(tmp_path, open_mode) as fileobj:
+                    position = downloaded_size
+                    attempt = 0
+                    # (an empty file still takes one request)
+                    while position < size or (attempt == 0 and size == 0):
+                        attempt += 1
+                        progress = position
+                        # resume from where the last attempt left off
+                        headers = {"Range": "bytes=%d-" % position} if position > 0 else {}
+                        try:
+                            position = self._download_stream(
+                                path, download_url, headers, fileobj, position, hasher=hasher,
+                                pbar=pbar if show_progress else None)
+                            error = None
+                        except onedrive.exceptions.APIRequestError as err:
+                            if not self.retry_policy.should_retry(attempt, err.response):
+                                raise
+                            self.retry_policy.sleep(attempt, err.response)
+                            continue
+                        except requests.exceptions.RequestException as err:
+                            position = fileobj.tell()
+                            error = err
+                        if position >= size:
+                            break
+                        if position > progress:
+                            # made progress, renew the attempt budget
+                            attempt = 0
+                        if not self.retry_policy.should_retry(max(1, attempt)):
+                            if error is not None:
+                                raise error
+                            break
+                        self.retry_policy.sleep(max(1, attempt),
+                                                reason="%s: download interrupted at %d/%d bytes" %
+                                                (path, position, size))
+                if show_progress:
+                    pbar.finish()
+                if hasher is not None:
+                    local_sha1sum = hasher.hexdigest()
+            finally:
+                if hasher is not None:
+                    hasher.close()
 
-        local_size = os.path.getsize(tmp_path)
-        if size != local_size:
-            raise onedrive.exceptions.CorruptedDownloadError(
-                path=path, remote_size=size, local_size=local_size)
-        if compare_hash:
-            remote_sha1sum = metadata["file"]["hashes"]["sha1Hash"].lower()
-            if show_progress:
-                print("hashing progress:", file=sys.stderr)
-            local_sha1sum = zmwangx.hash.file_hash(
-                tmp_path, "sha1", show_progress=show_progress).lower()
-            if remote_sha1sum != local_sha1sum:
-                raise onedrive.exceptions.CorruptedDownloadError(
-                    path=path, remote_sha1sum=remote_sha1sum, local_sha1sum=local_sha1sum)
-        os.rename(tmp_path, local_path)
+        return local_sha1sum
+
+    def _download_stream(self, path, download_url, headers, fileobj, position, **kwargs):
+        """Stream a download into ``fileobj`` (opened for appending).
+
+        Returns
+        -------
+        position : int
+            Offset in the file after the last byte written.
+
+        Raises
+        ------
+        onedrive.exceptions.APIRequestError
+            If the server responds with an error (or ignores the range).
+        requests.exceptions.RequestException
+            If the connection fails midway (what was received is kept).
+
+        """
+        hasher = kwargs.pop("hasher", None)
+        pbar = kwargs.pop("pbar", None)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire_requests()
+        download_request = self.download_client.get(download_url, headers=headers,
+                                                    stream=True, timeout=30)
+        try:
+            expected_status = 206 if "Range" in headers else 200
+            if download_request.status_code != expected_status:
+                raise onedrive.exceptions.APIRequestError(
+                    response=download_request, request_desc="download request for '%s'" % path)
+            for chunk in download_request.iter_content(chunk_size=65536):
+                if chunk:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.acquire_bytes(len(chunk))
+                    fileobj.write(chunk)
+                    if hasher is not None:
+                        hasher.feed(position, chunk)
+                    position += len(chunk)
+                    if pbar is not None:
+                        pbar.update(len(chunk))
+            return position
+        finally:
+            # release the connection back to the pool
+            download_request.close()
+            fileobj.flush()
 
     def makedirs(self, path, exist_ok=False):
         """Recursively create directory.
@@ -1031,28 +1905,43 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         --------
         mkdir
 
+        """
+        url, payload = self._makedirs_request(path)
+        makedirs_response = self.post(url, json=payload)
+        if makedirs_response.status_code == 409:  # Conflict
+            # the cache might still believe that path doesn't exist
+            self._invalidate_metadata(path)
+            return self._makedirs_conflict(path, self.metadata(path), exist_ok)
+        return self._makedirs_result(path, makedirs_response)
+
+    @staticmethod
+    def _makedirs_request(path):
+        """Describe the directory creation request for ``path``.
+
+        Returns
+        -------
+        (url, json)
+
         """
         basename = posixpath.basename(path)
         dirname = posixpath.dirname(path)
         encoded_dirname = urllib.parse.quote(dirname)
-        makedirs_response = self.post(
-            "drive/root:/%s:/children" % encoded_dirname,
-            json={"name": basename, "folder": {}, "@name.conflictBehavior": "fail"})
+        return ("drive/root:/%s:/children" % encoded_dirname,
+                {"name": basename, "folder": {}, "@name.conflictBehavior": "fail"})
+
+    def _makedirs_result(self, path, makedirs_response):
+        """Interpret the response to a directory creation request.
+
+        HTTP 409 (Conflict) is handled by ``_makedirs_conflict`` instead.
+
+        """
         status_code = makedirs_response.status_code
         if status_code == 201:
-            return makedirs_response.json()
-        elif status_code == 409:  # Conflict
-            metadata = self.metadata(path)
-            if "file" in metadata:
-                msg = ("'%s' already exists at '%s' and is not a directory" %
-                       (path, metadata["webUrl"]))
-                raise onedrive.exceptions.NotADirectoryError(msg=msg, path=path)
-            else:
-                if exist_ok:
-                    return metadata
-                else:
-                    raise onedrive.exceptions.FileExistsError(
-                        path=path, type="directory", url=metadata["webUrl"])
+            metadata = makedirs_response.json()
+            self._invalidate_metadata(path)
+            if self.metadata_cache is not None:
+                self.metadata_cache.put(path, metadata)
+            return metadata
         elif status_code == 403:  # Forbidden (accessDenied)
             msg = "one of the intermediate paths of '%s' is not a directory" % path
             raise onedrive.exceptions.NotADirectoryError(msg=msg, path=path)
@@ -1061,6 +1950,80 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
                 response=makedirs_response,
                 request_desc="directory creation request for '%s'" % path)
 
+    @staticmethod
+    def _makedirs_conflict(path, metadata, exist_ok):
+        """Decide the outcome of ``makedirs`` when ``path`` already exists."""
+        if "file" in metadata:
+            msg = ("'%s' already exists at '%s' and is not a directory" %
+                   (path, metadata["webUrl"]))
+            raise onedrive.exceptions.NotADirectoryError(msg=msg, path=path)
+        else:
+            if exist_ok:
+                return metadata
+            else:
+                raise onedrive.exceptions.FileExistsError(
+                    path=path, type="directory", url=metadata["webUrl"])
+
+    def makedirs_many(self, paths, exist_ok=False):
+        """Recursively create multiple directories, in batches.
+
+        Directories are created level by level (shallowest first), so
+        that a path may be an intermediate path of another.
+
+        Parameters
+        ----------
+        paths : list
+            Paths of remote directories to make.
+        exist_ok : bool
+            See ``makedirs``.
+
+        Returns
+        -------
+        results : list
+            For each path, in order, the metadata object of the created
+            (or existing) directory, or the exception instance that
+            ``makedirs`` would have raised.
+
+        Raises
+        ------
+        onedrive.exceptions.APIRequestError
+            If a batch request itself fails.
+
+        """
+        results = [None] * len(paths)
+        levels = {}
+        for index, path in enumerate(paths):
+            depth = len([component for component in path.split("/") if component])
+            levels.setdefault(depth, []).append(index)
+
+        for depth in sorted(levels):
+            indices = levels[depth]
+            sub_requests = []
+            for index in indices:
+                url, payload = self._makedirs_request(paths[index])
+                sub_requests.append(onedrive.batch.BatchRequest("post", url, json=payload))
+            conflicts = []
+            for index, response in zip(indices, self.batch(sub_requests)):
+                if response.status_code == 409:
+                    self._invalidate_metadata(paths[index])
+                    conflicts.append(index)
+                    continue
+                try:
+                    results[index] = self._makedirs_result(paths[index], response)
+                except onedrive.exceptions.GeneralAPIException as err:
+                    results[index] = err
+
+            conflicting_metadata = self.metadata_many([paths[index] for index in conflicts])
+            for index, metadata in zip(conflicts, conflicting_metadata):
+                if isinstance(metadata, Exception):
+                    results[index] = metadata
+                    continue
+                try:
+                    results[index] = self._makedirs_conflict(paths[index], metadata, exist_ok)
+                except onedrive.exceptions.GeneralAPIException as err:
+                    results[index] = err
+        return results
+
     def mkdir(self, path):
         """Create a directory (no recursive).
 
@@ -1093,6 +2056,61 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         self.assert_dir(parent)
         return self.makedirs(path, exist_ok=False)
 
+    def mkdir_many(self, paths):
+        """Create multiple directories (no recursive), in batches.
+
+        A path may have another path of the list as its parent.
+
+        Parameters
+        ----------
+        paths : list
+            Paths of remote directories to make.
+
+        Returns
+        -------
+        results : list
+            For each path, in order, the metadata object of the created
+            directory, or the exception instance that ``mkdir`` would
+            have raised.
+
+        Raises
+        ------
+        onedrive.exceptions.APIRequestError
+            If a batch request itself fails.
+
+        """
+        results = [None] * len(paths)
+        normalized = [posixpath.normpath("/" + path).lstrip("/") for path in paths]
+        to_create = set(normalized)
+        parents = sorted(set(posixpath.dirname(path) for path in normalized) - to_create)
+        parent_errors = {}
+        for parent, metadata in zip(parents, self.metadata_many(parents)):
+            if isinstance(metadata, Exception):
+                parent_errors[parent] = metadata
+            elif "folder" not in metadata:
+                parent_errors[parent] = onedrive.exceptions.NotADirectoryError(path=parent)
+
+        def parent_error(path):
+            """Error of the parent of path, if any (following the list)."""
+            parent = posixpath.dirname(path)
+            if parent in parent_errors:
+                return parent_errors[parent]
+            if parent in to_create:
+                return parent_error(parent)
+            return None
+
+        indices = []
+        for index, path in enumerate(normalized):
+            error = parent_error(path)
+            if error is not None:
+                results[index] = error
+            else:
+                indices.append(index)
+        created = self.makedirs_many([paths[index] for index in indices], exist_ok=False)
+        for index, result in zip(indices, created):
+            results[index] = result
+        return results
+
     def rm(self, path, recursive=False):
         """Remove an item.
 
@@ -1121,7 +2139,13 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             self.assert_file(path)
 
         delete_response = self.delete("drive/root:/%s" % encoded_path)
+        self._rm_result(path, delete_response)
+
+    def _rm_result(self, path, delete_response):
+        """Interpret the response to a deletion request (see ``rm``)."""
         status_code = delete_response.status_code
+        if status_code in {204, 404}:
+            self._invalidate_metadata(path, subtree=True)
         if status_code == 204:
             return
         elif status_code == 404:
@@ -1131,6 +2155,61 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
                 response=delete_response,
                 request_desc="deletion request for '%s'" % path)
 
+    def rm_many(self, paths, recursive=False, jobs=4):
+        """Remove multiple items, in concurrent batches.
+
+        With ``recursive``, deletions are requested right away (a
+        missing item is told by the response); otherwise, the types of
+        the items are looked up first, in batches too.
+
+        Parameters
+        ----------
+        paths : list
+            Paths of remote items to remove.
+        recursive : bool
+            See ``rm``.
+        jobs : int, optional
+            Number of batches in flight at once. Default is 4.
+
+        Returns
+        -------
+        results : list
+            For each path, in order, ``None`` if the item was removed,
+            or the exception instance that ``rm`` would have raised.
+
+        Raises
+        ------
+        onedrive.exceptions.APIRequestError
+            If a batch request itself fails.
+
+        """
+        results = [None] * len(paths)
+        indices = list(range(len(paths)))
+        if not recursive:
+            indices = []
+            for index, metadata in enumerate(self.metadata_many(paths, fields=SELECT_ITEM_TYPE,
+                                                                jobs=jobs)):
+                if isinstance(metadata, Exception):
+                    results[index] = metadata
+                elif "file" not in metadata:
+                    results[index] = onedrive.exceptions.IsADirectoryError(path=paths[index])
+                else:
+                    indices.append(index)
+        self._delete_many(paths, indices, results, jobs)
+        return results
+
+    def _delete_many(self, paths, indices, results, jobs):
+        """Delete ``paths[index]`` for each index, storing errors in ``results``."""
+        sub_requests = [
+            onedrive.batch.BatchRequest("delete",
+                                        "drive/root:/%s" % urllib.parse.quote(paths[index]))
+            for index in indices]
+        for index, response in zip(indices, self.batch(sub_requests, jobs=jobs)):
+            try:
+                self._rm_result(paths[index], response)
+            except onedrive.exceptions.GeneralAPIException as err:
+                results[index] = err
+
     def remove(self, path):
         """Alias for ``self.rm(path)``."""
         self.rm(path)
@@ -1190,6 +2269,49 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
 
         self.rm(path, recursive=True)
 
+    def rmdir_many(self, paths, jobs=4):
+        """Remove multiple empty directories, in concurrent batches.
+
+        The directories are looked up in batches (to check that they are
+        empty directories), then the empty ones are deleted in batches.
+
+        Parameters
+        ----------
+        paths : list
+            Paths of remote directories to remove.
+        jobs : int, optional
+            Number of batches in flight at once. Default is 4.
+
+        Returns
+        -------
+        results : list
+            For each path, in order, ``None`` if the directory was
+            removed, or the exception instance that ``rmdir`` would have
+            raised.
+
+        Raises
+        ------
+        onedrive.exceptions.APIRequestError
+            If a batch request itself fails.
+
+        """
+        results = [None] * len(paths)
+        indices = []
+        for index, metadata in enumerate(self.metadata_many(paths, fields=SELECT_ITEM_TYPE,
+                                                            jobs=jobs)):
+            path = paths[index]
+            if isinstance(metadata, Exception):
+                results[index] = metadata
+            elif "file" in metadata:
+                results[index] = onedrive.exceptions.NotADirectoryError(path=path)
+            elif metadata["folder"]["childCount"] > 0:
+                msg = "directory '%s' is not empty" % path
+                results[index] = onedrive.exceptions.PermissionError(msg=msg, path=path)
+            else:
+                indices.append(index)
+        self._delete_many(paths, indices, results, jobs)
+        return results
+
     def removedirs(self, path):
         """Remove directories recursively.
 
@@ -1220,7 +2342,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
                 break
 
     def move_or_copy(self, action, src, dst, overwrite=False,
-                     block=True, monitor_interval=1, show_progress=False):
+                     block=True, monitor_interval=1, show_progress=False, optimistic=False):
         """Move or copy an item.
 
         https://dev.onedrive.com/items/move.htm.
@@ -1248,6 +2370,18 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             Only useful when action is copy. See ``monitor_copy``.
         show_progress : bool, optional
             Only useful when action is copy. See ``monitor_copy``.
+        optimistic : bool, optional
+            Whether to skip the checks of source, destination and its
+            parent, and send the move or copy request right away, with
+            ``@name.conflictBehavior`` set to ``fail``; the checks are
+            only made if the request fails, to tell what went wrong (or
+            to overwrite the destination, upon a conflict). The
+            exceptions raised are the same. Saves three requests or more
+            when the operation succeeds. Copy conflicts are only
+            reported asynchronously, by the copy job, so for a copy the
+            destination is still checked up front (saving two requests
+            instead), and ``overwrite`` disables the optimistic mode
+            altogether. Default is ``False``.
 
         Returns
         -------
@@ -1289,6 +2423,59 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             msg = "'%s': %s to the same item" % (src, actioning)
             raise onedrive.exceptions.FileExistsError(msg=msg, path=src)
 
+        if optimistic and action == "copy" and overwrite:
+            # a conflict would only surface as a failed copy job, too late
+            # to overwrite the destination
+            optimistic = False
+
+        response = None
+        if optimistic:
+            if action == "copy" and self.exists(dst):
+                raise onedrive.exceptions.FileExistsError(path=dst)
+            method, endpoint, headers, payload = self._move_or_copy_request(
+                action, src, dst, conflict_behavior="fail")
+            response = self.request(method, endpoint, headers=headers, json=payload)
+            status_code = response.status_code
+            if status_code == 409 and overwrite:
+                # (a move) the destination exists; go the checked way,
+                # which knows how (and whether) to overwrite it
+                response = None
+            elif status_code in {400, 404, 409}:
+                raise self._diagnose_move_or_copy_error(action, src, dst, response)
+
+        if response is None:
+            self._check_move_or_copy(src, dst, overwrite)
+            method, endpoint, headers, payload = self._move_or_copy_request(action, src, dst)
+            response = self.request(method, endpoint, headers=headers, json=payload)
+            status_code = response.status_code
+
+        if status_code in {200, 202}:
+            self._invalidate_metadata(dst, subtree=True)
+        if status_code == 200:
+            # successful move
+            self._invalidate_metadata(src, subtree=True)
+            return
+        elif status_code == 202:
+            # copy: accepted
+            monitor_url = onedrive.util.pop_query_from_url(response.headers["location"],
+                                                           "access_token")
+            if block:
+                self.monitor_copy(monitor_url,
+                                  monitor_interval=monitor_interval,
+                                  show_progress=show_progress,
+                                  src=src, dst=dst)
+            else:
+                return monitor_url
+        else:
+            raise self._move_or_copy_error(action, src, dst, response)
+
+    def _check_move_or_copy(self, src, dst, overwrite):
+        """Check source and destination of a move or copy.
+
+        The destination is removed if it exists and ``overwrite`` is
+        ``True``. See ``move_or_copy`` for exceptions.
+
+        """
         # confirm source item existence and store metadata for future use
         try:
             src_metadata = self.metadata(src)
@@ -1327,52 +2514,76 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
                 pass
 
         new_parent = posixpath.dirname(dst)
-        new_name = posixpath.basename(dst)
 
         # confirm new parent is an existing directory
         self.assert_dir(new_parent)
 
-        # make request
+    def _diagnose_move_or_copy_error(self, action, src, dst, response):
+        """Exception for a failed optimistic move or copy request.
+
+        The response alone does not tell, e.g., a missing source from a
+        missing destination parent, so these are looked up.
+
+        """
+        if response.status_code == 409:
+            return onedrive.exceptions.FileExistsError(path=dst)
+        new_parent = posixpath.dirname(dst)
+        # cached metadata may be what led us astray
+        self._invalidate_metadata(src)
+        self._invalidate_metadata(new_parent)
+        try:
+            self.metadata(src)
+            if "folder" not in self.metadata(new_parent):
+                return onedrive.exceptions.NotADirectoryError(path=new_parent)
+        except onedrive.exceptions.FileNotFoundError as err:
+            return err
+        return self._move_or_copy_error(action, src, dst, response)
+
+    @staticmethod
+    def _move_or_copy_request(action, src, dst, conflict_behavior=None):
+        """Describe the move or copy request of ``src`` to ``dst``.
+
+        ``conflict_behavior``, if given, is sent as
+        ``@name.conflictBehavior``.
+
+        Returns
+        -------
+        (method, url, headers, json)
+
+        """
+        new_parent = posixpath.dirname(dst)
+        new_name = posixpath.basename(dst)
         encoded_path = urllib.parse.quote(src)
         encoded_new_parent = urllib.parse.quote(new_parent)
         method = "patch" if action == "move" else "post"
         endpoint = ("drive/root:/%s" % encoded_path if action == "move" else
                     "drive/root:/%s:/action.copy" % encoded_path)
         headers = {} if action == "move" else {"prefer": "respond-async"}
-        response = self.request(method, endpoint, headers=headers, json={
+        payload = {
             "parentReference": {"path": "/drive/root:/%s" % encoded_new_parent},
             "name": new_name,
-        })
-        status_code = response.status_code
-
-        if status_code == 200:
-            # successful move
-            return
-        elif status_code == 202:
-            # copy: accepted
-            monitor_url = onedrive.util.pop_query_from_url(response.headers["location"],
-                                                           "access_token")
-            if block:
-                self.monitor_copy(monitor_url,
-                                  monitor_interval=monitor_interval,
-                                  show_progress=show_progress,
-                                  src=src, dst=dst)
-            else:
-                return monitor_url
+        }
+        if conflict_behavior is not None:
+            payload["@name.conflictBehavior"] = conflict_behavior
+        return method, endpoint, headers, payload
 
+    @staticmethod
+    def _move_or_copy_error(action, src, dst, response):
+        """Exception for an unsuccessful move or copy request."""
+        status_code = response.status_code
         # HTTP 400 (invalidArgument) seems to be returned when trying to
         # move an item that is recently moved; seems to be a bug on the
         # server side. Anyway, we treats it just like 404 for now.
-        elif status_code in {400, 404}:
+        if status_code in {400, 404}:
             # API says not found; but we already checked the existence
             # of source, so what is not found must be the new parent.
-            raise onedrive.exceptions.FileNotFoundError(path=new_parent)
+            return onedrive.exceptions.FileNotFoundError(path=posixpath.dirname(dst))
         elif status_code == 409:
             # conflict, shouldn't really happen as we already tested
             # prior to request, but anyway
-            raise onedrive.exceptions.FileExistsError(path=dst)
+            return onedrive.exceptions.FileExistsError(path=dst)
         else:
-            raise onedrive.exceptions.APIRequestError(
+            return onedrive.exceptions.APIRequestError(
                 response=response,
                 request_desc="%s request for '%s' to '%s'" % (action, src, dst))
 
@@ -1408,31 +2619,76 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             cprogress("copying %s to %s" % (src_desc, dst_desc))
             ptext = zmwangx.pbar.ProgressText(init_text="copying")
         while True:
-            status_response = self.get(monitor_url)
-            status_code = status_response.status_code
-            if status_code in {200, 303}:
+            status_response = self._get_copy_status(monitor_url)
+            state, text = self._copy_status(status_response)
+            if state == "completed":
                 if show_progress:
-                    ptext.finish("finished copying")
+                    ptext.finish(text)
+                if dst is not None:
+                    self._invalidate_metadata(dst, subtree=True)
                 return
-            elif status_code == 202:
+            elif state == "inProgress":
                 if show_progress:
-                    status = status_response.json()
-                    text = "%s: %s" % (status["status"], status["statusDescription"])
                     ptext.text(text)
-            elif status_code == 500:
-                if show_progress:
-                    status = status_response.json()
-                    text = "%s: %s" % (status["status"], status["statusDescription"])
-                    ptext.finish(text)
-                raise onedrive.exceptions.CopyError(
-                    msg=text, src=src, dst=dst, response=status_response)
             else:
                 if show_progress:
-                    ptext.finish("unknown error occurred")
-                raise onedrive.exceptions.CopyError(
-                    src=src, dst=dst, response=status_response,
-                    request_desc="copy status request for '%s' to '%s'" % (src, dst))
-            time.sleep(monitor_interval)
+                    ptext.finish(text)
+                raise self._copy_error(state, text, status_response, src=src, dst=dst)
+            # honor Retry-After, if the server asks for slower polling
+            time.sleep(max(monitor_interval,
+                           self.retry_policy.retry_after(status_response) or 0))
+
+    def _get_copy_status(self, monitor_url):
+        """Request the status of a copy from its monitor URL.
+
+        HTTP 500 is the final answer for a failed copy (see
+        ``_copy_status``), so it is not retried.
+
+        """
+        return self.get(monitor_url, retry_policy=self.retry_policy.excluding(500))
+
+    @staticmethod
+    def _copy_status(status_response):
+        """Interpret the response to a copy status request.
+
+        Returns
+        -------
+        state : str
+            One of ``"completed"``, ``"inProgress"``, ``"failed"`` (the
+            copy failed or was cancelled) and ``"unknown"`` (unexpected
+            response).
+        text : str
+            Textual description of the status.
+
+        """
+        status_code = status_response.status_code
+        if status_code in {200, 303}:
+            return "completed", "finished copying"
+        elif status_code in {202, 500}:
+            state = "inProgress" if status_code == 202 else "failed"
+            try:
+                status = status_response.json()
+                return state, "%s: %s" % (status["status"], status["statusDescription"])
+            except (ValueError, KeyError):
+                return state, state
+        else:
+            return "unknown", "unknown error occurred"
+
+    @staticmethod
+    def _copy_error(state, text, status_response, src=None, dst=None):
+        """Make the exception for a failed copy (see ``_copy_status``).
+
+        Returns
+        -------
+        onedrive.exceptions.CopyError
+
+        """
+        if state == "failed":
+            return onedrive.exceptions.CopyError(
+                msg=text, src=src, dst=dst, response=status_response)
+        return onedrive.exceptions.CopyError(
+            src=src, dst=dst, response=status_response,
+            request_desc="copy status request for '%s' to '%s'" % (src, dst))
 
     def move(self, *args, **kwargs):
         """
@@ -1443,6 +2699,84 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         """
         return self.move_or_copy("move", *args, **kwargs)
 
+    def move_many(self, pairs, overwrite=False):
+        """Move multiple items, in batches.
+
+        Sources, destinations and their parents are looked up in
+        batches, then the moves are made in batches. Moves are
+        independent of each other, and may be carried out in any order.
+
+        Parameters
+        ----------
+        pairs : list
+            List of ``(src, dst)`` pairs. See ``move_or_copy``.
+        overwrite : bool, optional
+            See ``move_or_copy``. Items whose destination has to be
+            removed first are moved one by one. Default is ``False``.
+
+        Returns
+        -------
+        results : list
+            For each pair, in order, ``None`` if the item was moved, or
+            the exception instance that ``move`` would have raised.
+
+        Raises
+        ------
+        onedrive.exceptions.APIRequestError
+            If a batch request itself fails.
+
+        """
+        results = [None] * len(pairs)
+        lookups = set()
+        for src, dst in pairs:
+            lookups.update([src, dst, posixpath.dirname(dst)])
+        lookups = sorted(lookups)
+        metadata = dict(zip(lookups, self.metadata_many(lookups)))
+
+        ready = []
+        one_by_one = []
+        for index, (src, dst) in enumerate(pairs):
+            new_parent = posixpath.dirname(dst)
+            if posixpath.abspath(src) == posixpath.abspath(dst):
+                msg = "'%s': moving to the same item" % src
+                results[index] = onedrive.exceptions.FileExistsError(msg=msg, path=src)
+            elif isinstance(metadata[src], Exception):
+                results[index] = metadata[src]
+            elif not isinstance(metadata[dst], Exception):
+                # destination exists
+                if overwrite:
+                    one_by_one.append(index)
+                else:
+                    results[index] = onedrive.exceptions.FileExistsError(path=dst)
+            elif not isinstance(metadata[dst], onedrive.exceptions.FileNotFoundError):
+                results[index] = metadata[dst]
+            elif isinstance(metadata[new_parent], Exception):
+                results[index] = metadata[new_parent]
+            elif "folder" not in metadata[new_parent]:
+                results[index] = onedrive.exceptions.NotADirectoryError(path=new_parent)
+            else:
+                ready.append(index)
+
+        sub_requests = []
+        for index in ready:
+            method, endpoint, headers, payload = self._move_or_copy_request("move", *pairs[index])
+            sub_requests.append(onedrive.batch.BatchRequest(method, endpoint,
+                                                            json=payload, headers=headers))
+        for index, response in zip(ready, self.batch(sub_requests)):
+            src, dst = pairs[index]
+            if response.status_code == 200:
+                self._invalidate_metadata(dst, subtree=True)
+                self._invalidate_metadata(src, subtree=True)
+            else:
+                results[index] = self._move_or_copy_error("move", src, dst, response)
+
+        for index in one_by_one:
+            try:
+                self.move(*pairs[index], overwrite=True)
+            except onedrive.exceptions.GeneralAPIException as err:
+                results[index] = err
+        return results
+
     def copy(self, *args, **kwargs):
         """
         Alias for ``self.move_or_copy("copy", *args, **kwargs)``.
@@ -1470,7 +2804,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             If ``dst`` already exists.
 
         """
-        self.move(src, posixpath.dirname(dst), posixpath.basename(dst))
+        self.move(src, dst)
 
     def renames(self, src, dst):
         """Recursive directory or file renaming function.
@@ -1514,6 +2848,92 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         # pruned old path with removedirs
         self.removedirs(posixpath.dirname(src))
 
+    def rename_many(self, directory, renames, children=None, jobs=4):
+        """Rename many items of a directory at once.
+
+        The whole rename map is planned up front with
+        ``onedrive.rename_helper.plan_renames``, from the names in the
+        listing of the directory: collisions are rejected without any
+        request, and chains or cycles of renames (e.g., ``a => b, b =>
+        a``) go through temporary names. The moves are then made in (at
+        most two) waves of concurrent batches, without the per-item
+        checks of ``move``. An item stranded at a temporary name (its
+        second move failed) is moved back to its old name; if even that
+        fails, the error of the rename says where the item was left.
+
+        Parameters
+        ----------
+        directory : str
+            Remote path of the directory.
+        renames : list
+            Pairs ``(oldname, newname)`` of names in ``directory``.
+        children : list, optional
+            Metadata objects of all items in ``directory`` (only
+            ``name`` is used), if already listed. Default is ``None``,
+            i.e., list the directory.
+        jobs : int, optional
+            Number of batches in flight at once. Default is 4.
+
+        Returns
+        -------
+        results : list
+            For each pair, in order, ``None`` if the item was renamed,
+            or an exception instance.
+
+        Raises
+        ------
+        onedrive.exceptions.FileNotFoundError
+            If ``directory`` is not found.
+        onedrive.exceptions.APIRequestError
+            If a batch request itself fails.
+
+        """
+        if children is None:
+            children = self.children(directory, fields=SELECT_PATHS_ONLY)
+        waves, errors = onedrive.rename_helper.plan_renames(
+            directory, [child["name"] for child in children], renames)
+        results = [errors.get(index) for index in range(len(renames))]
+
+        def move_all(moves):
+            """Make moves (triples (index, srcname, dstname)) in batches."""
+            sub_requests = []
+            for _, srcname, dstname in moves:
+                method, endpoint, headers, payload = self._move_or_copy_request(
+                    "move", posixpath.join(directory, srcname),
+                    posixpath.join(directory, dstname), conflict_behavior="fail")
+                sub_requests.append(onedrive.batch.BatchRequest(method, endpoint,
+                                                                json=payload, headers=headers))
+            return self.batch(sub_requests, jobs=jobs)
+
+        # index -> temporary name, for items moved to a temporary name
+        parked = {}
+        try:
+            for wave in waves:
+                wave = [move for move in wave if results[move[0]] is None]
+                for (index, srcname, dstname), response in zip(wave, move_all(wave)):
+                    if response.status_code == 200:
+                        if dstname == renames[index][1]:
+                            parked.pop(index, None)
+                        else:
+                            parked[index] = dstname
+                    else:
+                        results[index] = self._move_or_copy_error(
+                            "move", posixpath.join(directory, srcname),
+                            posixpath.join(directory, dstname), response)
+
+            if parked:
+                restores = [(index, tempname, renames[index][0])
+                            for index, tempname in sorted(parked.items())]
+                for (index, tempname, oldname), response in zip(restores, move_all(restores)):
+                    if response.status_code != 200:
+                        temppath = posixpath.join(directory, tempname)
+                        logging.warning("failed to move '%s' back to '%s'", temppath, oldname)
+                        results[index].msg = ("%s; the item was left at '%s'" %
+                                              (str(results[index]), temppath))
+        finally:
+            self._invalidate_metadata(directory, subtree=True)
+        return results
+
     def walk(self, top, topdown=True, paths_only=False, **kwargs):
         """Walk a directory tree.
 
@@ -1562,6 +2982,24 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             ``None``. This parameter is used to avoid one extra metadata query
             when ``paths_only`` is ``False``. It becomes significant when used
             in a recursive setting.
+        fields : list, optional
+            Names of the properties to request for each item (see
+            ``metadata``); ``"name"`` and ``"folder"`` are always included.
+            Default is ``None``, i.e., all properties, unless ``paths_only``
+            is ``True``, in which case only the names are requested
+            (``SELECT_PATHS_ONLY``).
+        jobs : int, optional
+            Number of directories to list concurrently. Default is 1, i.e.,
+            directories are listed one after another. With a value greater
+            than 1, listings are fetched ahead of time in a thread pool (see
+            ``onedrive.walk_helper``); the order of the generated tuples and
+            the effect of modifying the dirs or dirnames list are unchanged.
+        ordered : bool, optional
+            If ``False``, generate each directory as soon as its listing is
+            available, rather than in the order described above (a directory
+            is still generated before its subdirectories). Only available in
+            top-down mode, and implies concurrent listing (with ``jobs``
+            defaulting to 8). Default is ``True``.
 
         Yields
         ------
@@ -1577,6 +3015,8 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             If ``top`` is not found.
         onedrive.exceptions.IsADirectoryError
             If ``top`` exists but is a directory.
+        ValueError
+            If ``ordered`` is ``False`` while ``topdown`` is also ``False``.
 
         """
         for tup in self.walkn(top, topdown=topdown, paths_only=paths_only, **kwargs):
@@ -1593,29 +3033,45 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
         """
         check_dir = kwargs.pop("check_dir", True)
         top_metadata = kwargs.pop("metadata", None)
+        fields = kwargs.pop("fields", SELECT_PATHS_ONLY if paths_only else None)
+        ordered = kwargs.pop("ordered", True)
+        jobs = kwargs.pop("jobs", 1 if ordered else 8)
+
+        if fields is not None:
+            fields = list(fields)
+            fields.extend(field for field in SELECT_PATHS_ONLY if field not in fields)
 
         if check_dir:
             try:
                 if top_metadata is None:
-                    top_metadata = self.metadata(top)
+                    top_metadata = self.metadata(top, fields=fields)
                 if "folder" not in top_metadata:
                     raise onedrive.exceptions.NotADirectoryError(path=top)
             except onedrive.exceptions.FileNotFoundError:
                 raise
 
+        if jobs > 1 or not ordered:
+            yield from onedrive.walk_helper.walkn(self, top, level, topdown=topdown,
+                                                  paths_only=paths_only, metadata=top_metadata,
+                                                  fields=fields, jobs=jobs, ordered=ordered)
+            return
+
         dirs = []
         files = []
-        children = self.children(top)
-        for item in children:
+        for item in self.iterchildren(top, fields=fields):
             if "folder" in item:
                 dirs.append(item)
-                if not topdown:
-                    yield from self.walkn(posixpath.join(top, item["name"]), level + 1,
-                                          topdown=topdown, paths_only=paths_only,
-                                          check_dir=False, metadata=item)
             else:
                 files.append(item)
 
+        # if bottom-up, recurse into subdirectories first (once the
+        # listing is complete, so that no paging is left open meanwhile)
+        if not topdown:
+            for item in dirs:
+                yield from self.walkn(posixpath.join(top, item["name"]), level + 1,
+                                      topdown=topdown, paths_only=paths_only,
+                                      check_dir=False, metadata=item, fields=fields)
+
         # yield at the current level
         if paths_only:
             dirnames = [item["name"] for item in dirs]
@@ -1623,7 +3079,7 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             yield level, top, dirnames, filenames
         else:
             if top_metadata is None:
-                top_metadata = self.metadata(top)
+                top_metadata = self.metadata(top, fields=fields)
             yield level, top_metadata, dirs, files
 
         # if topdown, recurse into subdirectories
@@ -1631,4 +3087,4 @@ class OneDriveAPIClient(onedrive.auth.OneDriveOAuthClient):
             for item in dirs:
                 yield from self.walkn(posixpath.join(top, item["name"]), level + 1,
                                       topdown=topdown, paths_only=paths_only,
-                                      check_dir=False, metadata=item)
+                                      check_dir=False, metadata=item, fields=fields)
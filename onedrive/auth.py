@@ -2,7 +2,9 @@
 
 """Authenticate with OneDrive's API and make authenticated HTTP requests."""
 
+import concurrent.futures
 import logging
+import threading
 import time
 import urllib.parse
 import webbrowser
@@ -12,8 +14,13 @@ import requests
 import zmwangx.config
 from zmwangx.colorout import cprogress, cprompt
 
+import onedrive.batch
 import onedrive.exceptions
 import onedrive.log
+import onedrive.ratelimit
+import onedrive.retry
+import onedrive.token_broker
+import onedrive.util
 
 class OneDriveOAuthClient(object):
     """Interface for dancing with OneDrive's OAuth.
@@ -25,6 +32,20 @@ class OneDriveOAuthClient(object):
         a new refresh token (requires tty interaction); otherwise,
         assume the refresh token is already present in the config file,
         and raise if it is not available.
+    retry_policy : onedrive.retry.RetryPolicy, optional
+        Policy for retrying failed requests (and transfers). Default is
+        built from the ``retry`` section of the config file, if any (see
+        ``onedrive.retry``).
+    rate_limiter : onedrive.ratelimit.RateLimiter, optional
+        Client-side limiter of the request rate and transfer rate.
+        Default is built from the ``ratelimit`` section of the config
+        file, if any; no limit otherwise (see ``onedrive.ratelimit``).
+    background_refresh : bool, optional
+        Whether to refresh the access token ahead of its expiration in
+        a background (daemon) thread, so that requests never wait for a
+        refresh; other processes sharing the credentials pick up the
+        new token through the token broker (see
+        ``onedrive.token_broker``). Default is ``False``.
 
     Returns
     -------
@@ -36,7 +57,11 @@ class OneDriveOAuthClient(object):
 
     API_ENDPOINT = "https://api.onedrive.com/v1.0/"
 
-    def __init__(self, authorize=False):
+    # seconds ahead of expiration to refresh the access token in the background
+    BACKGROUND_REFRESH_MARGIN = 300
+
+    def __init__(self, authorize=False, retry_policy=None, rate_limiter=None,
+                 background_refresh=False):
         """Initialize with a readily usable access token.
 
         Or additionally do the interactive authorization, if the
@@ -57,6 +82,13 @@ class OneDriveOAuthClient(object):
 
         self._conf = conf
 
+        if retry_policy is None:
+            retry_policy = onedrive.retry.RetryPolicy.from_config(conf)
+        self.retry_policy = retry_policy
+        if rate_limiter is None:
+            rate_limiter = onedrive.ratelimit.RateLimiter.from_config(conf)
+        self.rate_limiter = rate_limiter
+
         try:
             self._client_id = conf["oauth"]["client_id"]
         except KeyError:
@@ -73,6 +105,11 @@ class OneDriveOAuthClient(object):
             self._redirect_uri = "https://login.live.com/oauth20_desktop.srf"
 
         self.client = requests.Session()
+        self.token_broker = onedrive.token_broker.TokenBroker(
+            "%s\n%s" % (conf._config_file, self._client_id))
+        self._access_token = None
+        self._expires = 0
+        self._refresh_thread = None
 
         if authorize:
             self.authorize_client()
@@ -85,11 +122,28 @@ class OneDriveOAuthClient(object):
                        (conf._config_file, instruction_message))
                 raise OSError(msg)
 
-        try:
-            self._access_token = conf["oauth"]["access_token"]
-            self._expires = int(conf["oauth"]["expires"])
-        except KeyError:
-            self.refresh_access_token()
+        if self._access_token is None:
+            # prefer the token shared by other processes, then the one in the config
+            access_token, expires = self.token_broker.load()
+            if access_token is None or not self.token_broker.is_fresh(expires):
+                try:
+                    access_token = conf["oauth"]["access_token"]
+                    expires = int(conf["oauth"]["expires"])
+                except (KeyError, ValueError):
+                    access_token, expires = None, 0
+            if access_token is not None and self.token_broker.is_fresh(expires):
+                self._set_access_token(access_token, expires)
+            else:
+                self.refresh_access_token()
+
+        if background_refresh:
+            self.start_background_refresh()
+
+    def __getstate__(self):
+        """Pickle without the background refresh thread."""
+        state = self.__dict__.copy()
+        state["_refresh_thread"] = None
+        return state
 
     def authorize_client(self):
         """Authorize the client using the code flow."""
@@ -136,8 +190,11 @@ class OneDriveOAuthClient(object):
                                        data=payload, headers=headers)
         response_json = redeem_request.json()
         if redeem_request.status_code == 200 and "access_token" in response_json:
-            self._access_token = redeem_request.json()["access_token"]
-            self._refresh_token = redeem_request.json()["refresh_token"]
+            self._refresh_token = response_json["refresh_token"]
+            # supersedes whatever token other processes may be sharing
+            self._set_access_token(response_json["access_token"],
+                                   int(time.time()) + response_json.get("expires_in", 0))
+            self.token_broker.save(self._access_token, self._expires)
         else:
             raise onedrive.exceptions.APIRequestError(response=redeem_request,
                                                       request_desc="redeeming request")
@@ -147,8 +204,44 @@ class OneDriveOAuthClient(object):
         self._conf.rewrite_configs()
         cprogress("Refresh token generated and written.")
 
+    def set_pool_size(self, pool_size):
+        """Set the connection pool size of ``client``.
+
+        Parameters
+        ----------
+        pool_size : int
+            Maximum number of connections to the API kept alive (should
+            be no less than the number of threads making requests).
+
+        """
+        onedrive.util.mount_pooled_adapter(self.client, pool_size)
+
+    def _set_access_token(self, access_token, expires):
+        """Start using an access token."""
+        self._access_token = access_token
+        self._expires = expires
+        self.client.params.update({"access_token": access_token})
+
     def refresh_access_token(self):
-        """Get new access token with refresh token."""
+        """Get a new access token.
+
+        The refresh is coordinated with other processes through
+        ``token_broker``: if another process has already refreshed the
+        token, the new token is picked up without a network request.
+
+        """
+        self._set_access_token(*self.token_broker.refresh(
+            self._request_access_token, stale_token=self._access_token))
+
+    def _request_access_token(self):
+        """Get new access token with refresh token.
+
+        Returns
+        -------
+        access_token : str
+        expires : int
+
+        """
         payload = {
             "client_id": self._client_id,
             "client_secret": self._client_secret,
@@ -162,8 +255,8 @@ class OneDriveOAuthClient(object):
         onedrive.log.log_response(refresh_request)
         response_json = refresh_request.json()
         if refresh_request.status_code == 200 and "access_token" in response_json:
-            self._access_token = refresh_request.json()["access_token"]
-            self._expires = int(time.time()) + refresh_request.json()["expires_in"]
+            access_token = response_json["access_token"]
+            expires = int(time.time()) + response_json["expires_in"]
         else:
             msg = ("failed to refresh access token; refresh request returned %d: %s; "
                    "refresh token might be invalid -- have you updated your Microsoft "
@@ -172,57 +265,114 @@ class OneDriveOAuthClient(object):
             raise onedrive.exceptions.APIRequestError(msg=msg, response=refresh_request,
                                                       request_desc="refresh request")
 
-        self.client.params.update({"access_token": self._access_token})
-
-        self._conf["oauth"]["access_token"] = self._access_token
-        self._conf["oauth"]["expires"] = str(self._expires)
+        # only one process at a time gets here, so rewrites don't race
+        self._conf["oauth"]["access_token"] = access_token
+        self._conf["oauth"]["expires"] = str(expires)
         self._conf.rewrite_configs()
+        return access_token, expires
+
+    def start_background_refresh(self):
+        """Start refreshing the access token ahead of expiration.
+
+        The refresh runs in a daemon thread, ``BACKGROUND_REFRESH_MARGIN``
+        seconds before the token expires. No-op if already started.
+
+        """
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        self._refresh_thread = threading.Thread(target=self._background_refresh,
+                                                name="token-refresh")
+        self._refresh_thread.daemon = True
+        self._refresh_thread.start()
+
+    def _background_refresh(self):
+        """Body of the background refresh thread."""
+        while True:
+            time.sleep(max(1, self._expires - self.BACKGROUND_REFRESH_MARGIN - time.time()))
+            if self._expires - self.BACKGROUND_REFRESH_MARGIN > time.time():
+                # refreshed in the meantime
+                continue
+            try:
+                self.refresh_access_token()
+            except Exception as err:  # pylint: disable=broad-except
+                logging.warning("background token refresh failed: %s", str(err))
+                time.sleep(60)
 
     def request(self, method, url, **kwargs):
         """HTTP request with OAuth and safeguards.
 
-        The ``noretry`` keyword argument is used internally to determine
-        if another attempt should be made on a timeout, or HTTP 429 (Too
-        Many Requests), 500 (Internal Server Error), or 503 (Service
-        Unavailable). The default value is ``True``.
+        Timeouts, connection errors and HTTP 429 (Too Many Requests),
+        500 (Internal Server Error), 502, 503 (Service Unavailable) and
+        504 are retried according to ``retry_policy`` (honoring
+        ``Retry-After``); HTTP 401 (Unauthorized) is retried once after
+        refreshing the access token.
+
+        The ``noretry`` keyword argument is used internally to make a
+        single attempt, without any retry. The default value is
+        ``False``. The ``retry_policy`` keyword argument is used
+        internally to override ``retry_policy`` for the request.
+
+        Each attempt is subject to ``rate_limiter``, if any: it counts
+        as one request (or ``request_count`` requests, another keyword
+        argument used internally, e.g., for JSON batches), and the body
+        counts towards the byte budget.
 
         """
         path = kwargs.pop("path", None)
         url = urllib.parse.urljoin(self.API_ENDPOINT, url)
 
         noretry = kwargs.pop("noretry", False)
+        retry_policy = kwargs.pop("retry_policy", self.retry_policy)
+        request_count = kwargs.pop("request_count", 1)
 
-        if time.time() >= self._expires:
+        if not self.token_broker.is_fresh(self._expires):
             self.refresh_access_token()
 
         # always enforce a connect & read timeout of 10 seconds
         if "timeout" not in kwargs:
             kwargs["timeout"] = 10
 
-        try:
-            response = self.client.request(method, url, **kwargs)
-            onedrive.log.log_response(response, path=path)
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as err:
-            if noretry:
-                raise
-            # sleep 10 seconds and try again
-            logging.warning("%s; retrying after 10 seconds", str(err))
-            time.sleep(10)
-            response = self.request(method, url, noretry=True, **kwargs)
-
-        if response.status_code == 401 and not noretry:
-            # refresh token and try again
-            logging.warning("got HTTP 401; refreshing token and retrying")
-            self.refresh_access_token()
-            response = self.request(method, url, noretry=True, **kwargs)
-
-        if response.status_code in {429, 500, 503} and not noretry:
-            # sleep 10 seconds and try again
-            logging.warning("got HTTP %d; retrying after 10 seconds", response.status_code)
-            time.sleep(10)
-            response = self.request(method, url, noretry=True, **kwargs)
-
-        return response
+        # a file object body has to be rewound before each retry
+        data = kwargs.get("data")
+        rewind_position = None
+        if hasattr(data, "seekable") and data.seekable():
+            rewind_position = data.tell()
+        # size of the rest of the body (bytes, file object from its current
+        # position, or FileSegment, which exposes its length as len)
+        body_size = requests.utils.super_len(data) if data is not None else 0
+
+        attempt = 0
+        refreshed = False
+        while True:
+            attempt += 1
+            if attempt > 1 and rewind_position is not None:
+                data.seek(rewind_position)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire_requests(request_count)
+                self.rate_limiter.acquire_bytes(body_size)
+            access_token = self._access_token
+            try:
+                response = self.client.request(method, url, **kwargs)
+                onedrive.log.log_response(response, path=path)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as err:
+                if noretry or not retry_policy.should_retry(attempt):
+                    raise
+                retry_policy.sleep(attempt, reason=str(err))
+                continue
+
+            if response.status_code == 401 and not noretry and not refreshed:
+                # refresh token (unless another thread already has) and try again
+                logging.warning("got HTTP 401; refreshing token and retrying")
+                if self._access_token == access_token:
+                    self.refresh_access_token()
+                refreshed = True
+                continue
+
+            if not noretry and retry_policy.should_retry(attempt, response):
+                retry_policy.sleep(attempt, response)
+                continue
+
+            return response
 
     def get(self, url, params=None, **kwargs):
         """HTTP GET with OAuth."""
@@ -252,6 +402,86 @@ class OneDriveOAuthClient(object):
         """HTTP DELETE with OAuth."""
         return self.request("delete", url, **kwargs)
 
+    def batch(self, sub_requests, jobs=1):
+        """Make requests in JSON batches.
+
+        Requests are grouped into batches of up to
+        ``onedrive.batch.MAX_BATCH_SIZE``. Like with ``request``,
+        requests answered with a transient error (e.g., HTTP 429) are
+        retried (in new batches) according to ``retry_policy``.
+
+        Parameters
+        ----------
+        sub_requests : list
+            List of ``onedrive.batch.BatchRequest`` objects. Requests may
+            be processed in any order.
+        jobs : int, optional
+            Number of batches in flight at once. Default is 1.
+
+        Returns
+        -------
+        responses : list
+            List of ``onedrive.batch.BatchResponse`` objects, in the same
+            order as ``sub_requests``.
+
+        Raises
+        ------
+        onedrive.exceptions.APIRequestError
+            If a batch request itself fails.
+
+        """
+        responses = [None] * len(sub_requests)
+        todo = list(range(len(sub_requests)))
+        attempt = 0
+
+        def post_group(group):
+            """Make the batch request of a group of requests."""
+            payload = {"requests": [sub_requests[index].to_json(str(index))
+                                    for index in group]}
+            batch_response = self.post("$batch", json=payload, request_count=len(group))
+            if batch_response.status_code != 200:
+                raise onedrive.exceptions.APIRequestError(
+                    response=batch_response, request_desc="batch request")
+            return batch_response.json()["responses"]
+
+        executor = (concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+                    if jobs > 1 else None)
+        try:
+            while todo:
+                attempt += 1
+                retry = []
+                groups = [todo[start:start + onedrive.batch.MAX_BATCH_SIZE]
+                          for start in range(0, len(todo), onedrive.batch.MAX_BATCH_SIZE)]
+                for items in (executor.map(post_group, groups) if executor is not None
+                              else map(post_group, groups)):
+                    for item in items:
+                        index = int(item["id"])
+                        response = onedrive.batch.BatchResponse(
+                            sub_requests[index], item["status"],
+                            headers=item.get("headers"), body=item.get("body"))
+                        onedrive.log.log_response(response)
+                        responses[index] = response
+                        if self.retry_policy.should_retry(attempt, response):
+                            retry.append(index)
+                if retry:
+                    # wait for the longest Retry-After, if any
+                    delays = [self.retry_policy.delay(attempt, responses[index])
+                              for index in retry]
+                    logging.warning("got transient errors for %d batched requests; "
+                                    "retrying after %.1f seconds", len(retry), max(delays))
+                    time.sleep(max(delays))
+                todo = sorted(retry)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+        missing = [index for index, response in enumerate(responses) if response is None]
+        if missing:
+            msg = ("no response to batched request %s %s" %
+                   (sub_requests[missing[0]].method, sub_requests[missing[0]].url))
+            raise onedrive.exceptions.APIRequestError(msg=msg, request_desc="batch request")
+        return responses
+
 def main():
     """Authorization CLI."""
     OneDriveOAuthClient(authorize=True)
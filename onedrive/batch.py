@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""JSON batching of API requests.
+
+Up to ``MAX_BATCH_SIZE`` requests can be combined into a single ``POST`` to
+the ``$batch`` endpoint::
+
+    {
+      "requests": [
+        {"id": "1", "method": "GET", "url": "/drive/root:/a"},
+        {"id": "2", "method": "DELETE", "url": "/drive/root:/b"}
+      ]
+    }
+
+and the response contains one entry per request::
+
+    {
+      "responses": [
+        {"id": "1", "status": 200, "headers": {...}, "body": {...}},
+        {"id": "2", "status": 204, "headers": {...}}
+      ]
+    }
+
+The server may process requests of the same batch in any order, so
+requests depending on each other should not be batched together.
+
+This module provides the description of a batched request
+(``BatchRequest``) and of its individual response (``BatchResponse``,
+which can be used in place of a ``requests.Response`` when interpreting
+results or raising exceptions). See
+``onedrive.auth.OneDriveOAuthClient.batch`` for making the requests.
+
+"""
+
+import json
+import urllib.parse
+
+import requests.structures
+
+MAX_BATCH_SIZE = 20
+
+class BatchRequest(object):
+    """A request to be made as part of a batch.
+
+    Parameters
+    ----------
+    method : str
+        HTTP method.
+    url : str
+        URL relative to the API endpoint, e.g., ``"drive/root:/a"``.
+    params : dict, optional
+        Query parameters.
+    json : dict, optional
+        JSON body.
+    headers : dict, optional
+
+    Attributes
+    ----------
+    method : str
+        Uppercase HTTP method.
+    url : str
+        Relative URL, including the query string.
+    json : dict
+    headers : dict
+
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, method, url, params=None, json=None, headers=None):
+        """Init."""
+        # pylint: disable=redefined-outer-name
+        self.method = method.upper()
+        self.url = "/" + url.lstrip("/")
+        if params:
+            self.url += "?" + urllib.parse.urlencode(params)
+        self.json = json
+        self.headers = headers
+
+    def to_json(self, request_id):
+        """Return the JSON object describing the request in a batch."""
+        obj = {"id": request_id, "method": self.method, "url": self.url}
+        if self.json is not None:
+            obj["body"] = self.json
+            obj["headers"] = {"Content-Type": "application/json"}
+        if self.headers:
+            obj.setdefault("headers", {}).update(self.headers)
+        return obj
+
+class BatchResponse(object):
+    """Response to a batched request.
+
+    Quacks like a ``requests.Response`` as far as this package is
+    concerned (``status_code``, ``headers``, ``text``, ``json()`` and
+    ``request``).
+
+    Parameters
+    ----------
+    request : BatchRequest
+    status_code : int
+    headers : dict, optional
+    body : dict, optional
+        Decoded JSON body.
+
+    Attributes
+    ----------
+    request : BatchRequest
+    status_code : int
+    headers : requests.structures.CaseInsensitiveDict
+
+    """
+
+    def __init__(self, request, status_code, headers=None, body=None):
+        """Init."""
+        self.request = request
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers or {})
+        self._body = body
+
+    @property
+    def ok(self):
+        """Whether the status code is less than 400."""
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        """The body, serialized as JSON (empty string if no body)."""
+        return json.dumps(self._body) if self._body is not None else ""
+
+    def json(self):
+        """Return the decoded JSON body.
+
+        Raises
+        ------
+        ValueError
+            If there is no body.
+
+        """
+        if self._body is None:
+            raise ValueError("no JSON body in response to %s %s" %
+                             (self.request.method, self.request.url))
+        return self._body
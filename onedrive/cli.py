@@ -6,21 +6,28 @@
 
 import argparse
 import ast
+import collections
 import json
-import multiprocessing
 import os
 import posixpath
+import queue
 import re
 import sys
 import textwrap
+import threading
+import time
 
 from zmwangx.colorout import cerror, cfatal_error, cprogress
 import zmwangx.humansize
 import zmwangx.pbar
 
 import onedrive.api
+import onedrive.copy_helper
+import onedrive.diff_helper
 import onedrive.exceptions
+import onedrive.index
 import onedrive.log
+import onedrive.transfer
 import onedrive.util
 
 def _init_client():
@@ -35,46 +42,11 @@ def _init_client():
 
     """
     try:
-        return onedrive.api.OneDriveAPIClient()
+        return onedrive.api.OneDriveAPIClient(metadata_cache=True, background_refresh=True)
     except OSError as err:
         cerror(str(err))
         exit(1)
 
-class Uploader(object):
-    """Uploader that uploads files to a given OneDrive directory.
-
-    Parameters
-    ----------
-    client : onedrive.api.OneDriveAPIClient
-    directory : str
-        Remote directory to upload to.
-    upload_kwargs : str
-        Keyword arguments directly passed to
-        ``onedrive.api.OneDriveAPIClient.upload``.
-
-    """
-
-    def __init__(self, client, directory, upload_kwargs):
-        """Init."""
-        self._client = client
-        self._directory = directory
-        self._upload_kwargs = upload_kwargs
-
-    def __call__(self, local_path):
-        """Upload a local file."""
-        try:
-            self._client.upload(self._directory, local_path, **self._upload_kwargs)
-            cprogress("finished uploading '%s'" % local_path)
-            return 0
-        except KeyboardInterrupt:
-            cerror("upload of '%s' interrupted" % local_path)
-            return 1
-        except Exception as err:
-            # catch any exception in a multiprocessing environment
-            cerror("failed to upload '%s' to '%s': %s: %s" %
-                   (local_path, self._directory, type(err).__name__, str(err)))
-            return 1
-
 def cli_upload():
     """Upload CLI."""
     parser = argparse.ArgumentParser()
@@ -93,13 +65,19 @@ def cli_upload():
     parser.add_argument("--base-segment-timeout", type=float, default=14,
                         help="""base timeout for uploading a single
                         segment (10MiB), with one second added to this
-                        base timeout for each worker; default is 14""")
+                        base timeout for each concurrent segment upload
+                        (workers times parallel chunks); default is 14""")
     parser.add_argument("--stream", action="store_true",
                         help="""Use streaming workers (that stream each
                         chunk) instead of regular workers; only use this
                         if you are running a great number of workers
                         concurrently, or if you are extremely concerned
                         about memory usage""")
+    parser.add_argument("-p", "--parallel-chunks", type=int, default=1,
+                        help="""number of chunks of the same file to
+                        upload concurrently in resumable upload (each
+                        chunk in flight is held in memory unless
+                        --stream is specified); default is 1""")
     parser.add_argument("--simple-upload-threshold", type=int, default=1048576,
                         help="""file size threshold (in bytes) for using
                         chunked, resumable upload API instead of simple,
@@ -111,6 +89,10 @@ def cli_upload():
                         help="""do not compare checksum of local and
                         remote files (this prevents you from resuming an
                         upload in case of a failure)""")
+    parser.add_argument("--hash-pipeline", action="store_true",
+                        help="""compute the checksum of each file
+                        while uploading it in resumable upload, instead
+                        of reading the whole file beforehand""")
     args = parser.parse_args()
 
     num_files = len(args.local_paths)
@@ -122,8 +104,10 @@ def cli_upload():
         "simple_upload_threshold": args.simple_upload_threshold,
         "compare_hash": not args.no_check,
         "chunk_size": args.chunk_size,
-        "timeout": args.base_segment_timeout + jobs,
+        "timeout": args.base_segment_timeout + jobs * max(1, args.parallel_chunks),
         "stream": args.stream,
+        "parallel_chunks": args.parallel_chunks,
+        "hash_pipeline": args.hash_pipeline,
         "show_progress": show_progress,
     }
 
@@ -141,19 +125,26 @@ def cli_upload():
     if show_progress:
         cprogress("preparing to upload to '%s'" % directory)
         cprogress("directory URL: %s" % directory_url)
-    with multiprocessing.Pool(processes=jobs, maxtasksperchild=1) as pool:
-        uploader = Uploader(client, directory, upload_kwargs)
-        returncodes = []
-        try:
-            returncodes = pool.map(uploader, args.local_paths, chunksize=1)
-        except KeyboardInterrupt:
-            returncodes.append(1)
-        return 1 if 1 in returncodes else 0
+    returncode = 0
+    try:
+        with onedrive.transfer.TransferEngine(
+                client, jobs=jobs, connections_per_job=args.parallel_chunks) as engine:
+            for local_path, error in engine.upload(directory, args.local_paths,
+                                                   **upload_kwargs):
+                if error is None:
+                    cprogress("finished uploading '%s'" % local_path)
+                else:
+                    cerror("failed to upload '%s' to '%s': %s: %s" %
+                           (local_path, directory, type(error).__name__, str(error)))
+                    returncode = 1
+    except KeyboardInterrupt:
+        cerror("interrupted")
+        returncode = 1
+    return returncode
 
 def cli_dirupload():
     """Directory upload CLI."""
     # TODO: how to handle uploading to an existing and non-empty directory tree?
-    # TODO: concurrency
     # TODO: option to skip creating directories (useful for resuming dirupload)
     parser = argparse.ArgumentParser()
     parser.add_argument("remotedir", help="remote *parent* directory to upload to")
@@ -162,12 +153,21 @@ def cli_dirupload():
                         help="""name of the remote directory (by default
                         it is just the basename of the local
                         directory)""")
+    parser.add_argument("-j", "--jobs", type=int, default=4,
+                        help="""number of concurrect uploads, use 0 for
+                        64; default is 4""")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="""only upload files that are new or changed
+                        (compared by size and modification time, or
+                        cached checksum) with respect to the remote
+                        directory tree, which is listed once upfront;
+                        changed files are replaced""")
     args = parser.parse_args()
 
     localroot = os.path.abspath(args.localdir)
     remoteparent = args.remotedir
     remotename = args.name if args.name is not None else os.path.basename(localroot)
-    remoteroot = posixpath.join(remoteparent, remotename)
+    remoteroot = posixpath.normpath(posixpath.join(remoteparent, remotename))
 
     onedrive.log.logging_setup()
     client = _init_client()
@@ -181,52 +181,121 @@ def cli_dirupload():
         return 1
 
     try:  # KeyboardInterrupt guard block
-        show_progress = zmwangx.pbar.autopbar()
-        cprogress("creating directories...")
-        # uploads is a list of tuples (remotedir, localfile, filesize) to upload
         # TODO: default exclusions (e.g., .DS_Store) and user-specified exclusions
-        # TODO: save calls by creating leaves only (topdown false, and use a
-        # set to keep track of already created relpaths, and once a leaf is
-        # created, add to the set itself and all its parents)
-        uploads = []
-        for localdir, _, files in os.walk(localroot):
-            normalized_relpath = onedrive.util.normalized_posixpath(
-                os.path.relpath(localdir, start=localroot))
-            remotedir = posixpath.normpath(posixpath.join(remoteroot, normalized_relpath))
-            client.makedirs(remotedir, exist_ok=True)  # TODO: exist_ok?
-            print(remotedir, file=sys.stderr)
-
-            for filename in files:
-                localfile = os.path.join(localdir, filename)
-                uploads.append((remotedir, localfile, os.path.getsize(localfile)))
-
-        # upload files in ascending order of filesize
-        uploads = sorted(uploads, key=lambda upload: upload[2])
-        returncode = 0
-        total = remaining = len(uploads)
-        total_bytes = remaining_bytes = sum([upload[2] for upload in uploads])
-        cprogress("uploading %d files..." % total)
-
-        for upload in uploads:
-            remotedir, localfile, filesize = upload
-            cprogress("remaining: %d/%d files, %s/%s" %
-                      (remaining, total,
-                       zmwangx.humansize.humansize(remaining_bytes, prefix="iec", unit=""),
-                       zmwangx.humansize.humansize(total_bytes, prefix="iec", unit="")))
-            try:
-                client.upload(remotedir, localfile, show_progress=show_progress)
-                cprogress("finished uploading '%s'" % localfile)
-            except Exception as err:
-                cerror("failed to upload '%s' to '%s': %s: %s" %
-                       (localfile, remotedir, type(err).__name__, str(err)))
-                returncode = 1
+        local_dirs, local_files = onedrive.diff_helper.local_snapshot(localroot)
 
-            remaining -= 1
-            remaining_bytes -= filesize
+        def remote_path(relpath):
+            """Remote path of a relative path in the tree."""
+            return posixpath.normpath(posixpath.join(remoteroot, relpath))
+
+        # directories known to exist
+        created = set()
+        if args.incremental:
+            cprogress("listing '%s'..." % remoteroot)
+            try:
+                remote_dirs, remote_files = onedrive.diff_helper.remote_snapshot(
+                    client, remoteroot, jobs=max(8, args.jobs))
+            except onedrive.exceptions.FileNotFoundError:
+                remote_dirs, remote_files = set(), []
+            created.update(remote_path(reldir) for reldir in remote_dirs)
+            changes = [(relpath, local_path, stat,
+                        {"check_remote": False} if metadata is None else
+                        {"conflict_behavior": "replace"})
+                       for relpath, local_path, stat, metadata in
+                       onedrive.diff_helper.diff_trees(local_files, remote_files,
+                                                       hash_cache=client.hash_cache)]
+            cprogress("skipping %d unchanged files" % (len(local_files) - len(changes)))
+        else:
+            changes = [(relpath, local_path, stat, {})
+                       for relpath, local_path, stat in local_files]
+
+        # files maps each remote directory to a list of triples (localfile,
+        # filesize, upload_kwargs), in ascending order of filesize
+        files = collections.OrderedDict((remote_path(reldir), []) for reldir in local_dirs)
+        for relpath, local_path, stat, upload_kwargs in changes:
+            files[remote_path(posixpath.dirname(relpath))].append(
+                (local_path, stat.st_size, upload_kwargs))
+        for triples in files.values():
+            triples.sort(key=lambda triple: triple[1])
+        parents = set(posixpath.dirname(reldir) for reldir in local_dirs if reldir)
+        leaves = [remote_path(reldir) for reldir in local_dirs if reldir not in parents]
+
+        total = remaining = len(changes)
+        total_bytes = remaining_bytes = sum([stat.st_size for _, _, stat, _ in changes])
+        jobs = args.jobs if args.jobs > 0 else 64
+        show_progress = (jobs == 1) and zmwangx.pbar.autopbar()
+
+        # directories are created in a pipeline stage of their own, and the
+        # files of each directory are queued for upload as soon as it exists
+        uploads = queue.Queue()
+
+        def create_directories():
+            """Create the leaf directories, queueing files for upload."""
+            try:
+                for remotedir in files:
+                    if remotedir in created:
+                        for localfile, filesize, upload_kwargs in files[remotedir]:
+                            uploads.put((remotedir, localfile, filesize, upload_kwargs))
+                for leaf in leaves:
+                    if leaf in created:
+                        continue
+                    try:
+                        # intermediate directories are created along the way
+                        client.makedirs(leaf, exist_ok=True)
+                    except Exception as err:
+                        cerror("failed to create '%s': %s: %s" %
+                               (leaf, type(err).__name__, str(err)))
+                        continue
+                    cprogress("created directory '%s'" % leaf)
+                    remotedir = leaf
+                    while remotedir in files and remotedir not in created:
+                        created.add(remotedir)
+                        for localfile, filesize, upload_kwargs in files[remotedir]:
+                            uploads.put((remotedir, localfile, filesize, upload_kwargs))
+                        remotedir = posixpath.dirname(remotedir)
+            finally:
+                uploads.put(None)
+
+        def pending_uploads():
+            """Generate uploads as their directories get created."""
+            while True:
+                upload = uploads.get()
+                if upload is None:
+                    return
+                yield upload
+
+        cprogress("creating directories and uploading %d files..." % total)
+        mkdir_thread = threading.Thread(target=create_directories)
+        mkdir_thread.daemon = True
+        mkdir_thread.start()
 
+        returncode = 0
+        with onedrive.transfer.TransferEngine(client, jobs=jobs) as engine:
+            for upload, _, error in engine.run(
+                    lambda upload: client.upload(upload[0], upload[1],
+                                                 show_progress=show_progress, **upload[3]),
+                    pending_uploads()):
+                remotedir, localfile, filesize, _ = upload
+                if error is None:
+                    cprogress("finished uploading '%s'" % localfile)
+                else:
+                    cerror("failed to upload '%s' to '%s': %s: %s" %
+                           (localfile, remotedir, type(error).__name__, str(error)))
+                    returncode = 1
+                remaining -= 1
+                remaining_bytes -= filesize
+                cprogress("remaining: %d/%d files, %s/%s" %
+                          (remaining, total,
+                           zmwangx.humansize.humansize(remaining_bytes, prefix="iec", unit=""),
+                           zmwangx.humansize.humansize(total_bytes, prefix="iec", unit="")))
+
+        if remaining:
+            cerror("%d files not uploaded since their directories could not be created" %
+                   remaining)
+            returncode = 1
         return returncode
     except KeyboardInterrupt:
-        cerror("interrupted" % localfile)
+        cerror("interrupted")
         return 1
 
 def cli_geturl():
@@ -328,6 +397,9 @@ def _cli_ls_single_directory(client, directory, **kwargs):
         Default is ``True``.
     long : bool, optional
         Default is ``True``.
+    jobs : int, optional
+        Number of directories to list concurrently in tree mode. Default
+        is 1.
 
     """
     metadata = kwargs.pop("metadata", None)
@@ -335,9 +407,12 @@ def _cli_ls_single_directory(client, directory, **kwargs):
     tree = kwargs.pop("tree", False)
     human = kwargs.pop("human", True)
     long = kwargs.pop("long", True)
+    jobs = kwargs.pop("jobs", 1)
+
+    fields = onedrive.api.SELECT_LS_LONG if long else onedrive.api.SELECT_PATHS_ONLY
 
     if metadata is None:
-        metadata = client.metadata(directory)
+        metadata = client.metadata(directory, fields=fields)
 
     if not tree:
         if dironly:
@@ -348,12 +423,12 @@ def _cli_ls_single_directory(client, directory, **kwargs):
                 print("total %s" %
                       zmwangx.humansize.humansize(metadata["size"], prefix="iec", unit=""))
 
-            children = client.children(directory)
-            for child in children:
+            for child in client.iterchildren(directory, fields=fields):
                 _cli_ls_print_entry(child, long=long, human=human)
     else:
         # directory tree, where interesting things happen
-        for level, root, _, files in client.walkn(top=directory, check_dir=False):
+        for level, root, _, files in client.walkn(top=directory, check_dir=False,
+                                                  metadata=metadata, fields=fields, jobs=jobs):
             _cli_ls_print_entry(root, level, long=long, human=human)
             if not dironly:
                 for item in files:
@@ -407,6 +482,9 @@ def cli_ls():
                         option, omit files in a directory tree""")
     parser.add_argument("-t", "--tree", action="store_true",
                         help="display full directory trees")
+    parser.add_argument("-j", "--jobs", type=int, default=8,
+                        help="""number of directories to list concurrently
+                        in tree mode; default is 8""")
     parser.add_argument("+h", "++human", action="store_false",
                         help="turn off human readable format")
     parser.add_argument("+l", "++long", action="store_false",
@@ -451,7 +529,8 @@ def cli_ls():
         # list directories
 
         # common kwargs
-        kwargs = {"dironly": dironly, "tree": tree, "human": human, "long": long}
+        kwargs = {"dironly": dironly, "tree": tree, "human": human, "long": long,
+                  "jobs": args.jobs}
 
         # handle first directory specially due to special blank line annoyance
         firstdirpath, firstdirmetadata = dirs[0]
@@ -481,41 +560,6 @@ def cli_ls():
 
     return returncode
 
-class Downloader(object):
-    """Downloader that downloads files from OneDrive."""
-
-    def __init__(self, client, download_kwargs):
-        """Set client and paramters."""
-        self._client = client
-        self._download_kwargs = download_kwargs
-
-    def __call__(self, args):
-        """Download a remote file.
-
-        ``args`` could either be a single path, which is interpreted as
-        path to the remote file to download (to the current working
-        directory), or a pair ``(remotepath, localdir)``, where localdir
-        is interpreted as the destination directory.
-
-        """
-        if isinstance(args, tuple):
-            remotepath, localdir = args
-        else:
-            remotepath = args
-            localdir = None
-        try:
-            self._client.download(remotepath, destdir=localdir, **self._download_kwargs)
-            cprogress("finished downloading '%s'" % remotepath)
-            return 0
-        except KeyboardInterrupt:
-            cerror("download of '%s' interrupted" % remotepath)
-            return 1
-        except Exception as err:
-            # catch any exception in a multiprocessing environment
-            cerror("failed to download '%s': %s: %s" %
-                   (remotepath, type(err).__name__, str(err)))
-            return 1
-
 def cli_download():
     """Download CLI."""
     parser = argparse.ArgumentParser()
@@ -527,6 +571,10 @@ def cli_download():
                         help="do not compare checksum of remote and local files")
     parser.add_argument("-f", "--fresh", action="store_true",
                         help="discard any previous failed download")
+    parser.add_argument("-c", "--connections", type=int, default=1,
+                        help="""number of connections used to download
+                        each file in segments (not applicable to --curl
+                        or --wget); default is 1""")
     parser.add_argument("--curl", dest="downloader", action="store_const", const="curl",
                         help="use curl to download")
     parser.add_argument("--wget", dest="downloader", action="store_const", const="wget",
@@ -542,19 +590,53 @@ def cli_download():
         "show_progress": show_progress,
         "resume": not args.fresh,
         "downloader": args.downloader,
+        "connections": args.connections,
     }
 
     onedrive.log.logging_setup()
     client = _init_client()
 
-    with multiprocessing.Pool(processes=jobs, maxtasksperchild=1) as pool:
-        downloader = Downloader(client, download_kwargs=download_kwargs)
-        returncodes = []
-        try:
-            returncodes = pool.map(downloader, args.paths, chunksize=1)
-        except KeyboardInterrupt:
-            returncodes.append(1)
-        return 1 if 1 in returncodes else 0
+    try:
+        return _download_files(client, args.paths, jobs, args.connections, download_kwargs)
+    except KeyboardInterrupt:
+        cerror("interrupted")
+        return 1
+
+def _download_files(client, items, jobs, connections, download_kwargs):
+    """Download files concurrently, reporting progress and errors.
+
+    Parameters
+    ----------
+    client : onedrive.api.OneDriveAPIClient
+    items : iterable
+        Remote paths, pairs ``(remotepath, localdir)``, or triples
+        ``(remotepath, localdir, metadata)``.
+    jobs : int
+        Number of concurrent downloads.
+    connections : int
+        Number of connections used by each download.
+    download_kwargs : dict
+        Keyword arguments passed to
+        ``onedrive.api.OneDriveAPIClient.download``.
+
+    Returns
+    -------
+    returncode : int
+        0 on success, 1 if any download failed.
+
+    """
+    returncode = 0
+    with onedrive.transfer.TransferEngine(
+            client, jobs=jobs, connections_per_job=connections) as engine:
+        for item, error in engine.download(items, **download_kwargs):
+            remotepath = item[0] if isinstance(item, tuple) else item
+            if error is None:
+                cprogress("finished downloading '%s'" % remotepath)
+            else:
+                cerror("failed to download '%s': %s: %s" %
+                       (remotepath, type(error).__name__, str(error)))
+                returncode = 1
+    return returncode
 
 def cli_dirdownload():
     """Directory download CLI."""
@@ -562,11 +644,18 @@ def cli_dirdownload():
     parser.add_argument("remotedir", help="remote directory to download")
     parser.add_argument("localdir", help="path to the local *parent* directory to download to")
     parser.add_argument("-j", "--jobs", type=int, default=8,
-                        help="number of concurrect downloads, use 0 for unlimited; default is 8")
+                        help="""number of concurrect downloads, use 0 for
+                        64 (files are downloaded while the tree is
+                        being listed, so the number of files is not
+                        known in advance); default is 8""")
     parser.add_argument("--no-check", action="store_true",
                         help="do not compare checksum of remote and local files")
     parser.add_argument("-f", "--fresh", action="store_true",
                         help="discard any previous failed download")
+    parser.add_argument("-c", "--connections", type=int, default=1,
+                        help="""number of connections used to download
+                        each file in segments (not applicable to --curl
+                        or --wget); default is 1""")
     parser.add_argument("--curl", dest="downloader", action="store_const", const="curl",
                         help="use curl to download")
     parser.add_argument("--wget", dest="downloader", action="store_const", const="wget",
@@ -594,45 +683,48 @@ def cli_dirdownload():
         return 1
 
     try:  # KeyboardInterrupt guard block
-        show_progress = zmwangx.pbar.autopbar()
-        cprogress("creating local directories...")
-        # downloads is a list of pairs (remotefile, localdir) to download
-        downloads = []
-        for remotedir, _, files in client.walk(remoteroot, paths_only=True):
-            normalized_relpath = onedrive.util.normalized_ospath(
-                posixpath.relpath(remotedir, start=remoteroot))
-            localdir = os.path.normpath(os.path.join(localroot, normalized_relpath))
-            os.makedirs(localdir, exist_ok=True)
-            print(localdir, file=sys.stderr)
-
-            for filename in files:
-                remotefile = posixpath.join(remotedir, filename)
-                downloads.append((remotefile, localdir))
-
-        num_files = len(downloads)
-        jobs = min(args.jobs, num_files) if args.jobs > 0 else num_files
-        show_progress = (num_files == 1) and zmwangx.pbar.autopbar()
+        # the tree is listed while files are downloaded: the generator
+        # below is consumed by the transfer engine, which keeps only a
+        # few downloads scheduled at a time, so transfers start with the
+        # first listing, and memory use does not depend on the size of
+        # the tree
+        jobs = args.jobs if args.jobs > 0 else 64
+        walk_jobs = args.jobs if args.jobs > 0 else 8
+
+        def downloads():
+            """Generate triples (remotefile, localdir, metadata) to download.
+
+            The metadata (with download URLs) comes with the listings,
+            so no further metadata request is needed per file. Local
+            directories are created as they are reached.
+
+            """
+            for reldir, dirs, files in onedrive.diff_helper.iter_remote_tree(
+                    client, remoteroot, jobs=walk_jobs, fields=onedrive.api.SELECT_DOWNLOAD):
+                remotedir = posixpath.join(remoteroot, reldir) if reldir else remoteroot
+                localdir = os.path.normpath(
+                    os.path.join(localroot, onedrive.util.normalized_ospath(reldir)))
+                if (files or not dirs) and not os.path.isdir(localdir):
+                    # (intermediate directories are created along the way)
+                    os.makedirs(localdir, exist_ok=True)
+                    cprogress("created directory '%s'" % localdir)
+                for metadata in files:
+                    yield posixpath.join(remotedir, metadata["name"]), localdir, metadata
 
         download_kwargs = {
             "compare_hash": not args.no_check,
-            "show_progress": show_progress,
+            "show_progress": False,
             "resume": not args.fresh,
             "downloader": args.downloader,
+            "connections": args.connections,
         }
 
-        cprogress("downloading %d files..." % num_files)
+        cprogress("downloading files...")
 
-        with multiprocessing.Pool(processes=jobs, maxtasksperchild=1) as pool:
-            downloader = Downloader(client, download_kwargs=download_kwargs)
-            returncodes = []
-            try:
-                returncodes = pool.map(downloader, downloads, chunksize=1)
-            except KeyboardInterrupt:
-                returncodes.append(1)
-            return 1 if 1 in returncodes else 0
+        return _download_files(client, downloads(), jobs, args.connections, download_kwargs)
 
     except KeyboardInterrupt:
-        cerror("interrupted" % localfile)
+        cerror("interrupted")
         return 1
 
 def cli_mkdir():
@@ -647,19 +739,24 @@ def cli_mkdir():
     onedrive.log.logging_setup()
     client = _init_client()
 
+    try:
+        if args.parents:
+            results = client.makedirs_many(args.paths, exist_ok=True)
+        else:
+            results = client.mkdir_many(args.paths)
+    except Exception as err:
+        cfatal_error("%s: %s" % (type(err).__name__, str(err)))
+        return 1
+
     returncode = 0
-    for path in args.paths:
-        try:
-            if args.parents:
-                metadata = client.makedirs(path, exist_ok=True)
-            else:
-                metadata = client.mkdir(path)
-            cprogress("directory '%s' created at '%s'" %
-                      (path, metadata["webUrl"]))
-        except Exception as err:
+    for path, result in zip(args.paths, results):
+        if isinstance(result, Exception):
             cerror("failed to create directory '%s': %s: %s" %
-                   (path, type(err).__name__, str(err)))
+                   (path, type(result).__name__, str(result)))
             returncode = 1
+        else:
+            cprogress("directory '%s' created at '%s'" %
+                      (path, result["webUrl"]))
     return returncode
 
 def cli_rm():
@@ -669,20 +766,27 @@ def cli_rm():
                         help="path of remote item to remove")
     parser.add_argument("-r", "-R", "--recursive", action="store_true",
                         help="remove directories and their contents recursively")
+    parser.add_argument("-j", "--jobs", type=int, default=4,
+                        help="number of batches of deletions in flight; default is 4")
     args = parser.parse_args()
 
     onedrive.log.logging_setup()
     client = _init_client()
 
+    try:
+        results = client.rm_many(args.paths, recursive=args.recursive, jobs=args.jobs)
+    except Exception as err:
+        cfatal_error("%s: %s" % (type(err).__name__, str(err)))
+        return 1
+
     returncode = 0
-    for path in args.paths:
-        try:
-            client.rm(path, recursive=args.recursive)
-            cprogress("'%s' removed from OneDrive" % path)
-        except Exception as err:
+    for path, result in zip(args.paths, results):
+        if isinstance(result, Exception):
             cerror("failed to remove '%s': %s: %s" %
-                   (path, type(err).__name__, str(err)))
+                   (path, type(result).__name__, str(result)))
             returncode = 1
+        else:
+            cprogress("'%s' removed from OneDrive" % path)
     return returncode
 
 def cli_rmdir():
@@ -690,76 +794,29 @@ def cli_rmdir():
     parser = argparse.ArgumentParser()
     parser.add_argument("paths", metavar="DIRECTORY", nargs="+",
                         help="path of remote directory to remove")
+    parser.add_argument("-j", "--jobs", type=int, default=4,
+                        help="number of batches of deletions in flight; default is 4")
     args = parser.parse_args()
 
     onedrive.log.logging_setup()
     client = _init_client()
 
+    try:
+        results = client.rmdir_many(args.paths, jobs=args.jobs)
+    except Exception as err:
+        cfatal_error("%s: %s" % (type(err).__name__, str(err)))
+        return 1
+
     returncode = 0
-    for path in args.paths:
-        try:
-            client.rmdir(path)
-            cprogress("directory '%s' removed from OneDrive" % path)
-        except Exception as err:
+    for path, result in zip(args.paths, results):
+        if isinstance(result, Exception):
             cerror("failed to remove '%s': %s: %s" %
-                   (path, type(err).__name__, str(err)))
+                   (path, type(result).__name__, str(result)))
             returncode = 1
+        else:
+            cprogress("directory '%s' removed from OneDrive" % path)
     return returncode
 
-class CopyWorker(multiprocessing.Process):
-    """A worker for copying an item on OneDrive.
-
-    Parameters
-    ----------
-    client : onedrive.api.OneDriveAPIClient
-    src, dst : str
-        Source and destination of the copy operation. Passed to
-        ``onedrive.api.OneDriveAPIClient.copy``.
-    recursive : bool, optional
-        Whether to allow recursive copying of a directory. Default is
-        ``False``.
-    overwrite, show_progress : bool, optional
-        Passed to ``onedrive.api.OneDriveAPIClient.copy``. Defaults are
-        ``False``.
-
-    Attributes
-    ----------
-    src, dst : str
-
-    """
-
-    def __init__(self, client, src, dst, recursive=False, overwrite=False, show_progress=False):
-        """Init."""
-        super().__init__()
-        self._client = client
-        self.src = src
-        self.dst = dst
-        self._recursive = recursive
-        self._overwrite = overwrite
-        self._show_progress = show_progress
-
-    def run(self):
-        """Run the copy operation and monitor status.
-
-        The exit code is either 0 or 1, indicating success or failure.
-
-        """
-        try:
-            if not self._recursive:
-                self._client.assert_file(self.src)
-            self._client.copy(self.src, self.dst,
-                              overwrite=self._overwrite, show_progress=self._show_progress)
-            cprogress("finished copying '%s' to '%s'" % (self.src, self.dst))
-            return 0
-        except KeyboardInterrupt:
-            cerror("copying '%s' to '%s' interrupted" % (self.src, self.dst))
-            return 1
-        except Exception as err:
-            # catch any exception in a multiprocessing environment
-            cerror("failed to copy '%s' to '%s': %s: %s" %
-                   (self.src, self.dst, type(err).__name__, str(err)))
-            return 1
-
 def cli_mv_or_cp(util, util_name=None):
     """Mimic the behavior of coreutils ``mv`` or ``cp``.
 
@@ -788,6 +845,11 @@ def cli_mv_or_cp(util, util_name=None):
     if util == "cp":
         parser.add_argument("-R", "-r", "--recursive", action="store_true",
                             help="copy directories recursively")
+        parser.add_argument("-j", "--jobs", type=int, default=8,
+                            help="""maximum number of copy and status
+                            requests in flight (copy jobs in progress
+                            on the server are not limited); default is
+                            8""")
     args = parser.parse_args()
 
     onedrive.log.logging_setup()
@@ -846,31 +908,49 @@ def cli_mv_or_cp(util, util_name=None):
     # 3, 2, 1, action!
     returncode = 0
     if util == "mv":
-        # move each item synchronously
-        for src_dst_pair in src_dst_list:
-            src, dst = src_dst_pair
-            try:
-                client.move(src, dst, overwrite=args.force)
-                cprogress("moved '%s' to '%s'" % (src, dst))
-            except Exception as err:
+        # move all items in batches
+        try:
+            results = client.move_many(src_dst_list, overwrite=args.force)
+        except Exception as err:
+            cfatal_error("%s: %s" % (type(err).__name__, str(err)))
+            return 1
+        for (src, dst), result in zip(src_dst_list, results):
+            if isinstance(result, Exception):
                 cerror("failed to move '%s' to '%s': %s: %s" %
-                       (src, dst, type(err).__name__, str(err)))
+                       (src, dst, type(result).__name__, str(result)))
                 returncode = 1
+            else:
+                cprogress("moved '%s' to '%s'" % (src, dst))
     else:
-        # cp is more involved
+        # cp is more involved: copies are asynchronous on the server
+        # side, and are monitored from a single loop (except for a
+        # single item, where progress can be shown)
         num_items = len(src_dst_list)
         show_progress = (num_items == 1) and zmwangx.pbar.autopbar()
-        workers = [CopyWorker(client, src, dst, recursive=args.recursive, overwrite=args.force,
-                              show_progress=show_progress)
-                   for src, dst in src_dst_list]
         try:
-            for worker in workers:
-                worker.start()
-            for worker in workers:
-                worker.join()
-                if worker.exitcode != 0:
+            if show_progress:
+                src, dst = src_dst_list[0]
+                try:
+                    if not args.recursive:
+                        client.assert_file(src)
+                    client.copy(src, dst, overwrite=args.force, show_progress=True,
+                                optimistic=True)
+                    results = [(src, dst, None)]
+                except Exception as err:
+                    results = [(src, dst, err)]
+            else:
+                manager = onedrive.copy_helper.CopyJobManager(client, jobs=args.jobs)
+                results = manager.run(src_dst_list, files_only=not args.recursive,
+                                      overwrite=args.force, optimistic=True)
+            for src, dst, error in results:
+                if error is None:
+                    cprogress("finished copying '%s' to '%s'" % (src, dst))
+                else:
+                    cerror("failed to copy '%s' to '%s': %s: %s" %
+                           (src, dst, type(error).__name__, str(error)))
                     returncode = 1
         except KeyboardInterrupt:
+            cerror("interrupted")
             returncode = 1
 
     return returncode
@@ -904,6 +984,62 @@ def cli_metadata():
                (path, type(err).__name__, str(err)))
         return 1
 
+def cli_index():
+    """Local index CLI."""
+    parser = argparse.ArgumentParser(
+        description="""Build or refresh the local index of remote directory
+        trees (see the 'index' section of the config file). With no path,
+        refresh all indexed trees; pass '/' to index the whole drive.""")
+    parser.add_argument("paths", metavar="DIRECTORY", nargs="*",
+                        help="root of remote tree to index")
+    parser.add_argument("-j", "--jobs", type=int, default=8,
+                        help="number of directories listed concurrently; default is 8")
+    parser.add_argument("-s", "--status", action="store_true",
+                        help="list indexed trees and when they were built, then exit")
+    parser.add_argument("--clear", action="store_true",
+                        help="drop the whole index first (exit if no path is given)")
+    args = parser.parse_args()
+
+    onedrive.log.logging_setup()
+    client = _init_client()
+    index = client.index if client.index is not None else onedrive.index.RemoteIndex()
+    # the trees are listed from the server, not from the index
+    client.index = None
+
+    try:
+        if args.status:
+            for path, built in index.roots():
+                age = time.time() - built
+                stale = index.max_age is not None and age > index.max_age
+                print("%s\t%s%s" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(built)),
+                                     path, " (stale)" if stale else ""))
+            return 0
+        if args.clear:
+            index.clear()
+            cprogress("index cleared")
+            if not args.paths:
+                return 0
+        paths = args.paths
+        if not paths:
+            paths = [path for path, _ in index.roots()]
+            if not paths:
+                cfatal_error("no indexed tree to refresh; give the root of a tree to index "
+                             "('/' for the whole drive)")
+                return 1
+    except Exception as err:
+        cfatal_error("%s: %s" % (type(err).__name__, str(err)))
+        return 1
+
+    returncode = 0
+    for path in paths:
+        try:
+            num_items = index.build(client, path, jobs=args.jobs)
+            cprogress("indexed %d items under '%s'" % (num_items, path))
+        except Exception as err:
+            cerror("failed to index '%s': %s: %s" % (path, type(err).__name__, str(err)))
+            returncode = 1
+    return returncode
+
 def cli_rename():
     """Batch renaming CLI."""
     parser = argparse.ArgumentParser(description="Batch rename all items in a directory.")
@@ -914,6 +1050,9 @@ def cli_rename():
                         help="""print what would be renamed to stderr but don't do them""")
     parser.add_argument("-s", "--show", action="store_true",
                         help="""print what was renamed to what""")
+    parser.add_argument("-j", "--jobs", type=int, default=4,
+                        help="""number of batches of renames in flight;
+                        default is 4""")
     parser.add_argument("stmts",
                         help="""Python statement(s) to be executed on
                         each filename; the statement(s) should modify
@@ -944,8 +1083,10 @@ def cli_rename():
         return 1
 
     returncode = 0
-    children = client.children(directory)
+    children = client.children(directory, fields=onedrive.api.SELECT_PATHS_ONLY)
     index = 0
+    # list of (oldname, newname) pairs
+    renames = []
     for child in children:
         if args.files_only and "folder" in child:
             continue
@@ -970,13 +1111,21 @@ def cli_rename():
         if args.dry_run or args.show:
             print("%s => %s" % (oldname, newname))
 
-        if not args.dry_run:
-            try:
-                client.move(posixpath.join(directory, oldname),
-                            posixpath.join(directory, newname))
-            except Exception as err:
-                cerror("failed to move '%s' for '%s': %s: %s" %
-                       (oldname, newname, type(err).__name__, str(err)))
-                returncode = 1
+        renames.append((oldname, newname))
+
+    if args.dry_run or not renames:
+        return returncode
+
+    # plan all renames at once, then rename in concurrent batches
+    try:
+        results = client.rename_many(directory, renames, children=children, jobs=args.jobs)
+    except Exception as err:
+        cfatal_error("%s: %s" % (type(err).__name__, str(err)))
+        return 1
+    for (oldname, newname), result in zip(renames, results):
+        if isinstance(result, Exception):
+            cerror("failed to move '%s' for '%s': %s: %s" %
+                   (oldname, newname, type(result).__name__, str(result)))
+            returncode = 1
 
     return returncode
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+"""Run many asynchronous copy jobs, monitored from a single loop.
+
+A copy request only starts a job on the server; the job then has to be
+polled through its monitor URL until it completes (see
+``onedrive.api.OneDriveAPIClient.monitor_copy``). Instead of a blocking
+polling loop per job, ``CopyJobManager`` starts the copies with
+``block=False`` and keeps their monitor URLs in a schedule, polling each
+job when it is due, from one loop.
+
+Each job is first polled after ``min_interval`` seconds; every time it
+is still in progress, its interval grows by a factor of ``backoff`` (up
+to ``max_interval``, or longer if the server asks for it with
+Retry-After), so long copies cost few requests. Copy and status requests
+are made on a pool of ``jobs`` threads, which caps the number of
+requests in flight at any time, however many copies are in progress;
+polls that are due take precedence over starting new copies.
+
+"""
+
+import concurrent.futures
+import heapq
+import itertools
+import time
+
+class _CopyJob(object):
+    """A copy job.
+
+    Attributes
+    ----------
+    src, dst : str
+    monitor_url : str
+        ``None`` until the copy is started.
+    interval : float
+        Current polling interval.
+
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, src, dst, interval):
+        """Init."""
+        self.src = src
+        self.dst = dst
+        self.monitor_url = None
+        self.interval = interval
+
+class CopyJobManager(object):
+    """Start copy jobs and monitor them from a single loop.
+
+    Parameters
+    ----------
+    client : onedrive.api.OneDriveAPIClient
+    jobs : int, optional
+        Maximum number of copy and status requests in flight. Default
+        is 8.
+    min_interval : float, optional
+        Delay before the first status request of a job, in seconds.
+        Default is 1.
+    max_interval : float, optional
+        Maximum interval between two status requests of a job (unless
+        the server asks for more with Retry-After), in seconds. Default
+        is 30.
+    backoff : float, optional
+        Factor by which the polling interval of a job grows every time
+        it is found still in progress. Default is 1.5.
+
+    Attributes
+    ----------
+    client : onedrive.api.OneDriveAPIClient
+    jobs : int
+
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, client, jobs=8, min_interval=1, max_interval=30, backoff=1.5):
+        """Init."""
+        self.client = client
+        self.jobs = max(1, jobs)
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+
+    def _start(self, job, files_only, copy_kwargs):
+        """Start a copy job; return its monitor URL."""
+        if files_only:
+            self.client.assert_file(job.src)
+        return self.client.copy(job.src, job.dst, block=False, **copy_kwargs)
+
+    def run(self, pairs, files_only=False, **copy_kwargs):
+        """Copy items, monitoring all copy jobs from a single loop.
+
+        Parameters
+        ----------
+        pairs : iterable
+            Pairs ``(src, dst)`` of source and destination paths (see
+            ``onedrive.api.OneDriveAPIClient.copy``). Consumed lazily,
+            as request slots become available.
+        files_only : bool, optional
+            Whether to refuse to copy directories (the copy fails with
+            ``onedrive.exceptions.IsADirectoryError``). Default is
+            ``False``.
+
+        Other Parameters
+        ----------------
+        copy_kwargs
+            Keyword arguments passed to
+            ``onedrive.api.OneDriveAPIClient.copy`` (e.g.,
+            ``overwrite``).
+
+        Yields
+        ------
+        src, dst : str
+        error : Exception
+            ``None`` if the copy succeeded. Errors either come from
+            starting the copy, or are ``onedrive.exceptions.CopyError``
+            if the copy job failed.
+
+        Results are generated in order of completion.
+
+        """
+        # pylint: disable=protected-access,too-many-branches
+        client = self.client
+        pairs = iter(pairs)
+        exhausted = False
+        # future -> (job, whether the future is a status request)
+        in_flight = {}
+        # heap of (due time, sequence number, job) of started jobs
+        schedule = []
+        sequence = itertools.count()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs)
+        try:
+            while True:
+                now = time.monotonic()
+                while len(in_flight) < self.jobs and schedule and schedule[0][0] <= now:
+                    _, _, job = heapq.heappop(schedule)
+                    in_flight[executor.submit(client._get_copy_status, job.monitor_url)] = (
+                        job, True)
+                while not exhausted and len(in_flight) < self.jobs:
+                    try:
+                        src, dst = next(pairs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    job = _CopyJob(src, dst, self.min_interval)
+                    in_flight[executor.submit(self._start, job, files_only, copy_kwargs)] = (
+                        job, False)
+                if not in_flight and not schedule:
+                    return
+
+                timeout = max(0, schedule[0][0] - now) if schedule else None
+                if not in_flight:
+                    time.sleep(timeout)
+                    continue
+                done, _ = concurrent.futures.wait(
+                    in_flight, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    job, is_status = in_flight.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        yield job.src, job.dst, error
+                        continue
+                    if not is_status:
+                        job.monitor_url = future.result()
+                        heapq.heappush(schedule, (time.monotonic() + job.interval,
+                                                  next(sequence), job))
+                        continue
+                    status_response = future.result()
+                    state, text = client._copy_status(status_response)
+                    if state == "completed":
+                        client._invalidate_metadata(job.dst, subtree=True)
+                        yield job.src, job.dst, None
+                    elif state == "inProgress":
+                        job.interval = min(self.max_interval, job.interval * self.backoff)
+                        delay = max(job.interval,
+                                    client.retry_policy.retry_after(status_response) or 0)
+                        heapq.heappush(schedule, (time.monotonic() + delay,
+                                                  next(sequence), job))
+                    else:
+                        yield job.src, job.dst, client._copy_error(
+                            state, text, status_response, src=job.src, dst=job.dst)
+        finally:
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=False)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+"""Compare a local directory tree against a remote one.
+
+The concurrent remote tree listing (``iter_remote_tree``) is also used
+on its own by directory downloads.
+
+Used for incremental uploads: instead of asking the server about each
+local file (and hashing it) one after another, the remote tree is
+snapshotted once, by listing all its directories concurrently with only
+the properties needed for comparison (``REMOTE_SNAPSHOT_FIELDS``), and
+the two trees are compared with a sorted merge of their relative paths.
+
+A local file is considered unchanged if the remote file has the same
+size, and
+
+* the same SHA-1 digest, if the digest of the local file is in the hash
+  cache (no hashing is done here); otherwise,
+* a modification time no earlier than that of the local file (i.e., the
+  remote file was uploaded after the local file was last modified).
+
+"""
+
+import collections
+import concurrent.futures
+import os
+import posixpath
+
+import arrow
+
+import onedrive.util
+
+REMOTE_SNAPSHOT_FIELDS = ("name", "size", "folder", "file", "lastModifiedDateTime")
+
+def iter_remote_tree(client, top, jobs=8, fields=REMOTE_SNAPSHOT_FIELDS):
+    """List a remote directory tree concurrently.
+
+    Directories are listed ``jobs`` at a time, and generated as soon as
+    their listings are available, in no particular order (except that a
+    directory is generated before its subdirectories). Listings are
+    only scheduled as the generator is consumed, so memory use does not grow
+    with the size of the tree (only with the number of directories
+    waiting to be listed).
+
+    Parameters
+    ----------
+    client : onedrive.api.OneDriveAPIClient
+    top : str
+        Path to the root directory.
+    jobs : int, optional
+        Number of directories to list concurrently. Default is 8.
+    fields : list, optional
+        Names of the properties to request for each item (including
+        ``"name"`` and ``"folder"``). Default is
+        ``REMOTE_SNAPSHOT_FIELDS``.
+
+    Yields
+    ------
+    reldir : str
+        Relative path of the directory (``""`` for ``top`` itself).
+    dirs : list
+        Metadata objects of its subdirectories.
+    files : list
+        Metadata objects of its files.
+
+    Raises
+    ------
+    onedrive.exceptions.FileNotFoundError
+        If ``top`` is not found.
+
+    """
+    def listing(reldir):
+        """List a directory."""
+        path = posixpath.join(top, reldir) if reldir else top
+        dirs = []
+        files = []
+        for item in client.iterchildren(path, fields=fields):
+            if "folder" in item:
+                dirs.append(item)
+            else:
+                files.append(item)
+        return reldir, dirs, files
+
+    jobs = max(1, jobs)
+    # directories waiting to be listed; at most ``jobs`` listings are
+    # in flight (or done but not yet consumed) at any time, so that a
+    # slow consumer does not pile up listings in memory
+    queue = collections.deque([""])
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = set()
+        try:
+            while queue or pending:
+                while queue and len(pending) < jobs:
+                    pending.add(executor.submit(listing, queue.popleft()))
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    reldir, dirs, files = future.result()
+                    queue.extend(posixpath.join(reldir, item["name"]) for item in dirs)
+                    yield reldir, dirs, files
+        finally:
+            for future in pending:
+                future.cancel()
+
+def _relpath_key(relpath):
+    """Key for sorting and matching relative paths (case-insensitively)."""
+    return relpath.lower()
+
+def remote_snapshot(client, top, jobs=8):
+    """Snapshot a remote directory tree.
+
+    Parameters
+    ----------
+    client : onedrive.api.OneDriveAPIClient
+    top : str
+        Path to the root directory.
+    jobs : int, optional
+        Number of directories to list concurrently. Default is 8.
+
+    Returns
+    -------
+    dirs : set
+        Relative paths of all directories (``""`` for ``top`` itself).
+    files : list
+        Pairs ``(relpath, metadata)`` of all files, sorted by relative
+        path (case-insensitively, see ``diff_trees``). Metadata objects
+        only contain ``REMOTE_SNAPSHOT_FIELDS``.
+
+    Raises
+    ------
+    onedrive.exceptions.FileNotFoundError
+        If ``top`` is not found.
+
+    """
+    dirs = set()
+    files = []
+    for reldir, _, dir_files in iter_remote_tree(client, top, jobs=jobs):
+        dirs.add(reldir)
+        files.extend((posixpath.join(reldir, item["name"]), item) for item in dir_files)
+    files.sort(key=lambda pair: _relpath_key(pair[0]))
+    return dirs, files
+
+def local_snapshot(top):
+    """Snapshot a local directory tree.
+
+    Returns
+    -------
+    dirs : list
+        Relative POSIX paths of all directories (``""`` for ``top``
+        itself), top-down.
+    files : list
+        Triples ``(relpath, local_path, stat)`` of all files, sorted by
+        relative (POSIX) path (case-insensitively, see ``diff_trees``).
+
+    """
+    dirs = []
+    files = []
+    for localdir, _, filenames in os.walk(top):
+        reldir = os.path.relpath(localdir, start=top)
+        reldir = "" if reldir == os.curdir else onedrive.util.normalized_posixpath(reldir)
+        dirs.append(reldir)
+        for filename in filenames:
+            local_path = os.path.join(localdir, filename)
+            files.append((posixpath.join(reldir, filename), local_path, os.stat(local_path)))
+    files.sort(key=lambda triple: _relpath_key(triple[0]))
+    return dirs, files
+
+def is_unchanged(local_path, stat, metadata, hash_cache=None):
+    """Whether a local file is unchanged from its remote counterpart.
+
+    Parameters
+    ----------
+    local_path : str
+    stat : os.stat_result
+        Result of ``os.stat(local_path)``.
+    metadata : dict
+        Metadata object of the remote item (with at least the
+        properties in ``REMOTE_SNAPSHOT_FIELDS``).
+    hash_cache : onedrive.hash_cache.HashCache, optional
+
+    Returns
+    -------
+    bool
+
+    """
+    if "file" not in metadata or metadata.get("size") != stat.st_size:
+        return False
+    remote_sha1sum = metadata["file"].get("hashes", {}).get("sha1Hash")
+    if hash_cache is not None and remote_sha1sum:
+        local_sha1sum = hash_cache.get(local_path, stat=stat)
+        if local_sha1sum is not None:
+            return local_sha1sum == remote_sha1sum.lower()
+    try:
+        remote_mtime = arrow.get(metadata["lastModifiedDateTime"]).datetime.timestamp()
+    except KeyError:
+        return False
+    return int(stat.st_mtime) <= remote_mtime
+
+def diff_trees(local_files, remote_files, hash_cache=None):
+    """Find local files that are new or changed, with a sorted merge.
+
+    Relative paths are matched case-insensitively, like OneDrive does,
+    so a local ``Foo.txt`` is compared against a remote ``foo.txt``
+    (and uploaded over it if changed) rather than taken for a new file.
+
+    Parameters
+    ----------
+    local_files : list
+        As returned by ``local_snapshot``.
+    remote_files : list
+        As returned by ``remote_snapshot``.
+    hash_cache : onedrive.hash_cache.HashCache, optional
+        See ``is_unchanged``.
+
+    Yields
+    ------
+    relpath : str
+        Relative path of the local file (in its original case).
+    local_path : str
+    stat : os.stat_result
+    metadata : dict
+        Metadata object of the remote file, or ``None`` if the file is
+        new.
+
+    """
+    index = 0
+    for relpath, local_path, stat in local_files:
+        key = _relpath_key(relpath)
+        while index < len(remote_files) and _relpath_key(remote_files[index][0]) < key:
+            index += 1
+        metadata = None
+        if index < len(remote_files) and _relpath_key(remote_files[index][0]) == key:
+            metadata = remote_files[index][1]
+        if metadata is None or not is_unchanged(local_path, stat, metadata, hash_cache):
+            yield relpath, local_path, stat, metadata
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+
+"""Segmented (multi-connection) download helper.
+
+A segmented download splits the missing part of a file into byte ranges,
+fetches them concurrently with ``Range`` requests, and writes them in place
+into a preallocated ``.part`` file. The ranges still missing are persisted
+in a small JSON file next to the ``.part`` file (``FILENAME.part.ranges``),
+so that an interrupted download resumes every segment where it left off.
+The range map looks like::
+
+    {
+        "size": 1073741824,
+        "ranges": [[0, 1048576], [268435456, 536870912]]
+    }
+
+where each range is a pair ``[start, end)`` of missing bytes.
+
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+
+import requests
+
+import onedrive.exceptions
+import onedrive.hash_helper
+import onedrive.retry
+
+class RangeMap(object):
+    """Persistent map of ranges missing from a partially downloaded file.
+
+    Parameters
+    ----------
+    tmp_path : str
+        Path to the ``.part`` file.
+    size : int
+        Total size of the file.
+    ranges : list, optional
+        List of ``[start, end)`` pairs of missing bytes. Default is the
+        whole file.
+
+    Attributes
+    ----------
+    map_path : str
+    size : int
+    ranges : list
+
+    """
+
+    def __init__(self, tmp_path, size, ranges=None):
+        """Init."""
+        self.map_path = "%s.ranges" % tmp_path
+        self.size = size
+        self.ranges = [list(r) for r in ranges] if ranges is not None else [[0, size]]
+
+    @classmethod
+    def load(cls, tmp_path, size):
+        """Load the range map of ``tmp_path``, if one exists for ``size``.
+
+        Returns
+        -------
+        range_map : RangeMap or None
+
+        """
+        map_path = "%s.ranges" % tmp_path
+        try:
+            with open(map_path, encoding="utf-8") as fp:
+                saved = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if saved.get("size") != size:
+            logging.warning("range map %s is for a different size; ignored", map_path)
+            return None
+        return cls(tmp_path, size, saved["ranges"])
+
+    @property
+    def remaining(self):
+        """Number of bytes still missing."""
+        return sum(end - start for start, end in self.ranges)
+
+    def save(self):
+        """Write the range map to disk (atomically)."""
+        tmp_map_path = "%s.tmp" % self.map_path
+        with open(tmp_map_path, "w", encoding="utf-8") as fp:
+            json.dump({"size": self.size, "ranges": self.ranges}, fp)
+        os.replace(tmp_map_path, self.map_path)
+
+    def discard(self):
+        """Remove the range map from disk."""
+        try:
+            os.remove(self.map_path)
+        except FileNotFoundError:
+            pass
+
+    def split(self, segments, min_segment_size=1048576):
+        """Split the missing ranges into at least ``segments`` pieces.
+
+        The largest range is halved repeatedly, as long as the halves are
+        no smaller than ``min_segment_size``.
+
+        """
+        ranges = [r for r in self.ranges if r[1] > r[0]]
+        while ranges and len(ranges) < segments:
+            ranges.sort(key=lambda r: r[1] - r[0])
+            start, end = ranges[-1]
+            if end - start < 2 * min_segment_size:
+                break
+            middle = start + (end - start) // 2
+            ranges[-1:] = [[start, middle], [middle, end]]
+        self.ranges = sorted(ranges)
+
+def segmented_download(session, url, tmp_path, size, connections, **kwargs):
+    """Download a file into ``tmp_path`` over multiple connections.
+
+    Parameters
+    ----------
+    session : requests.Session
+        Session used to make the range requests (shared by all
+        connections).
+    url : str
+        Download URL.
+    tmp_path : str
+        Path to the ``.part`` file to download into.
+    size : int
+        Total size of the file.
+    connections : int
+        Number of concurrent connections.
+
+    Other Parameters
+    ----------------
+    resume : bool, optional
+        Whether to resume from an existing ``.part`` file (and its range
+        map, if any). Default is ``True``.
+    timeout : float, optional
+        Connect and read timeout of each range request. Default is 30.
+    retry_policy : onedrive.retry.RetryPolicy, optional
+        Policy for retrying a segment (from where it left off) upon
+        connection errors and transient HTTP errors. The attempt budget
+        is renewed whenever a segment makes progress. Default is
+        ``onedrive.retry.RetryPolicy()``.
+    rate_limiter : onedrive.ratelimit.RateLimiter, optional
+        Limiter of the request and transfer rates, shared by all
+        connections. Default is ``None``, i.e., no limit.
+    pbar : zmwangx.pbar.ProgressBar, optional
+        Progress bar to update.
+    path : str, optional
+        Remote path, for logging.
+    compute_hash : bool, optional
+        Whether to compute the SHA-1 digest of the file. Data is hashed
+        as it arrives for as long as it is contiguous with what has
+        been hashed (i.e., the leading segment); whatever is left is
+        read back from disk at the end, and the prefix already present
+        when resuming is hashed in the background. Default is
+        ``False``.
+
+    Returns
+    -------
+    sha1sum : str
+        Lowercase hexadecimal SHA-1 digest of the downloaded file, or
+        ``None`` if ``compute_hash`` is ``False``.
+
+    Raises
+    ------
+    onedrive.exceptions.APIRequestError
+        If the server doesn't honor range requests.
+    requests.exceptions.RequestException
+        If a segment fails after all retries (the range map is saved).
+
+    """
+    resume = kwargs.pop("resume", True)
+    timeout = kwargs.pop("timeout", 30)
+    retry_policy = kwargs.pop("retry_policy", None)
+    if retry_policy is None:
+        retry_policy = onedrive.retry.RetryPolicy()
+    rate_limiter = kwargs.pop("rate_limiter", None)
+    pbar = kwargs.pop("pbar", None)
+    path = kwargs.pop("path", None)
+    compute_hash = kwargs.pop("compute_hash", False)
+
+    range_map = None
+    if resume and os.path.exists(tmp_path):
+        range_map = RangeMap.load(tmp_path, size)
+        if range_map is None:
+            # left by a single-connection download: everything but the prefix
+            prefix = min(os.path.getsize(tmp_path), size)
+            range_map = RangeMap(tmp_path, size, [[prefix, size]])
+    if range_map is None:
+        range_map = RangeMap(tmp_path, size)
+    if pbar is not None and range_map.remaining < size:
+        pbar.force_update(size - range_map.remaining)
+
+    # preallocate
+    with open(tmp_path, "r+b" if resume and os.path.exists(tmp_path) else "wb") as fileobj:
+        fileobj.truncate(size)
+
+    range_map.split(connections)
+    range_map.save()
+
+    hasher = None
+    if compute_hash:
+        hash_start = range_map.ranges[0][0] if range_map.ranges else size
+        hasher = onedrive.hash_helper.IncrementalHasher(tmp_path, start=hash_start)
+
+    lock = threading.Lock()
+    errors = []
+    save_interval = 8388608  # persist the range map every 8 MiB per segment
+
+    def fetch(segment):
+        """Fetch a single segment (a mutable [start, end) pair)."""
+        attempt = 0
+        while segment[0] < segment[1]:
+            attempt += 1
+            progress = segment[0]
+            headers = {"Range": "bytes=%d-%d" % (segment[0], segment[1] - 1)}
+            try:
+                if rate_limiter is not None:
+                    rate_limiter.acquire_requests()
+                response = session.get(url, headers=headers, stream=True, timeout=timeout)
+                if response.status_code != 206:
+                    response.close()
+                    if retry_policy.should_retry(attempt, response):
+                        retry_policy.sleep(attempt, response,
+                                           reason="%s: got HTTP %d for segment %s" %
+                                           (path, response.status_code, str(segment)))
+                        continue
+                    raise onedrive.exceptions.APIRequestError(
+                        response=response,
+                        request_desc="ranged download request for '%s'" % path)
+                unsaved = 0
+                with open(tmp_path, "r+b") as segment_fileobj:
+                    segment_fileobj.seek(segment[0])
+                    for chunk in response.iter_content(chunk_size=65536):
+                        if not chunk:
+                            continue
+                        chunk = chunk[:segment[1] - segment[0]]
+                        if rate_limiter is not None:
+                            rate_limiter.acquire_bytes(len(chunk))
+                        segment_fileobj.write(chunk)
+                        # flush, so that the range map never gets ahead of the file
+                        segment_fileobj.flush()
+                        if hasher is not None:
+                            hasher.feed(segment[0], chunk)
+                        with lock:
+                            segment[0] += len(chunk)
+                            unsaved += len(chunk)
+                            if pbar is not None:
+                                pbar.update(len(chunk))
+                            if unsaved >= save_interval:
+                                range_map.save()
+                                unsaved = 0
+                        if segment[0] >= segment[1]:
+                            break
+                response.close()
+                if segment[0] >= segment[1]:
+                    return
+                error = requests.exceptions.ConnectionError("connection closed prematurely")
+            except requests.exceptions.RequestException as err:
+                error = err
+            except Exception as err:
+                with lock:
+                    errors.append(err)
+                return
+
+            logging.warning("%s: segment %s: %s", path, str(segment), str(error))
+            if segment[0] > progress:
+                # made progress, renew the attempt budget
+                attempt = 0
+            if not retry_policy.should_retry(attempt):
+                with lock:
+                    errors.append(error)
+                return
+            retry_policy.sleep(max(1, attempt), reason=str(error))
+
+    # there may be more segments than connections (e.g., holes left by an
+    # interrupted download), so segments are handed out to a fixed number
+    # of workers, keeping the number of connections bounded
+    queue = collections.deque(range_map.ranges)
+
+    def worker():
+        """Fetch segments until there are none left (or one failed)."""
+        while True:
+            with lock:
+                if not queue or errors:
+                    return
+                segment = queue.popleft()
+            fetch(segment)
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(min(connections, len(range_map.ranges)))]
+    try:
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            with lock:
+                range_map.ranges = [r for r in range_map.ranges if r[1] > r[0]]
+                range_map.save()
+
+        if errors:
+            raise errors[0]
+        range_map.discard()
+        return hasher.hexdigest() if hasher is not None else None
+    finally:
+        if hasher is not None:
+            hasher.close()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""Persistent cache of SHA-1 digests of local files.
+
+The cache is an SQLite database at
+``~/.local/share/onedrive/hash_cache.sqlite``. Each entry is keyed by the
+device and inode numbers of a file, and records the size and modification
+time (in nanoseconds) of the file at the time it was hashed; an entry is
+only used if the size and modification time still match, and is dropped
+otherwise. The number of entries is capped, with the least recently used
+entries evicted first.
+
+The database may be accessed concurrently by multiple threads and
+processes (e.g., multiprocessing workers of the CLI); each thread of each
+process opens its own connection. Errors from the database are logged and
+otherwise ignored, i.e., a broken cache only means that files are hashed
+again.
+
+"""
+
+import logging
+import os
+import sqlite3
+import time
+
+import zmwangx.hash
+
+import onedrive.util
+
+class HashCache(object):
+    """Persistent cache of SHA-1 digests of local files.
+
+    Parameters
+    ----------
+    db_path : str, optional
+        Path to the SQLite database. Default is
+        ``~/.local/share/onedrive/hash_cache.sqlite`` (or
+        ``$XDG_DATA_HOME/onedrive/hash_cache.sqlite``).
+    max_entries : int, optional
+        Maximum number of entries to keep. Default is 100000.
+
+    Attributes
+    ----------
+    db_path : str
+    max_entries : int
+
+    """
+
+    # number of insertions between two eviction passes
+    EVICTION_INTERVAL = 256
+
+    def __init__(self, db_path=None, max_entries=100000):
+        """Init; the database is opened lazily."""
+        if db_path is None:
+            db_path = os.path.join(onedrive.util.data_dir(), "hash_cache.sqlite")
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._connections = onedrive.util.SQLiteConnections(db_path, [
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "device INTEGER NOT NULL, "
+            "inode INTEGER NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, "
+            "sha1sum TEXT NOT NULL, "
+            "last_used REAL NOT NULL, "
+            "PRIMARY KEY (device, inode))",
+            "CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used)",
+        ])
+        self._insertions = 0
+
+    def _connection(self):
+        """Return the connection for the current thread and process."""
+        return self._connections.get()
+
+    def get(self, path, stat=None):
+        """Look up the cached SHA-1 digest of a local file.
+
+        Parameters
+        ----------
+        path : str
+        stat : os.stat_result, optional
+            Result of ``os.stat(path)``, if already available.
+
+        Returns
+        -------
+        sha1sum : str or None
+            Lowercase hexadecimal SHA-1 digest, or ``None`` if there is
+            no valid entry.
+
+        """
+        stat = os.stat(path) if stat is None else stat
+        try:
+            connection = self._connection()
+            with connection:
+                row = connection.execute(
+                    "SELECT size, mtime_ns, sha1sum FROM hashes WHERE device = ? AND inode = ?",
+                    (stat.st_dev, stat.st_ino)).fetchone()
+                if row is None:
+                    return None
+                size, mtime_ns, sha1sum = row
+                if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                    # file changed since it was hashed
+                    connection.execute("DELETE FROM hashes WHERE device = ? AND inode = ?",
+                                       (stat.st_dev, stat.st_ino))
+                    return None
+                connection.execute(
+                    "UPDATE hashes SET last_used = ? WHERE device = ? AND inode = ?",
+                    (time.time(), stat.st_dev, stat.st_ino))
+                return sha1sum
+        except sqlite3.Error as err:
+            logging.warning("hash cache lookup for '%s' failed: %s", path, str(err))
+            return None
+
+    def put(self, path, sha1sum, stat=None):
+        """Record the SHA-1 digest of a local file.
+
+        Parameters
+        ----------
+        path : str
+        sha1sum : str
+            Hexadecimal SHA-1 digest.
+        stat : os.stat_result, optional
+            Result of ``os.stat(path)`` at the time the file was hashed.
+            Default is to stat the file now.
+
+        """
+        stat = os.stat(path) if stat is None else stat
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                    (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns,
+                     sha1sum.lower(), time.time()))
+                if self._insertions % self.EVICTION_INTERVAL == 0:
+                    connection.execute(
+                        "DELETE FROM hashes WHERE rowid IN (SELECT rowid FROM hashes "
+                        "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            self._insertions += 1
+        except sqlite3.Error as err:
+            logging.warning("hash cache update for '%s' failed: %s", path, str(err))
+
+    def file_sha1(self, path, show_progress=False):
+        """Return the SHA-1 digest of a local file, hashing it if necessary.
+
+        Parameters
+        ----------
+        path : str
+        show_progress : bool, optional
+            Whether to show hashing progress (only if the file is actually
+            hashed). Default is ``False``.
+
+        Returns
+        -------
+        sha1sum : str
+            Lowercase hexadecimal SHA-1 digest.
+
+        """
+        stat = os.stat(path)
+        sha1sum = self.get(path, stat=stat)
+        if sha1sum is not None:
+            logging.info("SHA-1 digest of '%s' found in hash cache", path)
+            return sha1sum
+        sha1sum = zmwangx.hash.file_hash(path, "sha1", show_progress=show_progress).lower()
+        # only cache the digest if the file didn't change while being hashed
+        new_stat = os.stat(path)
+        if (new_stat.st_size, new_stat.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            self.put(path, sha1sum, stat=stat)
+        return sha1sum
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""Incremental hashing helpers."""
+
+import hashlib
+import os
+import queue
+import threading
+
+def file_fingerprint(path):
+    """Return a cheap fingerprint of a local file based on its stat.
+
+    The fingerprint changes whenever the size or the modification time
+    (in nanoseconds) of the file changes. It is used in place of the
+    SHA-1 digest for identifying a file when the digest is not yet
+    known.
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    fingerprint : str
+
+    """
+    stat = os.stat(path)
+    return "%d:%d" % (stat.st_size, stat.st_mtime_ns)
+
+class IncrementalHasher(object):
+    """Hash a local file from the chunks that pass by during a transfer.
+
+    Chunks are fed with their offsets through ``feed``. Only data
+    contiguous with what has already been hashed extends the digest;
+    anything else (resent or out-of-order chunks) is ignored. When the
+    digest is requested, whatever part of the file was never fed is read
+    from disk, so the result is always the digest of the whole file.
+
+    A hasher started with ``start > 0`` runs a background thread until
+    ``hexdigest`` or ``close`` is called; a transfer that fails (or is
+    abandoned) before the digest is needed should ``close`` the hasher,
+    or use it as a context manager.
+
+    Parameters
+    ----------
+    path : str
+        Path to the local file.
+    start : int, optional
+        Offset of the first chunk expected to be fed. The prefix before
+        ``start`` (e.g., the part already transferred in a previous,
+        interrupted session) is hashed from disk in a background thread,
+        while chunks fed in the meantime are queued. Default is ``0``.
+    algorithm : str, optional
+        Default is ``"sha1"``.
+
+    """
+
+    # max number of chunks queued while the prefix is being hashed
+    QUEUE_SIZE = 4
+
+    def __init__(self, path, start=0, algorithm="sha1"):
+        """Init; start hashing the prefix if necessary."""
+        self._path = path
+        self._hash = hashlib.new(algorithm)
+        self._lock = threading.Lock()
+        # end of data accepted so far (hashed or queued)
+        self._position = start
+        self._queue = None
+        self._thread = None
+        self._closed = threading.Event()
+        if start > 0:
+            self._queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+            self._thread = threading.Thread(target=self._background, args=(start,))
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __enter__(self):
+        """Enter context."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the hasher."""
+        self.close()
+
+    def _background(self, start):
+        """Hash the prefix from disk, then consume queued chunks."""
+        self._update_from_disk(0, start)
+        while True:
+            data = self._queue.get()
+            if data is None or self._closed.is_set():
+                return
+            self._hash.update(data)
+
+    def _update_from_disk(self, start, end=None):
+        """Hash the file from ``start`` to ``end`` (or EOF)."""
+        with open(self._path, "rb") as fileobj:
+            fileobj.seek(start)
+            remaining = end - start if end is not None else None
+            while (remaining is None or remaining > 0) and not self._closed.is_set():
+                size = 1048576 if remaining is None else min(1048576, remaining)
+                data = fileobj.read(size)
+                if not data:
+                    break
+                self._hash.update(data)
+                if remaining is not None:
+                    remaining -= len(data)
+
+    def feed(self, position, data):
+        """Feed a chunk of the file starting at ``position``.
+
+        Thread-safe.
+
+        """
+        with self._lock:
+            if self._closed.is_set():
+                return
+            end = position + len(data)
+            if position > self._position or end <= self._position:
+                return
+            data = data[self._position - position:]
+            self._position = end
+            if self._queue is not None:
+                self._queue.put(data)
+            else:
+                self._hash.update(data)
+
+    def hexdigest(self):
+        """Finish hashing and return the lowercase hexadecimal digest.
+
+        Any part of the file beyond what has been fed is read from disk.
+        The hasher should not be fed after calling this method.
+
+        Raises
+        ------
+        ValueError
+            If the hasher is closed.
+
+        """
+        with self._lock:
+            if self._closed.is_set():
+                raise ValueError("hasher of '%s' is closed" % self._path)
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+                self._queue = None
+            self._update_from_disk(self._position)
+            self._position = os.path.getsize(self._path)
+            return self._hash.hexdigest().lower()
+
+    def close(self):
+        """Stop hashing, without computing the digest.
+
+        Stops the background thread, if any. No-op if already closed,
+        or if the digest has been computed. The hasher cannot be used
+        afterwards.
+
+        """
+        self._closed.set()
+        with self._lock:
+            if self._thread is not None:
+                # wake the thread up if it is waiting for a chunk; if the
+                # queue is full, it stops as soon as it takes the next one
+                try:
+                    self._queue.put_nowait(None)
+                except queue.Full:
+                    pass
+                self._thread.join()
+                self._thread = None
+                self._queue = None
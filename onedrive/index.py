@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+
+"""Local index of remote directory trees, for offline lookups.
+
+The index is an SQLite database at
+``~/.local/share/onedrive/index.sqlite``, holding the ID, parent, name,
+size, SHA-1 digest, modification time and eTag of every item in the
+indexed trees, keyed by normalized path (with an index on the parent
+path for listings). Paths are compared case-insensitively, like OneDrive
+does; names are kept in their original case. A tree is indexed (or refreshed) as a whole, by
+listing its directories concurrently (see the ``onedrive-index`` console
+script, or ``RemoteIndex.build``); the time of the last build of each
+tree is recorded, and a lookup is only answered if the item is in a tree
+built no more than ``max_age`` seconds ago. Within such a tree, the
+absence of an item from the index means the item does not exist.
+
+The index only knows about changes made through clients using it (see
+``invalidate``): items changed (and their ancestors, whose size and
+listing change with them) are marked dirty, and looked up remotely again
+until the next build of their tree. Changes made elsewhere go unnoticed
+until the index is rebuilt, or ``max_age`` runs out.
+
+Clients use the index if it is passed to them, or if the config file has
+an ``index`` section, e.g.::
+
+    [index]
+    max_age = 3600
+
+in which case ``metadata`` (with selected fields only), ``exists``,
+``isfile``, ``isdir``, ``getsize``, ``getmtime`` and ``listdir`` (names
+only) are served from the index whenever it covers the path.
+
+Like the hash cache, the database may be accessed concurrently by
+multiple threads and processes, and errors from the database are logged
+and otherwise ignored (i.e., lookups fall back to the network).
+
+"""
+
+import logging
+import os
+import posixpath
+import sqlite3
+import time
+
+import onedrive.diff_helper
+import onedrive.exceptions
+import onedrive.util
+
+# Properties of items kept in the index; a metadata object served from
+# the index only has these.
+INDEX_FIELDS = ("id", "name", "size", "file", "folder", "lastModifiedDateTime", "eTag")
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS items ("
+    "path TEXT PRIMARY KEY, "
+    "parent TEXT, "
+    "name TEXT NOT NULL, "
+    "id TEXT, "
+    "is_dir INTEGER NOT NULL, "
+    "size INTEGER, "
+    "child_count INTEGER, "
+    "sha1sum TEXT, "
+    "mtime TEXT, "
+    "etag TEXT)",
+    "CREATE INDEX IF NOT EXISTS items_parent ON items (parent)",
+    # trees that were indexed as a whole, and when (top is the path of
+    # the root in its original case)
+    "CREATE TABLE IF NOT EXISTS roots ("
+    "path TEXT PRIMARY KEY, "
+    "top TEXT NOT NULL, "
+    "built REAL NOT NULL)",
+    # items changed since their tree was built; with subtree set, the
+    # change affects all descendants too
+    "CREATE TABLE IF NOT EXISTS dirty ("
+    "path TEXT PRIMARY KEY, "
+    "subtree INTEGER NOT NULL, "
+    "marked REAL NOT NULL)",
+]
+
+def normalize(path):
+    """Normalize a remote path into an index key.
+
+    Keys are case-folded, since OneDrive paths are case-insensitive (see
+    also ``onedrive.rename_helper``).
+
+    Examples
+    --------
+    >>> normalize("/a//B/")
+    'a/b'
+    >>> normalize("/")
+    ''
+
+    """
+    return posixpath.normpath("/" + path).lstrip("/").lower()
+
+def _ancestors(key):
+    """Keys of the ancestors of ``key``, from the parent up to the root."""
+    while key:
+        key = posixpath.dirname(key)
+        yield key
+
+def _subtree_clause(column):
+    """SQL condition matching ``column`` in the subtree of a key.
+
+    See ``_subtree_params`` for the parameters of the condition.
+
+    """
+    return "(%s = ? OR substr(%s, 1, ?) = ?)" % (column, column)
+
+def _subtree_params(key):
+    """Parameters of the condition made by ``_subtree_clause``."""
+    prefix = key + "/" if key else ""
+    return (key, len(prefix), prefix)
+
+class RemoteIndex(object):
+    """Local index of remote directory trees.
+
+    Parameters
+    ----------
+    db_path : str, optional
+        Path to the SQLite database. Default is
+        ``~/.local/share/onedrive/index.sqlite`` (or
+        ``$XDG_DATA_HOME/onedrive/index.sqlite``).
+    max_age : float, optional
+        Maximum age of the index of a tree, in seconds, for lookups to
+        be answered from it. ``None`` means no limit. Default is 3600.
+
+    Attributes
+    ----------
+    db_path : str
+    max_age : float
+
+    """
+
+    def __init__(self, db_path=None, max_age=3600):
+        """Init; the database is opened lazily."""
+        if db_path is None:
+            db_path = os.path.join(onedrive.util.data_dir(), "index.sqlite")
+        self.db_path = db_path
+        self.max_age = max_age
+        self._connections = onedrive.util.SQLiteConnections(db_path, _SCHEMA)
+
+    @classmethod
+    def from_config(cls, conf):
+        """Build an index from the ``index`` section of a config.
+
+        Parameters
+        ----------
+        conf : configparser.ConfigParser
+
+        Returns
+        -------
+        RemoteIndex or None
+            ``None`` if the section is missing.
+
+        """
+        if not conf.has_section("index"):
+            return None
+        section = conf["index"]
+        kwargs = {}
+        if "db_path" in section:
+            kwargs["db_path"] = os.path.expanduser(section["db_path"])
+        if "max_age" in section:
+            kwargs["max_age"] = float(section["max_age"]) if section["max_age"] else None
+        return cls(**kwargs)
+
+    def _connection(self):
+        """Return the connection for the current thread and process."""
+        return self._connections.get()
+
+    @staticmethod
+    def _row(key, metadata):
+        """Make the row of an item from its metadata object."""
+        is_dir = "folder" in metadata
+        sha1sum = None
+        if "file" in metadata:
+            sha1sum = metadata["file"].get("hashes", {}).get("sha1Hash")
+        return (key, posixpath.dirname(key) if key else None, metadata.get("name", ""),
+                metadata.get("id"), int(is_dir), metadata.get("size"),
+                metadata["folder"].get("childCount") if is_dir else None,
+                sha1sum.lower() if sha1sum else None,
+                metadata.get("lastModifiedDateTime"), metadata.get("eTag"))
+
+    @staticmethod
+    def _metadata(row):
+        """Make a (partial) metadata object from the row of an item."""
+        # pylint: disable=unused-variable
+        path, parent, name, item_id, is_dir, size, child_count, sha1sum, mtime, etag = row
+        metadata = {"id": item_id, "name": name, "size": size,
+                    "lastModifiedDateTime": mtime, "eTag": etag}
+        if is_dir:
+            metadata["folder"] = {"childCount": child_count}
+        else:
+            metadata["file"] = {"hashes": {"sha1Hash": sha1sum.upper()} if sha1sum else {}}
+        return metadata
+
+    def build(self, client, top="/", jobs=8):
+        """Index (or re-index) a remote directory tree.
+
+        The old index of the tree (if any) is replaced as a whole once
+        the tree has been listed; lookups are answered from the old
+        index in the meantime.
+
+        Parameters
+        ----------
+        client : onedrive.api.OneDriveAPIClient
+        top : str, optional
+            Path to the root directory of the tree. Default is
+            ``"/"``, i.e., the whole drive.
+        jobs : int, optional
+            Number of directories to list concurrently. Default is 8.
+
+        Returns
+        -------
+        num_items : int
+            Number of items indexed (including ``top``).
+
+        Raises
+        ------
+        onedrive.exceptions.FileNotFoundError
+            If ``top`` is not found.
+        onedrive.exceptions.NotADirectoryError
+            If ``top`` is not a directory.
+        sqlite3.Error
+            If the database cannot be written.
+
+        """
+        started = time.time()
+        key = normalize(top)
+        top_metadata = client.metadata(top, fields=INDEX_FIELDS)
+        if "folder" not in top_metadata:
+            raise onedrive.exceptions.NotADirectoryError(path=top)
+        num_items = 1
+        connection = self._connection()
+        # the tree is listed into a temporary table first, and swapped in
+        # with one short transaction, so that the database is not locked
+        # (e.g., against invalidations by other processes) during the walk
+        connection.execute("DROP TABLE IF EXISTS temp.staging")
+        connection.execute("CREATE TEMP TABLE staging AS SELECT * FROM items WHERE 0")
+        try:
+            insert = "INSERT INTO temp.staging VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            with connection:
+                connection.execute(insert, self._row(key, top_metadata))
+            for reldir, dirs, files in onedrive.diff_helper.iter_remote_tree(
+                    client, top, jobs=jobs, fields=INDEX_FIELDS):
+                dirkey = normalize(posixpath.join(top, reldir))
+                with connection:
+                    connection.executemany(insert, [
+                        self._row(posixpath.join(dirkey, item["name"].lower()), item)
+                        for item in dirs + files])
+                num_items += len(dirs) + len(files)
+            with connection:
+                connection.execute("DELETE FROM items WHERE %s" % _subtree_clause("path"),
+                                   _subtree_params(key))
+                connection.execute("INSERT OR REPLACE INTO items SELECT * FROM temp.staging")
+                # changes made during the build may have been missed
+                connection.execute("DELETE FROM dirty WHERE marked < ? AND %s" %
+                                   _subtree_clause("path"), (started,) + _subtree_params(key))
+                # nested trees are covered by this one now
+                connection.execute("DELETE FROM roots WHERE %s" % _subtree_clause("path"),
+                                   _subtree_params(key))
+                connection.execute("INSERT INTO roots VALUES (?, ?, ?)",
+                                   (key, "/" + posixpath.normpath("/" + top).lstrip("/"), started))
+        finally:
+            connection.execute("DROP TABLE IF EXISTS temp.staging")
+        logging.info("indexed %d items under '%s'", num_items, top)
+        return num_items
+
+    def roots(self):
+        """List the indexed trees.
+
+        Returns
+        -------
+        roots : list
+            Pairs ``(path, built)`` of the root of each indexed tree
+            (``"/"`` for the whole drive) and the POSIX time it was last
+            built at.
+
+        """
+        connection = self._connection()
+        return list(connection.execute("SELECT top, built FROM roots ORDER BY path"))
+
+    def _covered(self, connection, key):
+        """Whether ``key`` is in a fresh tree, and not dirty."""
+        keys = [key] + list(_ancestors(key))
+        marks = "(%s)" % ", ".join("?" * len(keys))
+        row = connection.execute("SELECT max(built) FROM roots WHERE path IN %s" % marks,
+                                 keys).fetchone()
+        if row[0] is None or (self.max_age is not None and row[0] + self.max_age < time.time()):
+            return False
+        row = connection.execute(
+            "SELECT count(*) FROM dirty WHERE path = ? OR (subtree AND path IN %s)" % marks,
+            [key] + keys).fetchone()
+        return row[0] == 0
+
+    def get(self, path):
+        """Look up an item.
+
+        Returns
+        -------
+        hit : bool
+            Whether the index covers ``path``.
+        metadata : dict or None
+            Metadata object of the item (with ``INDEX_FIELDS`` only), or
+            ``None`` if the item does not exist (or on a miss).
+
+        """
+        key = normalize(path)
+        try:
+            connection = self._connection()
+            if not self._covered(connection, key):
+                return False, None
+            row = connection.execute("SELECT * FROM items WHERE path = ?", (key,)).fetchone()
+            return True, (self._metadata(row) if row is not None else None)
+        except sqlite3.Error as err:
+            logging.warning("index lookup for '%s' failed: %s", path, str(err))
+            return False, None
+
+    def children(self, path):
+        """List the children of a directory.
+
+        Returns
+        -------
+        hit : bool
+            Whether the index covers ``path``.
+        children : list or None
+            Metadata objects of the children (with ``INDEX_FIELDS``
+            only), sorted by name; ``None`` if the item does not exist
+            (or on a miss). Empty for a file.
+
+        """
+        key = normalize(path)
+        try:
+            connection = self._connection()
+            if not self._covered(connection, key):
+                return False, None
+            if connection.execute("SELECT 1 FROM items WHERE path = ?",
+                                  (key,)).fetchone() is None:
+                return True, None
+            return True, [self._metadata(row) for row in connection.execute(
+                "SELECT * FROM items WHERE parent = ? ORDER BY name", (key,))]
+        except sqlite3.Error as err:
+            logging.warning("index listing of '%s' failed: %s", path, str(err))
+            return False, None
+
+    def descendants(self, path):
+        """List everything under a directory.
+
+        Returns
+        -------
+        hit : bool
+            Whether the index covers ``path`` and everything under it.
+        descendants : list or None
+            Pairs ``(path, metadata)`` of all items under ``path``
+            (excluding ``path`` itself), by normalized (hence
+            lowercase) path, sorted;
+            ``None`` if the item does not exist (or on a miss).
+
+        """
+        key = normalize(path)
+        try:
+            connection = self._connection()
+            if not self._covered(connection, key):
+                return False, None
+            if connection.execute("SELECT count(*) FROM dirty WHERE %s" % _subtree_clause("path"),
+                                  _subtree_params(key)).fetchone()[0] > 0:
+                return False, None
+            if connection.execute("SELECT 1 FROM items WHERE path = ?",
+                                  (key,)).fetchone() is None:
+                return True, None
+            return True, [(row[0], self._metadata(row)) for row in connection.execute(
+                "SELECT * FROM items WHERE path != ? AND %s ORDER BY path" %
+                _subtree_clause("path"), (key,) + _subtree_params(key))]
+        except sqlite3.Error as err:
+            logging.warning("index listing of '%s' failed: %s", path, str(err))
+            return False, None
+
+    def invalidate(self, path, subtree=False):
+        """Mark ``path`` and its ancestors dirty.
+
+        Parameters
+        ----------
+        path : str
+        subtree : bool, optional
+            Whether all descendants of ``path`` are affected too (e.g.,
+            when a directory is removed or moved). Default is ``False``.
+
+        """
+        key = normalize(path)
+        now = time.time()
+        try:
+            connection = self._connection()
+            with connection:
+                # (a subtree mark is never downgraded)
+                connection.executemany(
+                    "INSERT OR REPLACE INTO dirty VALUES (?1, max(?2, coalesce("
+                    "(SELECT subtree FROM dirty WHERE path = ?1), 0)), ?3)",
+                    [(key, int(subtree), now)] +
+                    [(ancestor, 0, now) for ancestor in _ancestors(key)])
+        except sqlite3.Error as err:
+            logging.warning("index invalidation of '%s' failed: %s", path, str(err))
+
+    def clear(self):
+        """Drop the whole index."""
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM items")
+            connection.execute("DELETE FROM roots")
+            connection.execute("DELETE FROM dirty")
@@ -5,12 +5,11 @@
 import logging
 import os
 
+import onedrive.util
+
 def logging_setup():
     """Setup logging."""
-    if "XDG_DATA_HOME" in os.environ:
-        logfile = os.path.join(os.environ["XDG_DATA_HOME"], "onedrive", "onedrive.log")
-    else:
-        logfile = os.path.expanduser("~/.local/share/onedrive/onedrive.log")
+    logfile = os.path.join(onedrive.util.data_dir(), "onedrive.log")
     logdir = os.path.dirname(logfile)
     if not os.path.exists(logdir):
         os.makedirs(logdir, mode=0o700)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""In-memory cache of item metadata.
+
+The cache maps normalized (case-folded) remote paths to metadata objects
+as returned by the API, or to ``None`` for items known not to exist
+(negative caching of HTTP 404). Each entry expires after a fixed time-to-live, and the least
+recently used entries are evicted once the cache is full.
+
+The cache only knows about changes made through the client owning it;
+changes made elsewhere (the web interface, another process) go unnoticed
+until the affected entries expire, so the time-to-live should be kept
+short.
+
+"""
+
+import collections
+import posixpath
+import threading
+import time
+
+import onedrive.util
+
+class MetadataCache(onedrive.util.PicklableWithLock):
+    """Bounded TTL/LRU cache of item metadata.
+
+    Thread-safe.
+
+    Parameters
+    ----------
+    ttl : float, optional
+        Time-to-live of each entry, in seconds. Default is 30.
+    negative_ttl : float, optional
+        Time-to-live of negative (not found) entries, in seconds.
+        Default is the same as ``ttl``.
+    max_entries : int, optional
+        Maximum number of entries. Default is 4096.
+
+    """
+
+    def __init__(self, ttl=30, negative_ttl=None, max_entries=4096):
+        """Init."""
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl if negative_ttl is not None else ttl
+        self.max_entries = max_entries
+        # path => (expiration time, metadata or None)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """Pickle without the lock (and without the entries)."""
+        state = super().__getstate__()
+        state["_entries"] = collections.OrderedDict()
+        return state
+
+    @staticmethod
+    def normalize(path):
+        """Normalize a remote path into a cache key.
+
+        Keys are case-folded, since OneDrive paths are case-insensitive
+        (see also ``onedrive.index.normalize``).
+
+        Examples
+        --------
+        >>> MetadataCache.normalize("/a//B/")
+        'a/b'
+        >>> MetadataCache.normalize("/")
+        ''
+
+        """
+        return posixpath.normpath("/" + path).lstrip("/").lower()
+
+    def get(self, path):
+        """Look up an entry.
+
+        Returns
+        -------
+        hit : bool
+            Whether a live entry was found.
+        metadata : dict or None
+            The cached metadata object, or ``None`` if the item is known
+            not to exist (or on a miss). The object is shared with the
+            cache and should not be modified.
+
+        """
+        key = self.normalize(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires, metadata = entry
+            if expires < time.time():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, metadata
+
+    def put(self, path, metadata):
+        """Cache the metadata object of ``path``."""
+        self._store(path, metadata, self.ttl)
+
+    def put_missing(self, path):
+        """Record that ``path`` does not exist."""
+        self._store(path, None, self.negative_ttl)
+
+    def _store(self, path, metadata, ttl):
+        """Store an entry, evicting the least recently used ones if full."""
+        if ttl <= 0:
+            return
+        key = self.normalize(path)
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, metadata)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path, subtree=False):
+        """Drop the entry of ``path`` and those of all its ancestors.
+
+        Ancestors are dropped too since their size and child count are
+        affected by any change to ``path``.
+
+        Parameters
+        ----------
+        path : str
+        subtree : bool, optional
+            Whether to also drop entries of all descendants of ``path``
+            (e.g., when a directory is removed or moved). Default is
+            ``False``.
+
+        """
+        key = self.normalize(path)
+        with self._lock:
+            if subtree:
+                prefix = key + "/" if key else ""
+                for cached_key in [k for k in self._entries if k.startswith(prefix)]:
+                    del self._entries[cached_key]
+            while True:
+                self._entries.pop(key, None)
+                if not key:
+                    break
+                key = posixpath.dirname(key)
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
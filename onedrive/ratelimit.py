@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+"""Client-side rate limiting of API requests and data transfer.
+
+Concurrent workers (threads, multiprocessing workers of the CLI, or
+several CLI invocations on the same host) hitting the API independently
+easily exceed the throttling threshold, at which point all of them get
+HTTP 429 and back off at once. A ``RateLimiter`` keeps the aggregate
+traffic just under the threshold instead, with two separate token
+buckets: one for requests (API calls), one for bytes transferred
+(uploaded or downloaded).
+
+By default, the state of each bucket lives in a small file under
+``~/.local/share/onedrive/`` (or ``$XDG_DATA_HOME/onedrive/``), updated
+under an exclusive ``flock``, so that all processes of the same user
+share the budgets. On platforms without ``fcntl``, budgets are only
+shared within the process.
+
+Rate limiting is off unless configured, either through the
+``ratelimit`` section of the config file, e.g.::
+
+    [ratelimit]
+    requests_per_second = 10
+    request_burst = 20
+    bytes_per_second = 10485760
+
+or by passing a ``RateLimiter`` to the client.
+
+"""
+
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+import onedrive.util
+
+class TokenBucket(onedrive.util.PicklableWithLock):
+    """Token bucket, optionally shared across processes through a file.
+
+    Tokens accumulate at ``rate`` per second, up to ``burst``. Taking
+    more tokens than available is allowed, but puts the bucket into
+    debt, and the taker waits until the debt is paid off; concurrent
+    takers therefore queue up in the order they took their tokens.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens per second.
+    burst : float, optional
+        Capacity of the bucket. Default is one second worth of tokens
+        (at least one token).
+    state_path : str, optional
+        Path to the state file shared across processes. Default is
+        ``None``, i.e., the state is kept in memory, and only shared
+        by threads of the same process.
+
+    Attributes
+    ----------
+    rate : float
+    burst : float
+    state_path : str
+
+    """
+
+    # (tokens, timestamp)
+    _STATE_FORMAT = "<dd"
+
+    def __init__(self, rate, burst=None, state_path=None):
+        """Init."""
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.state_path = state_path if fcntl is not None else None
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _take(self, state, amount):
+        """Refill and take ``amount`` tokens from ``state``.
+
+        Returns
+        -------
+        state : tuple
+            The new state.
+        wait : float
+            Seconds to wait for the debt (if any) to be paid off.
+
+        """
+        now = time.time()
+        if state is None:
+            tokens = self.burst
+        else:
+            tokens, timestamp = state
+            tokens = min(self.burst, tokens + max(0, now - timestamp) * self.rate)
+        tokens -= amount
+        wait = -tokens / self.rate if tokens < 0 else 0
+        return (tokens, now), wait
+
+    def _take_shared(self, amount):
+        """Take tokens from the state file, under an exclusive lock."""
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        size = struct.calcsize(self._STATE_FORMAT)
+        fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.pread(fd, size, 0)
+            state = struct.unpack(self._STATE_FORMAT, raw) if len(raw) == size else None
+            state, wait = self._take(state, amount)
+            os.pwrite(fd, struct.pack(self._STATE_FORMAT, *state), 0)
+        finally:
+            # closing the file releases the lock
+            os.close(fd)
+        return wait
+
+    def acquire(self, amount=1):
+        """Take ``amount`` tokens, blocking until they are paid for.
+
+        Returns
+        -------
+        float
+            Seconds waited.
+
+        """
+        if amount <= 0:
+            return 0
+        with self._lock:
+            if self.state_path is not None:
+                try:
+                    wait = self._take_shared(amount)
+                except OSError:
+                    # unusable state file; fall back to in-process state
+                    self.state_path = None
+            if self.state_path is None:
+                self._state, wait = self._take(self._state, amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+class RateLimiter(object):
+    """Separate request and byte budgets for all API traffic.
+
+    Parameters
+    ----------
+    requests_per_second : float, optional
+        Budget of API requests (each request of a JSON batch counts).
+        Default is ``None``, i.e., unlimited.
+    bytes_per_second : float, optional
+        Budget of bytes uploaded and downloaded. Default is ``None``,
+        i.e., unlimited.
+    request_burst : float, optional
+        Number of requests that can be made in a burst. Default is one
+        second worth of requests.
+    byte_burst : float, optional
+        Number of bytes that can be transferred in a burst. Default is
+        one second worth of bytes.
+    shared : bool, optional
+        Whether to share the budgets with other processes of the same
+        user (see module docstring). Default is ``True``.
+
+    Attributes
+    ----------
+    requests : TokenBucket
+        ``None`` if unlimited.
+    bytes : TokenBucket
+        ``None`` if unlimited.
+
+    """
+
+    def __init__(self, requests_per_second=None, bytes_per_second=None, **kwargs):
+        """Init."""
+        request_burst = kwargs.pop("request_burst", None)
+        byte_burst = kwargs.pop("byte_burst", None)
+        shared = kwargs.pop("shared", True)
+        home = None
+        if shared:
+            home = onedrive.util.data_dir()
+        self.requests = None
+        if requests_per_second:
+            self.requests = TokenBucket(
+                requests_per_second, burst=request_burst,
+                state_path=os.path.join(home, "ratelimit.requests") if home else None)
+        self.bytes = None
+        if bytes_per_second:
+            self.bytes = TokenBucket(
+                bytes_per_second, burst=byte_burst,
+                state_path=os.path.join(home, "ratelimit.bytes") if home else None)
+
+    @classmethod
+    def from_config(cls, conf):
+        """Build a rate limiter from the ``ratelimit`` section of a config.
+
+        Parameters
+        ----------
+        conf : configparser.ConfigParser
+
+        Returns
+        -------
+        RateLimiter or None
+            ``None`` if the section is missing or sets no budget.
+
+        """
+        if not conf.has_section("ratelimit"):
+            return None
+        section = conf["ratelimit"]
+        kwargs = {}
+        for option in ("requests_per_second", "bytes_per_second",
+                       "request_burst", "byte_burst"):
+            if option in section:
+                kwargs[option] = float(section[option])
+        if "shared" in section:
+            kwargs["shared"] = section.getboolean("shared")
+        limiter = cls(**kwargs)
+        if limiter.requests is None and limiter.bytes is None:
+            return None
+        return limiter
+
+    def acquire_requests(self, count=1):
+        """Wait until ``count`` requests can be made."""
+        if self.requests is not None:
+            self.requests.acquire(count)
+
+    def acquire_bytes(self, count):
+        """Wait until ``count`` bytes can be transferred."""
+        if self.bytes is not None:
+            self.bytes.acquire(count)
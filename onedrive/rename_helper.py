@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""Plan the renaming of many items of a directory.
+
+Renaming items one by one, in the order given, breaks down as soon as a
+new name is the old name of another item being renamed: ``a => b``
+fails if ``b`` has not been renamed yet, and a cycle like ``a => b, b =>
+a`` cannot succeed in any order. ``plan_renames`` works out the whole
+rename map locally, from the names already listed, before any request
+is made:
+
+* an item renamed more than once, or
+* renames to the same name, or to the name of an item that is not
+  being renamed away, are collisions, and rejected up front (names are
+  compared case-insensitively, like OneDrive does; changing only the
+  case of a name is fine);
+* renames whose new name is free are done in the first wave;
+* renames whose new name is taken by another item being renamed
+  (chains and cycles) go through a temporary name: the item is moved to
+  the temporary name in the first wave, and to its new name in the
+  second wave, once the first wave has freed all old names.
+
+Moves within a wave are independent of each other, so each wave can be
+made in batches, concurrently (see
+``onedrive.api.OneDriveAPIClient.rename_many``).
+
+"""
+
+import posixpath
+
+import onedrive.exceptions
+
+# Temporary names are TEMP_NAME_FORMAT % (number, old name).
+TEMP_NAME_FORMAT = ".onedrive-rename-%d-%s"
+
+def _key(name):
+    """Key for comparing names the way OneDrive does (case-insensitively)."""
+    return name.lower()
+
+def plan_renames(directory, names, renames):
+    """Plan the renaming of items of a directory.
+
+    Parameters
+    ----------
+    directory : str
+        Remote path of the directory (only used in error messages).
+    names : iterable
+        Names of all items in the directory.
+    renames : list
+        Pairs ``(oldname, newname)``.
+
+    Returns
+    -------
+    waves : list
+        Lists of triples ``(index, srcname, dstname)`` of moves, where
+        ``index`` is the index of the rename in ``renames``. Moves of a
+        wave can be made in any order, but only once all moves of the
+        previous wave are done. There are at most two waves.
+    errors : dict
+        Exceptions for renames rejected up front, by index.
+
+    """
+    # pylint: disable=too-many-locals,too-many-branches
+    existing = set(_key(name) for name in names)
+    errors = {}
+
+    sources = {}
+    for index, (oldname, _) in enumerate(renames):
+        sources.setdefault(_key(oldname), []).append(index)
+    targets = {}
+    for index, (oldname, newname) in enumerate(renames):
+        if len(sources[_key(oldname)]) > 1:
+            errors[index] = onedrive.exceptions.PermissionError(
+                msg="'%s' cannot be renamed more than once" %
+                posixpath.join(directory, oldname))
+        elif _key(oldname) not in existing:
+            errors[index] = onedrive.exceptions.FileNotFoundError(
+                path=posixpath.join(directory, oldname))
+        elif not newname or "/" in newname or newname in (".", ".."):
+            errors[index] = onedrive.exceptions.PermissionError(
+                msg="invalid new name '%s' for '%s'" %
+                (newname, posixpath.join(directory, oldname)))
+        else:
+            targets.setdefault(_key(newname), []).append(index)
+    for indices in targets.values():
+        if len(indices) > 1:
+            for index in indices:
+                oldname, newname = renames[index]
+                errors[index] = onedrive.exceptions.FileExistsError(
+                    msg="'%s' cannot be renamed to '%s': other items are renamed to it too" %
+                    (posixpath.join(directory, oldname), newname))
+
+    # a rename blocked by an item that stays put is rejected, which in
+    # turn keeps that item in place, and so on
+    moving = {}
+    for index, (oldname, _) in enumerate(renames):
+        if index not in errors:
+            moving[_key(oldname)] = index
+    changed = True
+    while changed:
+        changed = False
+        for index, (oldname, newname) in enumerate(renames):
+            if index in errors:
+                continue
+            target = _key(newname)
+            if target == _key(oldname) or target not in existing or target in moving:
+                continue
+            errors[index] = onedrive.exceptions.FileExistsError(
+                path=posixpath.join(directory, newname))
+            del moving[_key(oldname)]
+            changed = True
+
+    first_wave = []
+    second_wave = []
+    taken = existing | set(targets)
+    counter = 0
+    for index, (oldname, newname) in enumerate(renames):
+        if index in errors:
+            continue
+        target = _key(newname)
+        if target == _key(oldname) or target not in existing:
+            first_wave.append((index, oldname, newname))
+            continue
+        # the new name is still taken by another item being renamed
+        while True:
+            counter += 1
+            tempname = TEMP_NAME_FORMAT % (counter, oldname)
+            if _key(tempname) not in taken:
+                break
+        taken.add(_key(tempname))
+        first_wave.append((index, oldname, tempname))
+        second_wave.append((index, tempname, newname))
+
+    waves = [wave for wave in (first_wave, second_wave) if wave]
+    return waves, errors
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+"""Retry policy shared by API requests, uploads, downloads and copies.
+
+A ``RetryPolicy`` decides whether a failed attempt (a connection error, a
+timeout, or an HTTP status code denoting a transient condition) should be
+retried, and how long to wait before the next attempt:
+
+* If the response carries a ``Retry-After`` header (in seconds or as an
+  HTTP date), the server knows best, and the header is honored;
+* Otherwise, the delay grows exponentially with the number of attempts
+  made so far, capped at ``max_delay``, with random jitter so that
+  concurrent workers throttled at the same time don't retry in lockstep.
+
+The default policy can be tuned through the optional ``retry`` section of
+the config file, e.g.::
+
+    [retry]
+    max_attempts = 8
+    upload_max_attempts = 30
+    base_delay = 2
+    max_delay = 120
+
+Chunk uploads of resumable upload sessions get a budget of their own
+(``upload_max_attempts``), much larger than that of a single request:
+giving up on a chunk loses the whole upload session, however much has
+been uploaded already.
+
+"""
+
+import copy
+import email.utils
+import logging
+import random
+import time
+
+class RetryPolicy(object):
+    """Retry policy with capped exponential backoff and jitter.
+
+    Parameters
+    ----------
+    max_attempts : int, optional
+        Maximum number of attempts (including the first one) of an
+        operation. Default is 5.
+    upload_max_attempts : int, optional
+        Maximum number of consecutive failed attempts of chunk uploads
+        of a resumable upload session. Default is 20.
+    base_delay : float, optional
+        Delay before the first retry, in seconds; doubled for each
+        subsequent retry. Default is 1.
+    max_delay : float, optional
+        Cap of the exponential delay, in seconds. Default is 60.
+    max_retry_after : float, optional
+        Cap of the delay requested by ``Retry-After``, in seconds.
+        Default is 3600.
+
+    Attributes
+    ----------
+    max_attempts : int
+    upload_max_attempts : int
+    base_delay : float
+    max_delay : float
+    max_retry_after : float
+
+    """
+
+    # HTTP status codes denoting transient conditions
+    RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+    def __init__(self, max_attempts=5, base_delay=1, max_delay=60, max_retry_after=3600,
+                 upload_max_attempts=20):
+        """Init."""
+        self.max_attempts = max(1, max_attempts)
+        self.upload_max_attempts = max(1, upload_max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    @classmethod
+    def from_config(cls, conf):
+        """Build a policy from the ``retry`` section of a config, if any.
+
+        Parameters
+        ----------
+        conf : configparser.ConfigParser
+            Missing options fall back to the defaults.
+
+        Returns
+        -------
+        RetryPolicy
+
+        """
+        if not conf.has_section("retry"):
+            return cls()
+        section = conf["retry"]
+        kwargs = {}
+        for option, convert in (("max_attempts", int), ("upload_max_attempts", int),
+                                ("base_delay", float), ("max_delay", float),
+                                ("max_retry_after", float)):
+            if option in section:
+                kwargs[option] = convert(section[option])
+        return cls(**kwargs)
+
+    def excluding(self, *status_codes):
+        """Return a copy of the policy that does not retry some status codes.
+
+        For requests where these status codes are final answers, e.g.,
+        HTTP 500 from the monitor URL of a copy means the copy failed.
+
+        Parameters
+        ----------
+        status_codes : int
+
+        Returns
+        -------
+        RetryPolicy
+
+        """
+        policy = copy.copy(self)
+        policy.RETRY_STATUS_CODES = self.RETRY_STATUS_CODES - frozenset(status_codes)
+        return policy
+
+    def is_retryable(self, response):
+        """Whether ``response`` denotes a transient condition."""
+        return response.status_code in self.RETRY_STATUS_CODES
+
+    def should_retry(self, attempt, response=None):
+        """Decide whether to make another attempt.
+
+        Parameters
+        ----------
+        attempt : int
+            Number of attempts made so far (one-based).
+        response : requests.Response, optional
+            Response to the last attempt; ``None`` if the attempt failed
+            with a connection error or timeout (always retryable).
+
+        Returns
+        -------
+        bool
+
+        """
+        if attempt >= self.max_attempts:
+            return False
+        return response is None or self.is_retryable(response)
+
+    @staticmethod
+    def retry_after(response):
+        """Parse the ``Retry-After`` header of ``response``.
+
+        Returns
+        -------
+        seconds : float or None
+            ``None`` if there is no (valid) header.
+
+        """
+        if response is None:
+            return None
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if date is None:
+            return None
+        return max(0.0, date.timestamp() - time.time())
+
+    def delay(self, attempt, response=None):
+        """Delay before the next attempt, in seconds.
+
+        Parameters
+        ----------
+        attempt : int
+            Number of attempts made so far (one-based).
+        response : requests.Response, optional
+            Response to the last attempt, if any.
+
+        Returns
+        -------
+        float
+
+        """
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        backoff = min(self.max_delay, self.base_delay * 2 ** max(0, attempt - 1))
+        # "equal jitter": at least half of the backoff, plus a random part
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+    def sleep(self, attempt, response=None, reason=None, max_attempts=None):
+        """Sleep before the next attempt, logging why.
+
+        Parameters
+        ----------
+        attempt : int
+        response : requests.Response, optional
+        reason : str, optional
+            Description of the failure, for logging.
+        max_attempts : int, optional
+            Attempt budget of the operation, for logging. Default is
+            ``max_attempts`` of the policy.
+
+        Returns
+        -------
+        float
+            The delay slept, in seconds.
+
+        """
+        delay = self.delay(attempt, response)
+        if reason is None:
+            reason = ("got HTTP %d" % response.status_code if response is not None
+                      else "request failed")
+        logging.warning("%s; retrying after %.1f seconds (attempt %d of %d)",
+                        reason, delay, attempt + 1,
+                        max_attempts if max_attempts is not None else self.max_attempts)
+        time.sleep(delay)
+        return delay
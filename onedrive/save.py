@@ -15,6 +15,11 @@ SHA-1 digest of the file. It looks like::
 
 where ``"expires"`` is a POSIX timestamp.
 
+When the SHA-1 digest is not known in advance (i.e., the file is hashed
+while being uploaded), the session is instead identified by a fingerprint
+of the local file (see ``onedrive.hash_helper.file_fingerprint``), which is
+saved as ``"fingerprint"`` in place of ``"sha1sum"``.
+
 """
 
 import arrow
@@ -24,18 +29,24 @@ import logging
 import os
 import time
 
+import onedrive.util
+
 class SavedUploadSession(object):
     """Saved upload session.
 
     Parameters
     ----------
     remote_path : str
-    sha1sum : str
+    sha1sum : str, optional
+    fingerprint : str, optional
+        Fingerprint of the local file, used to identify the session when
+        ``sha1sum`` is not given.
 
     Attributes
     ----------
     remote_path : str
     sha1sum : str
+    fingerprint : str
     session_path : str
         Path of saved session on disk.
     upload_url : str
@@ -47,11 +58,15 @@ class SavedUploadSession(object):
     """
     # pylint: disable=attribute-defined-outside-init,invalid-name
 
-    def __init__(self, remote_path, sha1sum):
+    def __init__(self, remote_path, sha1sum=None, fingerprint=None):
         """Try to load saved upload session."""
+        if sha1sum is None and fingerprint is None:
+            raise ValueError("either sha1sum or fingerprint is required")
         self.remote_path = remote_path
         self.sha1sum = sha1sum
-        self.session_path = self._locate_saved_session(remote_path, sha1sum)
+        self.fingerprint = fingerprint if sha1sum is None else None
+        key = sha1sum if sha1sum is not None else "fingerprint:%s" % fingerprint
+        self.session_path = self._locate_saved_session(remote_path, key)
         self.load()
 
     def __bool__(self):
@@ -61,10 +76,7 @@ class SavedUploadSession(object):
     @staticmethod
     def _locate_saved_session(remote_path, sha1sum):
         """Return path of the saved session on disk (might not exist)."""
-        if "XDG_DATA_HOME" in os.environ:
-            home = os.path.join(os.environ["XDG_DATA_HOME"], "onedrive")
-        else:
-            home = os.path.expanduser("~/.local/share/onedrive")
+        home = onedrive.util.data_dir()
 
         session_id = hashlib.sha1("{path}\n{sha1sum}".format(
             path=remote_path, sha1sum=sha1sum).encode("utf-8")).hexdigest()
@@ -101,12 +113,16 @@ class SavedUploadSession(object):
         self.expires = arrow.get(expiration_datetime).timestamp
         os.makedirs(os.path.dirname(self.session_path), exist_ok=True)
         with open(self.session_path, "w", encoding="utf-8") as fp:
-            json.dump({
+            session = {
                 "remote_path": self.remote_path,
-                "sha1sum": self.sha1sum,
                 "upload_url": self.upload_url,
                 "expires": self.expires
-            }, fp, indent=4)
+            }
+            if self.sha1sum is not None:
+                session["sha1sum"] = self.sha1sum
+            else:
+                session["fingerprint"] = self.fingerprint
+            json.dump(session, fp, indent=4)
         logging.info("session %s saved", self.session_path)
 
     def discard(self):
@@ -118,5 +134,6 @@ class SavedUploadSession(object):
         logging.info("session %s discarded", self.session_path)
         self.remote_path = None
         self.sha1sum = None
+        self.fingerprint = None
         self.upload_url = None
         self.expires = None
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""Share the OAuth access token between processes.
+
+Without coordination, each process (e.g., each multiprocessing worker of
+the CLI) notices the expiration of the access token on its own, and
+refreshes it independently: N redundant round trips to the token
+endpoint, and N racing rewrites of the config file.
+
+The token broker keeps the current access token in a small JSON file
+under ``~/.local/share/onedrive/`` (or ``$XDG_DATA_HOME/onedrive/``),
+one per config file and client ID, e.g.::
+
+    {
+        "access_token": "EwCAAq1DBAAUGCCXc8wU/zFu9QnLdZXy+YnElFkAAQ...",
+        "expires": 1450000000
+    }
+
+Refreshing is done under an exclusive lock on ``FILENAME.lock``, and a
+process only refreshes if the token in the file is still the stale one
+it knows about; otherwise, another process has refreshed in the
+meantime, and the new token is picked up from the file without any
+network request.
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+import onedrive.util
+
+class TokenBroker(onedrive.util.PicklableWithLock):
+    """Cross-process cache of the access token, with a refresh lock.
+
+    Parameters
+    ----------
+    key : str
+        String identifying the credentials, e.g., the path to the config
+        file and the client ID; tokens of different credentials are kept
+        in different files.
+    margin : float, optional
+        A token expiring within ``margin`` seconds is considered stale.
+        Default is 60.
+    token_dir : str, optional
+        Directory of the token files. Default is
+        ``~/.local/share/onedrive`` (or ``$XDG_DATA_HOME/onedrive``).
+
+    Attributes
+    ----------
+    token_path : str
+    lock_path : str
+    margin : float
+
+    """
+
+    def __init__(self, key, margin=60, token_dir=None):
+        """Init."""
+        if token_dir is None:
+            token_dir = onedrive.util.data_dir()
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        self.token_path = os.path.join(token_dir, "token-%s.json" % digest)
+        self.lock_path = "%s.lock" % self.token_path
+        self.margin = margin
+        self._lock = threading.Lock()
+
+    def is_fresh(self, expires):
+        """Whether a token expiring at ``expires`` is still good to use."""
+        return expires - self.margin > time.time()
+
+    def load(self):
+        """Read the token file.
+
+        Returns
+        -------
+        access_token : str
+            ``None`` if there is no (valid) token file.
+        expires : int
+            Expiration time of the token, as a POSIX timestamp; ``0``
+            if there is no (valid) token file.
+
+        """
+        try:
+            with open(self.token_path, encoding="utf-8") as fp:
+                saved = json.load(fp)
+            return saved["access_token"], int(saved["expires"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, 0
+
+    def save(self, access_token, expires):
+        """Write the token file (atomically, readable by the owner only)."""
+        os.makedirs(os.path.dirname(self.token_path), exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (self.token_path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "w", encoding="utf-8") as fp:
+            json.dump({"access_token": access_token, "expires": expires}, fp)
+        os.replace(tmp_path, self.token_path)
+
+    def refresh(self, fetch, stale_token=None):
+        """Get a fresh token, refreshing it only if no one else has.
+
+        Parameters
+        ----------
+        fetch : callable
+            Called without arguments (with the lock held) to actually
+            refresh the token; should return ``(access_token,
+            expires)``.
+        stale_token : str, optional
+            The token known to the caller. A fresh token in the file is
+            only used if it differs from this one (e.g., a token
+            rejected with HTTP 401 is refreshed even if not expired).
+
+        Returns
+        -------
+        access_token : str
+        expires : int
+
+        """
+        with self._lock:
+            lock_fd = None
+            try:
+                if fcntl is not None:
+                    try:
+                        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+                        lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+                        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+                    except OSError as err:
+                        logging.warning("failed to lock %s: %s", self.lock_path, str(err))
+                access_token, expires = self.load()
+                if access_token is not None and access_token != stale_token and \
+                   self.is_fresh(expires):
+                    logging.debug("picked up access token refreshed by another process")
+                    return access_token, expires
+                access_token, expires = fetch()
+                try:
+                    self.save(access_token, expires)
+                except OSError as err:
+                    logging.warning("failed to save access token to %s: %s",
+                                    self.token_path, str(err))
+                return access_token, expires
+            finally:
+                if lock_fd is not None:
+                    # closing the file releases the lock
+                    os.close(lock_fd)
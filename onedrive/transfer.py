@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+"""Thread-based engine for concurrent uploads and downloads.
+
+Transfers are I/O-bound (and hashing releases the GIL), so there is no
+need for a process per transfer: the engine runs transfers on a fixed
+pool of threads sharing a single client, hence a single pool of
+keep-alive connections (as well as the metadata cache, the token and
+the rate limiter) across all transfers, however many files there are.
+
+Worker threads are daemonic, so that an interrupted program exits right
+away instead of waiting for transfers in progress to complete; partial
+downloads are left in place for resuming, like with a single transfer.
+
+"""
+
+import concurrent.futures
+import queue
+import threading
+
+class TransferEngine(object):
+    """Run transfers on a pool of daemon threads sharing one client.
+
+    Can be used as a context manager, which shuts down the engine on
+    exit.
+
+    Parameters
+    ----------
+    client : onedrive.api.OneDriveAPIClient
+        Client shared by all transfers.
+    jobs : int, optional
+        Number of concurrent transfers (i.e., worker threads). Default
+        is 4.
+    connections_per_job : int, optional
+        Number of connections a single transfer may use concurrently
+        (e.g., ``parallel_chunks`` of an upload, or ``connections`` of a
+        download), for sizing the connection pools of the client.
+        Default is 1.
+
+    Attributes
+    ----------
+    client : onedrive.api.OneDriveAPIClient
+    jobs : int
+
+    """
+
+    def __init__(self, client, jobs=4, connections_per_job=1):
+        """Init; worker threads are started lazily."""
+        self.client = client
+        self.jobs = max(1, jobs)
+        pool_size = max(10, self.jobs * max(1, connections_per_job))
+        client.set_pool_size(pool_size)
+        client.set_download_pool_size(pool_size)
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def __enter__(self):
+        """Enter context."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Shut down; don't wait for transfers in progress upon an exception."""
+        self.shutdown(wait=exc_type is None)
+
+    def _worker(self):
+        """Body of a worker thread."""
+        while True:
+            work = self._queue.get()
+            if work is None:
+                return
+            future, func, args, kwargs = work
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as err:  # pylint: disable=broad-except
+                future.set_exception(err)
+            else:
+                future.set_result(result)
+
+    def submit(self, func, *args, **kwargs):
+        """Schedule ``func(*args, **kwargs)`` on a worker thread.
+
+        Returns
+        -------
+        concurrent.futures.Future
+
+        Raises
+        ------
+        RuntimeError
+            If the engine has been shut down.
+
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit to a shut down transfer engine")
+            if len(self._threads) < self.jobs:
+                thread = threading.Thread(target=self._worker,
+                                          name="transfer-%d" % len(self._threads))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+            self._queue.put((future, func, args, kwargs))
+        return future
+
+    def run(self, func, items):
+        """Call ``func`` on each item, concurrently.
+
+        Items are consumed lazily, with at most twice as many calls
+        scheduled as there are workers, so ``items`` may be a generator
+        producing work while transfers are under way.
+
+        Parameters
+        ----------
+        func : callable
+            Called with a single item.
+        items : iterable
+
+        Yields
+        ------
+        item
+            The item.
+        result
+            Return value of ``func``, or ``None`` if it raised.
+        error : Exception
+            Exception raised by ``func``, or ``None``.
+
+        Results are generated in order of completion.
+
+        """
+        items = iter(items)
+        futures = {}
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(futures) < 2 * self.jobs:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    futures[self.submit(func, item)] = item
+                if not futures:
+                    return
+                done, _ = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    item = futures.pop(future)
+                    error = future.exception()
+                    if isinstance(error, KeyboardInterrupt):
+                        raise error
+                    yield item, (future.result() if error is None else None), error
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def upload(self, directory, local_paths, **upload_kwargs):
+        """Upload local files to a remote directory, concurrently.
+
+        Parameters
+        ----------
+        directory : str
+            Remote directory to upload to.
+        local_paths : iterable
+            Paths of local files.
+
+        Other Parameters
+        ----------------
+        upload_kwargs
+            Keyword arguments passed to
+            ``onedrive.api.OneDriveAPIClient.upload``.
+
+        Yields
+        ------
+        local_path : str
+        error : Exception
+            ``None`` if the upload succeeded.
+
+        """
+        for local_path, _, error in self.run(
+                lambda local_path: self.client.upload(directory, local_path, **upload_kwargs),
+                local_paths):
+            yield local_path, error
+
+    def download(self, items, **download_kwargs):
+        """Download remote files, concurrently.
+
+        Parameters
+        ----------
+        items : iterable
+            Each item is either the path of a remote file (downloaded to
+            the current working directory), a pair ``(remotepath,
+            localdir)``, or a triple ``(remotepath, localdir, metadata)``
+            where ``metadata`` is the already known metadata object of
+            the file (see the ``metadata`` parameter of
+            ``onedrive.api.OneDriveAPIClient.download``).
+
+        Other Parameters
+        ----------------
+        download_kwargs
+            Keyword arguments passed to
+            ``onedrive.api.OneDriveAPIClient.download``.
+
+        Yields
+        ------
+        item
+            The item.
+        error : Exception
+            ``None`` if the download succeeded.
+
+        """
+        def download(item):
+            """Download a single item."""
+            if not isinstance(item, tuple):
+                item = (item,)
+            remotepath, localdir, metadata = item + (None,) * (3 - len(item))
+            self.client.download(remotepath, destdir=localdir, metadata=metadata,
+                                 **download_kwargs)
+
+        for item, _, error in self.run(download, items):
+            yield item, error
+
+    def shutdown(self, wait=True):
+        """Stop the workers once the scheduled work is done.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Whether to wait for the scheduled work to complete. If
+            ``False``, work not yet started is cancelled. Default is
+            ``True``.
+
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            if not wait:
+                while True:
+                    try:
+                        work = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    work[0].cancel()
+            for _ in self._threads:
+                self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -7,11 +7,17 @@ import logging
 import requests
 
 class FileSegment(io.IOBase):
-    """Implements a file segment object that mimicks a binary file object."""
+    """Implements a file segment object that mimicks a binary file object.
 
-    def __init__(self, fileobj, start, length, total):
+    If ``hasher`` (an ``onedrive.hash_helper.IncrementalHasher``) is
+    given, it is fed with whatever is read.
+
+    """
+
+    def __init__(self, fileobj, start, length, total, hasher=None):
         """Init; seek to starting position."""
         self._fileobj = fileobj
+        self._hasher = hasher
         self._start = start
         # end is last readable byte in the segment + 1
         self._end = min(start + length, total)
@@ -26,35 +32,58 @@ class FileSegment(io.IOBase):
         maxsize = self._end - self._fileobj.tell()
         if size < 0 or size > maxsize:
             size = maxsize
-        return self._fileobj.read(size)
+        position = self._fileobj.tell()
+        data = self._fileobj.read(size)
+        if self._hasher is not None:
+            self._hasher.feed(position, data)
+        return data
 
 def stream_put_file_segment(session, url, fileobj, start, length, total,
-                            timeout=None, retries=5, path=None):
-    """PUT a file segment using requests' streaming upload feature."""
-    for retry in range(retries + 1):
-        segment = FileSegment(fileobj, start, length, total)
+                            timeout=None, path=None, hasher=None):
+    """PUT a file segment using requests' streaming upload feature.
+
+    Errors are retried according to ``session.retry_policy``, with a
+    fresh segment for each attempt (a partially consumed stream cannot
+    be replayed, hence ``noretry`` for the request itself).
+
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        segment = FileSegment(fileobj, start, length, total, hasher=hasher)
         headers = {"Content-Range": "bytes %d-%d/%d" % (start, start + length - 1, total)}
         try:
-            return session.put(url, data=segment, headers=headers, timeout=timeout, path=path)
+            response = session.put(url, data=segment, headers=headers, timeout=timeout,
+                                   path=path, noretry=True)
         except requests.exceptions.RequestException as err:
-            if path:
-                logging.warning("%s: %s", path, str(err))
-            else:
-                logging.warning(str(err))
-            if retry == retries:
+            _log_error(err, path)
+            if not session.retry_policy.should_retry(attempt):
                 raise
+            session.retry_policy.sleep(attempt, reason=str(err))
+            continue
+        if session.retry_policy.should_retry(attempt, response):
+            session.retry_policy.sleep(attempt, response)
+            continue
+        return response
 
 def put_file_segment(session, url, segment, start, length, total,
-                     timeout=None, retries=5, path=None):
-    """PUT a file segment already loaded into a bytes object."""
+                     timeout=None, path=None):
+    """PUT a file segment already loaded into a bytes object.
+
+    Errors are retried by ``session.request`` according to
+    ``session.retry_policy``.
+
+    """
     headers = {"Content-Range": "bytes %d-%d/%d" % (start, start + length - 1, total)}
-    for retry in range(retries + 1):
-        try:
-            return session.put(url, data=segment, headers=headers, timeout=timeout, path=path)
-        except requests.exceptions.RequestException as err:
-            if path:
-                logging.warning("%s: %s", path, str(err))
-            else:
-                logging.warning(str(err))
-            if retry == retries:
-                raise
+    try:
+        return session.put(url, data=segment, headers=headers, timeout=timeout, path=path)
+    except requests.exceptions.RequestException as err:
+        _log_error(err, path)
+        raise
+
+def _log_error(err, path=None):
+    """Log a request error."""
+    if path:
+        logging.warning("%s: %s", path, str(err))
+    else:
+        logging.warning(str(err))
@@ -4,8 +4,12 @@
 
 import os
 import posixpath
+import sqlite3
+import threading
 import urllib.parse
 
+import requests.adapters
+
 def pop_query_from_url(url, query_variable):
     """Strip a certain query_variable from an URL.
 
@@ -70,3 +74,123 @@ def normalized_ospath(path):
 
     """
     return os.path.join(*posixpath.normpath(path).split("/"))
+
+def mount_pooled_adapter(session, pool_size):
+    """Mount an HTTP(S) adapter with a connection pool of a given size.
+
+    The adapters previously mounted on the session for HTTP(S) are
+    closed, along with their pooled connections.
+
+    Parameters
+    ----------
+    session : requests.Session
+    pool_size : int
+        Maximum number of connections kept alive per host.
+
+    """
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                            pool_maxsize=pool_size)
+    for prefix in ("https://", "http://"):
+        old_adapter = session.adapters.get(prefix)
+        session.mount(prefix, adapter)
+        if old_adapter is not None:
+            old_adapter.close()
+
+def data_dir():
+    """Directory of the data files of this package.
+
+    Returns
+    -------
+    path : str
+        ``$XDG_DATA_HOME/onedrive`` if ``XDG_DATA_HOME`` is set;
+        otherwise, ``~/.local/share/onedrive``.
+
+    """
+    if "XDG_DATA_HOME" in os.environ:
+        return os.path.join(os.environ["XDG_DATA_HOME"], "onedrive")
+    else:
+        return os.path.expanduser("~/.local/share/onedrive")
+
+class PicklableWithLock(object):
+    """Base class of objects guarded by a ``threading.Lock``.
+
+    The lock, ``_lock``, cannot be pickled; it is dropped when the object
+    is pickled (e.g., sent to a worker process), and a new one is made
+    when it is unpickled.
+
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __getstate__(self):
+        """Pickle without the lock."""
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        """Restore from pickled state."""
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+class SQLiteConnections(object):
+    """Connections to an SQLite database, one per thread and process.
+
+    Connections are opened lazily, in WAL mode, so that the database may
+    be accessed concurrently by multiple threads and processes; the
+    database (and its directory) and the schema are created on the way
+    if needed. Open connections are dropped when pickled.
+
+    Parameters
+    ----------
+    db_path : str
+    schema : list
+        SQL statements creating the schema (e.g., ``CREATE TABLE IF NOT
+        EXISTS ...``), run on every new connection.
+
+    Attributes
+    ----------
+    db_path : str
+
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, db_path, schema):
+        """Init."""
+        self.db_path = db_path
+        self._schema = list(schema)
+        self._local = threading.local()
+
+    def __getstate__(self):
+        """Pickle without the connections."""
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        """Restore from pickled state."""
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def get(self):
+        """Return the connection for the current thread and process.
+
+        Raises
+        ------
+        sqlite3.Error
+            If the database cannot be opened or initialized.
+
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        for statement in self._schema:
+            connection.execute(statement)
+        connection.commit()
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+"""Concurrent directory tree walker.
+
+The walker lists up to ``jobs`` directories at once in a thread pool,
+instead of one ``children`` listing after another. As soon as the listing
+of a directory arrives, its subdirectories become candidates for listing,
+so the tree is fetched ahead of the consumer, in the order it is going
+to be consumed (i.e., the order of the serial walk). The lookahead is
+bounded: at most ``2 * jobs`` listings are in flight, or done but not
+consumed yet, at any time, so memory use does not grow with the size of
+the tree, and little is wasted when the caller stops early. In the
+default (ordered) mode, tuples are still generated in exactly the same
+order as the serial walk; in unordered mode, each directory is generated
+as soon as its listing (and that of its parent) is available.
+
+In top-down mode, the caller may prune (or reorder) the list of
+subdirectories in-place, just like with ``os.walk``; listings already
+submitted for pruned subtrees are cancelled (or discarded, if already
+running).
+
+"""
+
+import concurrent.futures
+import heapq
+import itertools
+import posixpath
+import threading
+
+class _Node(object):
+    """A directory to be listed.
+
+    Attributes
+    ----------
+    level : int
+    path : str
+    metadata : dict
+        Metadata object of the directory, or ``None`` if unknown.
+    key : tuple
+        Position of the directory in the serial (top-down) walk, for
+        prioritizing listings.
+    future : concurrent.futures.Future
+        Future of the ``(dirs, files)`` listing; ``None`` until the
+        listing is submitted.
+    children : list
+        Nodes of subdirectories, set once the listing is done.
+    cancelled : bool
+    consumed : bool
+        Whether the listing has been consumed by the walk.
+
+    """
+
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes
+
+    def __init__(self, level, path, metadata, key):
+        """Init."""
+        self.level = level
+        self.path = path
+        self.metadata = metadata
+        self.key = key
+        self.future = None
+        self.children = []
+        self.cancelled = False
+        self.consumed = False
+
+def walkn(client, top, level=0, topdown=True, paths_only=False, **kwargs):
+    """Walk a directory tree concurrently.
+
+    See ``onedrive.api.OneDriveAPIClient.walkn``, which this function
+    backs when ``jobs`` is greater than 1.
+
+    Parameters
+    ----------
+    client : onedrive.api.OneDriveAPIClient
+    top : str
+    level : int, optional
+    topdown : bool, optional
+    paths_only : bool, optional
+
+    Other Parameters
+    ----------------
+    metadata : dict, optional
+        Metadata object of ``top``, if already known.
+    fields : list, optional
+        Names of the properties to request for each item. Default is
+        ``None``, i.e., all properties.
+    jobs : int, optional
+        Maximum number of directories listed concurrently. Default is
+        8.
+    ordered : bool, optional
+        Whether to generate tuples in the same order as the serial walk.
+        If ``False``, each directory is generated as soon as its listing
+        is available (a directory is still generated before its
+        subdirectories). Default is ``True``. Unordered mode is only
+        available in top-down mode.
+
+    Raises
+    ------
+    ValueError
+        If ``ordered`` is ``False`` and ``topdown`` is ``False``.
+
+    """
+    top_metadata = kwargs.pop("metadata", None)
+    fields = kwargs.pop("fields", None)
+    jobs = kwargs.pop("jobs", 8)
+    ordered = kwargs.pop("ordered", True)
+    if not ordered and not topdown:
+        raise ValueError("unordered walk is only available in top-down mode")
+
+    jobs = max(1, jobs)
+    # maximum number of listings in flight, or done but not yet consumed
+    lookahead = 2 * jobs
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    lock = threading.Lock()
+    # nodes waiting to be listed: heap of (key, sequence number, node)
+    waiting = []
+    sequence = itertools.count()
+    pending = set()
+    # number of listings in flight, or done but not yet consumed
+    outstanding = 0
+
+    def listing(node):
+        """List a directory and queue its subdirectories for listing."""
+        dirs = []
+        files = []
+        for item in client.iterchildren(node.path, fields=fields):
+            if "folder" in item:
+                dirs.append(item)
+            else:
+                files.append(item)
+        with lock:
+            if not node.cancelled:
+                node.children = [
+                    enqueue(_Node(node.level + 1, posixpath.join(node.path, item["name"]),
+                                  item, node.key + (index,)))
+                    for index, item in enumerate(dirs)]
+                fill()
+        return dirs, files
+
+    def enqueue(node):
+        """Queue a node for listing (lock held)."""
+        heapq.heappush(waiting, (node.key, next(sequence), node))
+        return node
+
+    def submit(node):
+        """Submit the listing of a node to the pool (lock held)."""
+        nonlocal outstanding
+        node.future = executor.submit(listing, node)
+        pending.add(node.future)
+        outstanding += 1
+
+    def fill():
+        """Submit queued listings, within the lookahead (lock held)."""
+        while waiting and outstanding < lookahead:
+            _, _, node = heapq.heappop(waiting)
+            if not node.cancelled and node.future is None:
+                submit(node)
+
+    def cancel(node):
+        """Cancel the listing of a node and its subtree (lock held)."""
+        nonlocal outstanding
+        if node.cancelled:
+            return
+        node.cancelled = True
+        if node.future is not None and not node.consumed:
+            node.future.cancel()
+            pending.discard(node.future)
+            outstanding -= 1
+        for child in node.children:
+            cancel(child)
+
+    def result(node):
+        """Wait for the listing of a node, and consume it."""
+        nonlocal outstanding
+        with lock:
+            if node.future is None:
+                # needed right now, whatever the lookahead
+                submit(node)
+        try:
+            return node.future.result()
+        finally:
+            with lock:
+                if not node.consumed:
+                    node.consumed = True
+                    pending.discard(node.future)
+                    outstanding -= 1
+                    fill()
+
+    def make_tuple(node, dirs, files):
+        """Make the tuple to yield for a node."""
+        if paths_only:
+            return (node.level, node.path,
+                    [item["name"] for item in dirs], [item["name"] for item in files])
+        if node.metadata is None:
+            node.metadata = client.metadata(node.path, fields=fields)
+        return node.level, node.metadata, dirs, files
+
+    def remaining_nodes(node, tup):
+        """Nodes of subdirectories left after the caller modified the list."""
+        by_name = {posixpath.basename(child.path): child for child in node.children}
+        remaining = []
+        with lock:
+            for entry in tup[2]:
+                name = entry if paths_only else entry["name"]
+                child = by_name.pop(name, None)
+                if child is None:
+                    # added by the caller
+                    metadata = None if paths_only else entry
+                    key = node.key + (len(node.children) + len(remaining),)
+                    child = enqueue(_Node(node.level + 1, posixpath.join(node.path, name),
+                                          metadata, key))
+                remaining.append(child)
+            # pruned by the caller
+            for child in by_name.values():
+                cancel(child)
+            node.children = remaining
+            fill()
+        return remaining
+
+    def walk_ordered(node):
+        """Walk the subtree of a node in serial order."""
+        dirs, files = result(node)
+        if topdown:
+            tup = make_tuple(node, dirs, files)
+            yield tup
+            for child in remaining_nodes(node, tup):
+                yield from walk_ordered(child)
+        else:
+            for child in node.children:
+                yield from walk_ordered(child)
+            yield make_tuple(node, dirs, files)
+
+    def walk_unordered(root):
+        """Walk the tree, fastest listing first."""
+        nodes = set([root])
+        while nodes:
+            with lock:
+                futures = {node.future: node for node in nodes if node.future is not None}
+                if not futures:
+                    # nothing in flight among the nodes to generate
+                    node = min(nodes, key=lambda node: node.key)
+                    submit(node)
+                    futures = {node.future: node}
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                node = futures[future]
+                nodes.remove(node)
+                dirs, files = result(node)
+                tup = make_tuple(node, dirs, files)
+                yield tup
+                nodes.update(remaining_nodes(node, tup))
+
+    root = _Node(level, top, top_metadata, ())
+    with lock:
+        submit(root)
+    try:
+        if ordered:
+            yield from walk_ordered(root)
+        else:
+            yield from walk_unordered(root)
+    finally:
+        with lock:
+            cancel(root)
+            for future in list(pending):
+                future.cancel()
+        executor.shutdown(wait=False)
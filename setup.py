@@ -46,6 +46,7 @@ setuptools.setup(
             'onedrive-dirdownload=onedrive.cli:cli_dirdownload',
             'onedrive-dirupload=onedrive.cli:cli_dirupload',
             'onedrive-geturl=onedrive.cli:cli_geturl',
+            'onedrive-index=onedrive.cli:cli_index',
             'onedrive-metadata=onedrive.cli:cli_metadata',
             'onedrive-mkdir=onedrive.cli:cli_mkdir',
             'onedrive-ls=onedrive.cli:cli_ls',
@@ -0,0 +1,8 @@
+"""Tests of the onedrive package.
+
+Run with ``python -m unittest discover`` (or ``python setup.py test``)
+from the root of the repository. Nothing here talks to the real
+OneDrive API: network round trips go to a local stand-in server (see
+``tests.server``).
+
+"""
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""In-memory stand-in for the parts of the API client used by helpers."""
+
+import posixpath
+import threading
+
+import onedrive.exceptions
+
+class FakeClient(object):
+    """Serve ``metadata`` and ``iterchildren`` from an in-memory tree.
+
+    Paths are looked up case-insensitively, like OneDrive does.
+
+    Parameters
+    ----------
+    tree : dict
+        Nested dicts: a dict value is a directory, an int value is a
+        file of that size.
+
+    Attributes
+    ----------
+    listed : list
+        Paths listed with ``iterchildren``, in order.
+
+    """
+
+    def __init__(self, tree):
+        """Init."""
+        self.tree = tree
+        self.listed = []
+        self._lock = threading.Lock()
+        self._ids = {}
+
+    def _lookup(self, path):
+        """Return ``(name, node)`` of ``path``, or raise if missing."""
+        name, node = "root", self.tree
+        for component in posixpath.normpath("/" + path).strip("/").split("/"):
+            if not component:
+                continue
+            if not isinstance(node, dict):
+                raise onedrive.exceptions.FileNotFoundError(path=path)
+            matches = [key for key in node if key.lower() == component.lower()]
+            if not matches:
+                raise onedrive.exceptions.FileNotFoundError(path=path)
+            name, node = matches[0], node[matches[0]]
+        return name, node
+
+    def _metadata(self, path, name, node):
+        """Make the metadata object of an item."""
+        key = posixpath.normpath("/" + path).lower()
+        with self._lock:
+            item_id = self._ids.setdefault(key, "ID%d" % len(self._ids))
+        metadata = {"id": item_id, "name": name, "eTag": "etag-" + item_id,
+                    "lastModifiedDateTime": "2016-01-01T00:00:00Z"}
+        if isinstance(node, dict):
+            metadata["folder"] = {"childCount": len(node)}
+            metadata["size"] = 0
+        else:
+            metadata["file"] = {"hashes": {"sha1Hash": "%040X" % node}}
+            metadata["size"] = node
+        return metadata
+
+    def metadata(self, path, fields=None):
+        """Metadata object of ``path``."""
+        # pylint: disable=unused-argument
+        name, node = self._lookup(path)
+        return self._metadata(path, name, node)
+
+    def iterchildren(self, path, fields=None):
+        """Metadata objects of the children of ``path``."""
+        # pylint: disable=unused-argument
+        _, node = self._lookup(path)
+        if not isinstance(node, dict):
+            raise onedrive.exceptions.NotADirectoryError(path=path)
+        with self._lock:
+            self.listed.append(path)
+        for name in sorted(node):
+            yield self._metadata(posixpath.join(path, name), name, node[name])
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""Local stand-in for the OneDrive API server.
+
+Serves JSON requests on a random port of localhost, from a background
+thread, by dispatching them to handler functions, e.g.::
+
+    def batch(body):
+        return 200, {}, {"responses": [...]}
+
+    with StandInServer({("POST", "/$batch"): batch}) as server:
+        client = make_client(server.url)
+        ...
+
+"""
+
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+import requests
+
+import onedrive.auth
+import onedrive.retry
+import onedrive.token_broker
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Dispatch requests to the handlers of the server."""
+
+    def _dispatch(self):
+        """Handle a request."""
+        path = urllib.parse.urlparse(self.path).path
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length).decode("utf-8")) if length else None
+        handler = self.server.handlers.get((self.command, path))
+        if handler is None:
+            status, headers, response_body = 404, {}, {"error": {"code": "itemNotFound"}}
+        else:
+            status, headers, response_body = handler(body)
+        payload = json.dumps(response_body).encode("utf-8") if response_body is not None else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Keep quiet."""
+
+class StandInServer(object):
+    """HTTP server answering requests with handler functions.
+
+    Parameters
+    ----------
+    handlers : dict
+        Maps ``(method, path)`` (e.g., ``("POST", "/$batch")``) to a
+        function taking the decoded JSON body of the request (or
+        ``None``), and returning ``(status, headers, body)``.
+
+    Attributes
+    ----------
+    url : str
+        Base URL of the server (with a trailing slash).
+
+    """
+
+    def __init__(self, handlers):
+        """Init."""
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.handlers = handlers
+        self.url = "http://127.0.0.1:%d/" % self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={"poll_interval": 0.05})
+        self._thread.daemon = True
+
+    def __enter__(self):
+        """Start serving."""
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+
+def make_client(api_endpoint, retry_policy=None):
+    """Make an OAuth client talking to a stand-in server.
+
+    The client has a long-lived dummy access token, so that neither the
+    config file nor the token endpoint is needed.
+
+    """
+    # pylint: disable=protected-access
+    client = onedrive.auth.OneDriveOAuthClient.__new__(onedrive.auth.OneDriveOAuthClient)
+    client.API_ENDPOINT = api_endpoint
+    client.retry_policy = (retry_policy if retry_policy is not None else
+                           onedrive.retry.RetryPolicy(base_delay=0, max_delay=0))
+    client.rate_limiter = None
+    client.client = requests.Session()
+    client.token_broker = onedrive.token_broker.TokenBroker("stand-in")
+    client._refresh_thread = None
+    client._set_access_token("dummy", int(time.time()) + 86400)
+    return client
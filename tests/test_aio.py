@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.aio."""
+
+import asyncio
+import gc
+import threading
+import time
+import unittest
+
+import onedrive.aio
+import onedrive.exceptions
+import onedrive.walk_helper
+from onedrive.aio import AsyncOneDriveAPIClient
+
+from tests.fakes import FakeClient
+
+class SyncClient(FakeClient):
+    """Fake synchronous client recording the threads it is called on."""
+
+    def __init__(self, tree):
+        """Init."""
+        super().__init__(tree)
+        self.pool_sizes = []
+        self.threads = set()
+
+    def set_pool_size(self, pool_size):
+        """Record the pool size."""
+        self.pool_sizes.append(pool_size)
+
+    set_download_pool_size = set_pool_size
+
+    def metadata(self, path, fields=None):
+        """Record the calling thread."""
+        self.threads.add(threading.get_ident())
+        return super().metadata(path, fields=fields)
+
+    def iterchildren(self, path, fields=None):
+        """Record the calling thread, for each item."""
+        for item in super().iterchildren(path, fields=fields):
+            self.threads.add(threading.get_ident())
+            yield item
+
+    def numbers(self, closed, delay=0):
+        """Generate numbers forever, recording when closed."""
+        try:
+            number = 0
+            while True:
+                time.sleep(delay)
+                yield number
+                number += 1
+        finally:
+            closed.set()
+
+    def walkn(self, top, level=0, topdown=True, paths_only=False, **kwargs):
+        """Walk with the concurrent walker."""
+        return onedrive.walk_helper.walkn(self, top, level=level, topdown=topdown,
+                                          paths_only=paths_only, **kwargs)
+
+TREE = {"a": {"x": 1, "y": 2}, "b": {}, "c": 3}
+
+def run(coroutine):
+    """Run a coroutine to completion on a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+class TestAsyncClient(unittest.TestCase):
+    """Tests of AsyncOneDriveAPIClient."""
+
+    def setUp(self):
+        """Make a client."""
+        self.sync_client = SyncClient(TREE)
+
+    def test_pool_size(self):
+        """Connection pools are sized for the workers."""
+        AsyncOneDriveAPIClient(client=self.sync_client, max_workers=4).close()
+        AsyncOneDriveAPIClient(client=self.sync_client, max_workers=64).close()
+        self.assertEqual(self.sync_client.pool_sizes, [10, 10, 64, 64])
+
+    def test_delegate(self):
+        """Coroutines run the synchronous methods on worker threads."""
+        async def main():
+            """Look up items concurrently."""
+            async with AsyncOneDriveAPIClient(client=self.sync_client, max_workers=2) as client:
+                return await asyncio.gather(*[client.metadata(path) for path in "abc"])
+
+        results = run(main())
+        self.assertEqual([metadata["name"] for metadata in results], ["a", "b", "c"])
+        self.assertNotIn(threading.get_ident(), self.sync_client.threads)
+
+    def test_exceptions(self):
+        """Exceptions propagate to the awaiting coroutine."""
+        async def main():
+            """Look up a missing item."""
+            async with AsyncOneDriveAPIClient(client=self.sync_client) as client:
+                await client.metadata("/missing")
+
+        with self.assertRaises(onedrive.exceptions.FileNotFoundError):
+            run(main())
+
+    def test_iterator(self):
+        """Asynchronous iterators advance the synchronous ones on worker threads."""
+        async def main():
+            """List a directory."""
+            async with AsyncOneDriveAPIClient(client=self.sync_client) as client:
+                iterator = client.iterchildren("/a")
+                # nothing happens until the iteration starts
+                self.assertEqual(self.sync_client.listed, [])
+                return [item["name"] async for item in iterator]
+
+        self.assertEqual(run(main()), ["x", "y"])
+        self.assertNotIn(threading.get_ident(), self.sync_client.threads)
+
+    def test_walkn(self):
+        """Walks can be consumed asynchronously."""
+        async def main():
+            """Walk the tree."""
+            async with AsyncOneDriveAPIClient(client=self.sync_client) as client:
+                return [(level, path, dirs, files) async for level, path, dirs, files
+                        in client.walkn("/", paths_only=True, jobs=2)]
+
+        self.assertEqual(run(main()), [
+            (0, "/", ["a", "b"], ["c"]),
+            (1, "/a", [], ["x", "y"]),
+            (1, "/b", [], []),
+        ])
+
+    def test_run(self):
+        """Arbitrary blocking calls can be run on worker threads."""
+        async def main():
+            """Run a function."""
+            async with AsyncOneDriveAPIClient(client=self.sync_client) as client:
+                return await client.run(lambda x, y=0: x + y, 1, y=2)
+
+        self.assertEqual(run(main()), 3)
+
+class TestAsyncIterator(unittest.TestCase):
+    """Tests of the closing of asynchronous iterators."""
+
+    def setUp(self):
+        """Make a client."""
+        self.sync_client = SyncClient(TREE)
+        self.closed = threading.Event()
+
+    def iterator(self, client, delay=0):
+        """Asynchronous iterator over numbers."""
+        # pylint: disable=protected-access
+        return onedrive.aio._AsyncIterator(
+            client, lambda: self.sync_client.numbers(self.closed, delay=delay))
+
+    def test_aclose(self):
+        """aclose closes the synchronous generator."""
+        async def main():
+            """Stop after a few items."""
+            async with AsyncOneDriveAPIClient(client=self.sync_client) as client:
+                iterator = self.iterator(client)
+                async for number in iterator:
+                    if number == 3:
+                        break
+                await iterator.aclose()
+                self.assertTrue(self.closed.is_set())
+                with self.assertRaises(StopAsyncIteration):
+                    await iterator.__anext__()
+
+        run(main())
+
+    def test_exhausted(self):
+        """Exhausted iterators are closed."""
+        async def main():
+            """Consume a listing."""
+            async with AsyncOneDriveAPIClient(client=self.sync_client) as client:
+                iterator = client.iterchildren("/a")
+                self.assertEqual(len([item async for item in iterator]), 2)
+                self.assertTrue(iterator._closed)  # pylint: disable=protected-access
+
+        run(main())
+
+    def test_dropped(self):
+        """Iterators dropped early are closed in the background."""
+        async def main():
+            """Drop the iterator after one item."""
+            async with AsyncOneDriveAPIClient(client=self.sync_client) as client:
+                iterator = self.iterator(client)
+                await iterator.__anext__()
+                del iterator
+                gc.collect()
+                await client.run(self.closed.wait, 5)
+
+        run(main())
+        self.assertTrue(self.closed.is_set())
+
+    def test_cancelled(self):
+        """Iterators are closed when the consumer is cancelled."""
+        async def consume(iterator):
+            """Consume forever."""
+            async for _ in iterator:
+                pass
+
+        async def main():
+            """Cancel the consumer."""
+            async with AsyncOneDriveAPIClient(client=self.sync_client) as client:
+                task = asyncio.ensure_future(consume(self.iterator(client, delay=0.01)))
+                await asyncio.sleep(0.05)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+                await client.run(self.closed.wait, 5)
+
+        run(main())
+        self.assertTrue(self.closed.is_set())
+
+if __name__ == "__main__":
+    unittest.main()
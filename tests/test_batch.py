@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.batch, and of batching by the OAuth client."""
+
+import threading
+import unittest
+
+import onedrive.exceptions
+from onedrive.batch import MAX_BATCH_SIZE, BatchRequest, BatchResponse
+
+from tests.server import StandInServer, make_client
+
+class TestBatchRequest(unittest.TestCase):
+    """Tests of BatchRequest and BatchResponse."""
+
+    def test_to_json(self):
+        """Requests are described with relative URLs, query strings and JSON bodies."""
+        request = BatchRequest("get", "drive/root:/a", params={"select": "id"})
+        self.assertEqual(request.to_json("1"), {
+            "id": "1", "method": "GET", "url": "/drive/root:/a?select=id"})
+        request = BatchRequest("patch", "/drive/items/X", json={"name": "b"},
+                               headers={"If-Match": "etag"})
+        self.assertEqual(request.to_json("2"), {
+            "id": "2", "method": "PATCH", "url": "/drive/items/X", "body": {"name": "b"},
+            "headers": {"Content-Type": "application/json", "If-Match": "etag"}})
+
+    def test_response(self):
+        """Responses quack like requests.Response."""
+        request = BatchRequest("get", "drive/root:/a")
+        response = BatchResponse(request, 200, headers={"retry-after": "5"}, body={"id": "X"})
+        self.assertTrue(response.ok)
+        self.assertEqual(response.headers["Retry-After"], "5")
+        self.assertEqual(response.json(), {"id": "X"})
+        self.assertEqual(response.text, '{"id": "X"}')
+        response = BatchResponse(request, 404)
+        self.assertFalse(response.ok)
+        self.assertEqual(response.text, "")
+        with self.assertRaises(ValueError):
+            response.json()
+
+class BatchServer(object):
+    """Handler of $batch requests, echoing the URL of each sub-request.
+
+    Parameters
+    ----------
+    throttled : dict
+        Number of times to throttle (HTTP 429) each sub-request, by URL.
+
+    Attributes
+    ----------
+    batches : list
+        The sub-requests of each batch received.
+
+    """
+
+    def __init__(self, throttled=None):
+        """Init."""
+        self.throttled = dict(throttled or {})
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, body):
+        """Answer a batch."""
+        responses = []
+        with self._lock:
+            self.batches.append(body["requests"])
+            for sub_request in body["requests"]:
+                url = sub_request["url"]
+                if self.throttled.get(url, 0) > 0:
+                    self.throttled[url] -= 1
+                    responses.append({"id": sub_request["id"], "status": 429,
+                                      "headers": {"Retry-After": "0"}})
+                else:
+                    responses.append({"id": sub_request["id"], "status": 200,
+                                      "body": {"url": url}})
+        # answered in any order
+        responses.reverse()
+        return 200, {}, {"responses": responses}
+
+class TestClientBatch(unittest.TestCase):
+    """Tests of onedrive.auth.OneDriveOAuthClient.batch."""
+
+    @staticmethod
+    def requests(count):
+        """Make sub-requests with distinct URLs."""
+        return [BatchRequest("get", "drive/items/%d" % index) for index in range(count)]
+
+    def test_grouping(self):
+        """Sub-requests are grouped into batches, and responses kept in order."""
+        handler = BatchServer()
+        with StandInServer({("POST", "/$batch"): handler}) as server:
+            client = make_client(server.url)
+            for jobs in (1, 3):
+                handler.batches = []
+                sub_requests = self.requests(2 * MAX_BATCH_SIZE + 5)
+                responses = client.batch(sub_requests, jobs=jobs)
+                self.assertEqual(sorted(len(batch) for batch in handler.batches),
+                                 [5, MAX_BATCH_SIZE, MAX_BATCH_SIZE])
+                self.assertEqual([response.json()["url"] for response in responses],
+                                 [request.url for request in sub_requests])
+                for request, response in zip(sub_requests, responses):
+                    self.assertIs(response.request, request)
+            self.assertEqual(client.batch([]), [])
+
+    def test_retry_throttled(self):
+        """Throttled sub-requests, and only those, are retried in new batches."""
+        handler = BatchServer({"/drive/items/3": 2, "/drive/items/7": 1})
+        with StandInServer({("POST", "/$batch"): handler}) as server:
+            client = make_client(server.url)
+            responses = client.batch(self.requests(10))
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertEqual([[sub_request["url"] for sub_request in batch]
+                          for batch in handler.batches[1:]],
+                         [["/drive/items/3", "/drive/items/7"], ["/drive/items/3"]])
+
+    def test_retry_exhausted(self):
+        """Sub-requests still throttled after the last attempt are returned as is."""
+        handler = BatchServer({"/drive/items/0": 10})
+        with StandInServer({("POST", "/$batch"): handler}) as server:
+            client = make_client(server.url)
+            client.retry_policy.max_attempts = 3
+            responses = client.batch(self.requests(2))
+        self.assertEqual([response.status_code for response in responses], [429, 200])
+        self.assertEqual(len(handler.batches), 3)
+
+    def test_batch_failure(self):
+        """A failed batch request raises."""
+        with StandInServer({("POST", "/$batch"): lambda body: (400, {}, {})}) as server:
+            client = make_client(server.url)
+            with self.assertRaises(onedrive.exceptions.APIRequestError):
+                client.batch(self.requests(2))
+
+    def test_missing_response(self):
+        """A sub-request left unanswered raises."""
+        def batch(body):
+            """Answer all but the first sub-request."""
+            return 200, {}, {"responses": [
+                {"id": sub_request["id"], "status": 204}
+                for sub_request in body["requests"][1:]]}
+
+        with StandInServer({("POST", "/$batch"): batch}) as server:
+            client = make_client(server.url)
+            with self.assertRaises(onedrive.exceptions.APIRequestError):
+                client.batch(self.requests(2))
+
+if __name__ == "__main__":
+    unittest.main()
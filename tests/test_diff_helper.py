@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.diff_helper."""
+
+import os
+import tempfile
+import unittest
+
+from onedrive.diff_helper import diff_trees, local_snapshot, remote_snapshot
+
+from tests.fakes import FakeClient
+
+def remote_file(size, mtime="2100-01-01T00:00:00Z"):
+    """Make the metadata object of a remote file."""
+    return {"name": "", "size": size, "file": {}, "lastModifiedDateTime": mtime}
+
+class TestDiffTrees(unittest.TestCase):
+    """Tests of the snapshots and diff_trees."""
+
+    def setUp(self):
+        """Make a local tree in a scratch directory."""
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.top = self._tmpdir.name
+        os.makedirs(os.path.join(self.top, "Sub"))
+        for relpath, content in (("a", b"1"), ("Foo.txt", b"22"), ("Sub/b", b"333")):
+            with open(os.path.join(self.top, relpath), "wb") as fp:
+                fp.write(content)
+
+    def tearDown(self):
+        """Remove the scratch directory."""
+        self._tmpdir.cleanup()
+
+    def test_local_snapshot(self):
+        """Files are sorted case-insensitively."""
+        dirs, files = local_snapshot(self.top)
+        self.assertEqual(sorted(dirs), ["", "Sub"])
+        self.assertEqual([relpath for relpath, _, _ in files], ["a", "Foo.txt", "Sub/b"])
+
+    def test_remote_snapshot(self):
+        """Remote files are sorted case-insensitively too."""
+        client = FakeClient({"b": 1, "A": 2, "D": {"c": 3}})
+        dirs, files = remote_snapshot(client, "/", jobs=2)
+        self.assertEqual(dirs, set(["", "D"]))
+        self.assertEqual([relpath for relpath, _ in files], ["A", "b", "D/c"])
+
+    def test_diff(self):
+        """New and changed files are found; unchanged ones are skipped."""
+        _, local_files = local_snapshot(self.top)
+        remote_files = [("a", remote_file(1)), ("Sub/b", remote_file(4))]
+        changes = [(relpath, metadata) for relpath, _, _, metadata in
+                   diff_trees(local_files, remote_files)]
+        self.assertEqual(changes, [("Foo.txt", None), ("Sub/b", remote_files[1][1])])
+
+    def test_diff_case_insensitive(self):
+        """Files are matched with remote files differing in case only."""
+        _, local_files = local_snapshot(self.top)
+        remote_files = sorted([("A", remote_file(1)), ("foo.txt", remote_file(5)),
+                               ("sub/B", remote_file(3))], key=lambda pair: pair[0].lower())
+        changes = [(relpath, metadata) for relpath, _, _, metadata in
+                   diff_trees(local_files, remote_files)]
+        # the changed file is reported with the remote metadata, and its local name
+        self.assertEqual(changes, [("Foo.txt", remote_files[1][1])])
+
+if __name__ == "__main__":
+    unittest.main()
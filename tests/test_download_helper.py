@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.download_helper."""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import unittest
+
+from onedrive.download_helper import RangeMap, segmented_download
+
+class FakeRangeResponse(object):
+    """Response to a range request."""
+
+    def __init__(self, data):
+        """Init."""
+        self.status_code = 206
+        self._data = data
+
+    def iter_content(self, chunk_size=1):
+        """Yield the data in chunks."""
+        for start in range(0, len(self._data), chunk_size):
+            yield self._data[start:start + chunk_size]
+
+    def close(self):
+        """Nothing to close."""
+
+class FakeSession(object):
+    """Serve range requests of some data, recording the peak concurrency."""
+
+    def __init__(self, data):
+        """Init."""
+        self.data = data
+        self.requests = 0
+        self.peak = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, **kwargs):
+        """Answer a range request, slowly."""
+        # pylint: disable=unused-argument
+        start, end = map(int, re.match(r"bytes=(\d+)-(\d+)", headers["Range"]).groups())
+        with self._lock:
+            self.requests += 1
+            self._active += 1
+            self.peak = max(self.peak, self._active)
+        time.sleep(0.01)
+        with self._lock:
+            self._active -= 1
+        return FakeRangeResponse(self.data[start:end + 1])
+
+class TestRangeMap(unittest.TestCase):
+    """Tests of RangeMap."""
+
+    def setUp(self):
+        """Make a scratch directory."""
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmp_path = os.path.join(self._tmpdir.name, "file.part")
+
+    def tearDown(self):
+        """Remove the scratch directory."""
+        self._tmpdir.cleanup()
+
+    def test_default(self):
+        """A new map covers the whole file."""
+        range_map = RangeMap(self.tmp_path, 100)
+        self.assertEqual(range_map.map_path, self.tmp_path + ".ranges")
+        self.assertEqual(range_map.ranges, [[0, 100]])
+        self.assertEqual(range_map.remaining, 100)
+
+    def test_save_load(self):
+        """A saved map is loaded back, as JSON next to the .part file."""
+        range_map = RangeMap(self.tmp_path, 100, [(10, 20), (50, 100)])
+        range_map.save()
+        with open(range_map.map_path, encoding="utf-8") as fp:
+            self.assertEqual(json.load(fp), {"size": 100, "ranges": [[10, 20], [50, 100]]})
+        self.assertFalse(os.path.exists(range_map.map_path + ".tmp"))
+        loaded = RangeMap.load(self.tmp_path, 100)
+        self.assertEqual(loaded.ranges, [[10, 20], [50, 100]])
+        self.assertEqual(loaded.remaining, 60)
+
+    def test_load_missing_or_corrupt(self):
+        """Missing and unreadable maps are ignored."""
+        self.assertIsNone(RangeMap.load(self.tmp_path, 100))
+        with open(self.tmp_path + ".ranges", "w", encoding="utf-8") as fp:
+            fp.write("{not json")
+        self.assertIsNone(RangeMap.load(self.tmp_path, 100))
+
+    def test_load_size_mismatch(self):
+        """A map saved for another size is ignored."""
+        RangeMap(self.tmp_path, 100, [(0, 50)]).save()
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(RangeMap.load(self.tmp_path, 200))
+
+    def test_discard(self):
+        """Discarding removes the map, and is fine if there is none."""
+        range_map = RangeMap(self.tmp_path, 100)
+        range_map.save()
+        range_map.discard()
+        self.assertFalse(os.path.exists(range_map.map_path))
+        range_map.discard()
+
+    def test_split(self):
+        """The largest range is halved until there are enough segments."""
+        range_map = RangeMap(self.tmp_path, 400)
+        range_map.split(4, min_segment_size=100)
+        self.assertEqual(range_map.ranges, [[0, 100], [100, 200], [200, 300], [300, 400]])
+        self.assertEqual(range_map.remaining, 400)
+
+    def test_split_min_segment_size(self):
+        """Ranges are not split below the minimum segment size."""
+        range_map = RangeMap(self.tmp_path, 300, [(0, 50), (100, 300)])
+        range_map.split(8, min_segment_size=100)
+        self.assertEqual(range_map.ranges, [[0, 50], [100, 200], [200, 300]])
+
+    def test_split_drops_empty_ranges(self):
+        """Empty ranges are dropped."""
+        range_map = RangeMap(self.tmp_path, 100, [(0, 0), (40, 40), (60, 100)])
+        range_map.split(1)
+        self.assertEqual(range_map.ranges, [[60, 100]])
+
+class TestSegmentedDownload(unittest.TestCase):
+    """Tests of segmented_download."""
+
+    def setUp(self):
+        """Make a scratch directory."""
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmp_path = os.path.join(self._tmpdir.name, "file.part")
+        self.data = os.urandom(1000)
+
+    def tearDown(self):
+        """Remove the scratch directory."""
+        self._tmpdir.cleanup()
+
+    def test_download(self):
+        """The file is downloaded, hashed, and the range map discarded."""
+        session = FakeSession(self.data)
+        sha1sum = segmented_download(session, "url", self.tmp_path, len(self.data), 4,
+                                     compute_hash=True)
+        with open(self.tmp_path, "rb") as fp:
+            self.assertEqual(fp.read(), self.data)
+        self.assertEqual(sha1sum, hashlib.sha1(self.data).hexdigest())
+        self.assertFalse(os.path.exists(self.tmp_path + ".ranges"))
+
+    def test_bounded_connections(self):
+        """Resuming with more holes than connections keeps to the connections."""
+        with open(self.tmp_path, "wb") as fp:
+            fp.write(self.data)
+        holes = [[start, start + 10] for start in range(0, 1000, 50)]
+        RangeMap(self.tmp_path, len(self.data), holes).save()
+        with open(self.tmp_path, "r+b") as fp:
+            for start, end in holes:
+                fp.seek(start)
+                fp.write(b"\0" * (end - start))
+        session = FakeSession(self.data)
+        sha1sum = segmented_download(session, "url", self.tmp_path, len(self.data), 3,
+                                     compute_hash=True)
+        self.assertEqual(session.requests, len(holes))
+        self.assertLessEqual(session.peak, 3)
+        with open(self.tmp_path, "rb") as fp:
+            self.assertEqual(fp.read(), self.data)
+        self.assertEqual(sha1sum, hashlib.sha1(self.data).hexdigest())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.hash_cache."""
+
+import hashlib
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from onedrive.hash_cache import HashCache
+
+class TestHashCache(unittest.TestCase):
+    """Tests of HashCache."""
+
+    def setUp(self):
+        """Make a cache and a few files in a scratch directory."""
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.cache = HashCache(db_path=os.path.join(self._tmpdir.name, "hash_cache.sqlite"))
+        self.paths = []
+        for index in range(3):
+            path = os.path.join(self._tmpdir.name, "file%d" % index)
+            with open(path, "wb") as fp:
+                fp.write(b"content %d" % index)
+            self.paths.append(path)
+
+    def tearDown(self):
+        """Remove the scratch directory."""
+        self._tmpdir.cleanup()
+
+    def test_put_get(self):
+        """Digests are stored lowercase, and found by file."""
+        self.assertIsNone(self.cache.get(self.paths[0]))
+        self.cache.put(self.paths[0], "ABCDEF")
+        self.assertEqual(self.cache.get(self.paths[0]), "abcdef")
+        self.assertIsNone(self.cache.get(self.paths[1]))
+
+    def test_changed_file(self):
+        """Entries of files changed since they were hashed are dropped."""
+        self.cache.put(self.paths[0], "abcdef")
+        stat = os.stat(self.paths[0])
+        os.utime(self.paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(self.cache.get(self.paths[0]))
+        os.utime(self.paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertIsNone(self.cache.get(self.paths[0]))
+
+    def test_eviction(self):
+        """The least recently used entries are evicted beyond max_entries."""
+        self.cache.max_entries = 2
+        with unittest.mock.patch.object(HashCache, "EVICTION_INTERVAL", 1):
+            for path in self.paths:
+                self.cache.put(path, "abcdef")
+        self.assertIsNone(self.cache.get(self.paths[0]))
+        self.assertIsNotNone(self.cache.get(self.paths[1]))
+        self.assertIsNotNone(self.cache.get(self.paths[2]))
+
+    def test_file_sha1(self):
+        """Files are hashed once, then served from the cache."""
+        expected = hashlib.sha1(b"content 0").hexdigest()
+        self.assertEqual(self.cache.file_sha1(self.paths[0]), expected)
+        with unittest.mock.patch("zmwangx.hash.file_hash") as file_hash:
+            self.assertEqual(self.cache.file_sha1(self.paths[0]), expected)
+        file_hash.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
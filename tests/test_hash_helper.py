@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.hash_helper."""
+
+import hashlib
+import os
+import tempfile
+import threading
+import unittest
+
+from onedrive.hash_helper import IncrementalHasher
+
+class TestIncrementalHasher(unittest.TestCase):
+    """Tests of IncrementalHasher."""
+
+    def setUp(self):
+        """Make a file in a scratch directory."""
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmpdir.name, "file")
+        self.data = os.urandom(300000)
+        with open(self.path, "wb") as fp:
+            fp.write(self.data)
+        self.expected = hashlib.sha1(self.data).hexdigest()
+
+    def tearDown(self):
+        """Remove the scratch directory."""
+        self._tmpdir.cleanup()
+
+    def test_fed(self):
+        """Contiguous chunks are hashed, others ignored, the rest read from disk."""
+        hasher = IncrementalHasher(self.path)
+        hasher.feed(0, self.data[:1000])
+        hasher.feed(500, self.data[500:2000])
+        hasher.feed(5000, self.data[5000:6000])
+        hasher.feed(0, self.data[:100])
+        self.assertEqual(hasher.hexdigest(), self.expected)
+
+    def test_prefix_in_background(self):
+        """The prefix before start is hashed from disk."""
+        hasher = IncrementalHasher(self.path, start=100000)
+        for position in range(100000, 200000, 10000):
+            hasher.feed(position, self.data[position:position + 10000])
+        self.assertEqual(hasher.hexdigest(), self.expected)
+
+    def test_close(self):
+        """Closing stops the background thread, even with chunks queued."""
+        threads = threading.active_count()
+        with IncrementalHasher(self.path, start=100000) as hasher:
+            for position in range(100000, 100000 + 3 * 1000, 1000):
+                hasher.feed(position, self.data[position:position + 1000])
+            self.assertEqual(threading.active_count(), threads + 1)
+        self.assertEqual(threading.active_count(), threads)
+        # no-op once closed
+        hasher.feed(103000, self.data[103000:104000])
+        hasher.close()
+        with self.assertRaises(ValueError):
+            hasher.hexdigest()
+
+    def test_close_after_digest(self):
+        """Closing after getting the digest is fine."""
+        with IncrementalHasher(self.path, start=1000) as hasher:
+            self.assertEqual(hasher.hexdigest(), self.expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.index."""
+
+import configparser
+import os
+import pickle
+import tempfile
+import time
+import unittest
+import unittest.mock
+
+import onedrive.exceptions
+import onedrive.index
+from onedrive.index import RemoteIndex
+
+from tests.fakes import FakeClient
+
+TREE = {
+    "Docs": {
+        "Notes.txt": 10,
+        "Old": {"a.txt": 1, "b.txt": 2},
+    },
+    "Music": {"song.mp3": 300},
+    "readme": 5,
+}
+
+class TestRemoteIndex(unittest.TestCase):
+    """Tests of RemoteIndex."""
+
+    def setUp(self):
+        """Make an index in a scratch directory."""
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmpdir.name, "sub", "index.sqlite")
+        self.index = RemoteIndex(db_path=self.db_path)
+        self.client = FakeClient(TREE)
+
+    def tearDown(self):
+        """Remove the scratch directory."""
+        self._tmpdir.cleanup()
+
+    def test_normalize(self):
+        """Keys are normalized and case-folded."""
+        self.assertEqual(onedrive.index.normalize("/a//B/"), "a/b")
+        self.assertEqual(onedrive.index.normalize("/"), "")
+        self.assertEqual(onedrive.index.normalize("//"), "")
+
+    def test_unbuilt(self):
+        """Nothing is covered before a build."""
+        self.assertEqual(self.index.get("/Docs"), (False, None))
+        self.assertEqual(self.index.children("/Docs"), (False, None))
+        self.assertEqual(self.index.roots(), [])
+
+    def test_build_and_get(self):
+        """A built tree answers lookups, case-insensitively."""
+        self.assertEqual(self.index.build(self.client, "/", jobs=2), 9)
+        self.assertTrue(os.path.exists(self.db_path))
+        hit, metadata = self.index.get("/docs/notes.TXT")
+        self.assertTrue(hit)
+        self.assertEqual(metadata["name"], "Notes.txt")
+        self.assertEqual(metadata["size"], 10)
+        self.assertEqual(metadata["file"]["hashes"]["sha1Hash"], "%040X" % 10)
+        hit, metadata = self.index.get("/DOCS/old")
+        self.assertTrue(hit)
+        self.assertEqual(metadata["name"], "Old")
+        self.assertEqual(metadata["folder"], {"childCount": 2})
+        # absence from a covered tree means the item does not exist
+        self.assertEqual(self.index.get("/Docs/missing"), (True, None))
+
+    def test_children(self):
+        """Listings are sorted by name, with original case."""
+        self.index.build(self.client, "/")
+        hit, children = self.index.children("/")
+        self.assertTrue(hit)
+        self.assertEqual([child["name"] for child in children], ["Docs", "Music", "readme"])
+        self.assertEqual(self.index.children("/readme"), (True, []))
+        self.assertEqual(self.index.children("/missing"), (True, None))
+
+    def test_descendants(self):
+        """Everything under a directory is listed by normalized path."""
+        self.index.build(self.client, "/")
+        hit, descendants = self.index.descendants("/Docs")
+        self.assertTrue(hit)
+        self.assertEqual([path for path, _ in descendants],
+                         ["docs/notes.txt", "docs/old", "docs/old/a.txt", "docs/old/b.txt"])
+
+    def test_subtree_build(self):
+        """Only the built subtree is covered; roots keep their original case."""
+        self.index.build(self.client, "/Docs/")
+        self.assertTrue(self.index.get("/docs/old/a.txt")[0])
+        self.assertFalse(self.index.get("/Music")[0])
+        self.assertFalse(self.index.get("/")[0])
+        self.assertEqual([top for top, _ in self.index.roots()], ["/Docs"])
+
+    def test_nested_roots(self):
+        """Building a tree absorbs the trees nested in it."""
+        self.index.build(self.client, "/Docs/Old")
+        self.index.build(self.client, "/Docs")
+        self.assertEqual([top for top, _ in self.index.roots()], ["/Docs"])
+
+    def test_rebuild_replaces(self):
+        """A rebuild drops items that are gone."""
+        tree = {"d": {"x": 1, "y": 2}}
+        client = FakeClient(tree)
+        self.index.build(client, "/")
+        del tree["d"]["x"]
+        self.index.build(client, "/")
+        self.assertEqual(self.index.get("/d/x"), (True, None))
+        self.assertTrue(self.index.get("/d/y")[1])
+
+    def test_build_errors(self):
+        """Building a file or a missing path fails, and leaves no root."""
+        with self.assertRaises(onedrive.exceptions.NotADirectoryError):
+            self.index.build(self.client, "/readme")
+        with self.assertRaises(onedrive.exceptions.FileNotFoundError):
+            self.index.build(self.client, "/missing")
+        self.assertEqual(self.index.roots(), [])
+
+    def test_invalidate(self):
+        """Invalidated items and their ancestors are looked up remotely again."""
+        self.index.build(self.client, "/")
+        self.index.invalidate("/Docs/Old/a.txt")
+        self.assertFalse(self.index.get("/docs/old/a.txt")[0])
+        self.assertFalse(self.index.get("/docs/old")[0])
+        self.assertFalse(self.index.get("/")[0])
+        self.assertTrue(self.index.get("/docs/old/b.txt")[0])
+        self.assertTrue(self.index.get("/Music")[0])
+        # descendants of an ancestor of a dirty item are not complete
+        self.assertFalse(self.index.descendants("/Docs")[0])
+        self.assertTrue(self.index.descendants("/Music")[0])
+
+    def test_invalidate_subtree(self):
+        """Subtree invalidation covers all descendants."""
+        self.index.build(self.client, "/")
+        self.index.invalidate("/docs", subtree=True)
+        self.assertFalse(self.index.get("/Docs/Old/a.txt")[0])
+        self.assertTrue(self.index.get("/Music/song.mp3")[0])
+        # a later plain mark does not downgrade the subtree mark
+        self.index.invalidate("/Docs")
+        self.assertFalse(self.index.get("/Docs/Old/a.txt")[0])
+        # a rebuild clears the marks
+        self.index.build(self.client, "/")
+        self.assertTrue(self.index.get("/Docs/Old/a.txt")[0])
+
+    def test_max_age(self):
+        """Trees older than max_age are not used."""
+        index = RemoteIndex(db_path=self.db_path, max_age=60)
+        index.build(self.client, "/")
+        self.assertTrue(index.get("/readme")[0])
+        with unittest.mock.patch("time.time", return_value=time.time() + 120):
+            self.assertFalse(index.get("/readme")[0])
+        unlimited = RemoteIndex(db_path=self.db_path, max_age=None)
+        with unittest.mock.patch("time.time", return_value=time.time() + 10 ** 6):
+            self.assertTrue(unlimited.get("/readme")[0])
+
+    def test_lookups_during_build(self):
+        """The old index answers lookups until the new one is swapped in."""
+        tree = {"d": {"x": 1}}
+        client = FakeClient(tree)
+        self.index.build(client, "/")
+        tree["d"] = {"y": 1}
+        seen = []
+        iterchildren = client.iterchildren
+
+        def spying_iterchildren(path, fields=None):
+            """Look up the old index in the middle of the build."""
+            seen.append(self.index.get("/d/x"))
+            return iterchildren(path, fields=fields)
+
+        client.iterchildren = spying_iterchildren
+        self.index.build(client, "/", jobs=1)
+        self.assertTrue(seen)
+        self.assertTrue(all(hit and metadata is not None for hit, metadata in seen))
+        self.assertEqual(self.index.get("/d/x"), (True, None))
+        # the staging table is gone
+        connection = self.index._connection()  # pylint: disable=protected-access
+        self.assertIsNone(connection.execute(
+            "SELECT name FROM sqlite_temp_master WHERE name = 'staging'").fetchone())
+
+    def test_database_errors(self):
+        """Database errors make lookups miss, instead of raising."""
+        self.index.build(self.client, "/")
+        connection = self.index._connection()  # pylint: disable=protected-access
+        connection.execute("DROP TABLE items")
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(self.index.get("/readme"), (False, None))
+
+    def test_pickle(self):
+        """A pickled index reopens the same database."""
+        self.index.build(self.client, "/")
+        clone = pickle.loads(pickle.dumps(self.index))
+        self.assertTrue(clone.get("/readme")[1])
+
+    def test_from_config(self):
+        """The index section of the config configures the index."""
+        conf = configparser.ConfigParser()
+        self.assertIsNone(RemoteIndex.from_config(conf))
+        conf.read_dict({"index": {"db_path": self.db_path, "max_age": ""}})
+        index = RemoteIndex.from_config(conf)
+        self.assertEqual(index.db_path, self.db_path)
+        self.assertIsNone(index.max_age)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.metadata_cache."""
+
+import pickle
+import time
+import unittest
+import unittest.mock
+
+from onedrive.metadata_cache import MetadataCache
+
+class TestMetadataCache(unittest.TestCase):
+    """Tests of MetadataCache."""
+
+    def test_hit_and_miss(self):
+        """Entries are found by normalized path."""
+        cache = MetadataCache()
+        self.assertEqual(cache.get("a/b"), (False, None))
+        cache.put("/a//b/", {"name": "b"})
+        self.assertEqual(cache.get("a/b"), (True, {"name": "b"}))
+
+    def test_negative_entries(self):
+        """Missing items are cached as hits with no metadata."""
+        cache = MetadataCache()
+        cache.put_missing("/nope")
+        self.assertEqual(cache.get("/nope"), (True, None))
+
+    def test_ttl(self):
+        """Entries expire, negative ones after their own TTL."""
+        cache = MetadataCache(ttl=10, negative_ttl=5)
+        now = time.time()
+        with unittest.mock.patch("time.time", return_value=now):
+            cache.put("/a", {"name": "a"})
+            cache.put_missing("/b")
+        with unittest.mock.patch("time.time", return_value=now + 7):
+            self.assertEqual(cache.get("/a"), (True, {"name": "a"}))
+            self.assertEqual(cache.get("/b"), (False, None))
+        with unittest.mock.patch("time.time", return_value=now + 11):
+            self.assertEqual(cache.get("/a"), (False, None))
+
+    def test_zero_ttl(self):
+        """Nothing is cached with a TTL of zero."""
+        cache = MetadataCache(ttl=0)
+        cache.put("/a", {"name": "a"})
+        cache.put_missing("/b")
+        self.assertEqual(cache.get("/a"), (False, None))
+        self.assertEqual(cache.get("/b"), (False, None))
+
+    def test_lru(self):
+        """The least recently used entries are evicted first."""
+        cache = MetadataCache(max_entries=2)
+        cache.put("/a", {"name": "a"})
+        cache.put("/b", {"name": "b"})
+        cache.get("/a")
+        cache.put("/c", {"name": "c"})
+        self.assertTrue(cache.get("/a")[0])
+        self.assertFalse(cache.get("/b")[0])
+        self.assertTrue(cache.get("/c")[0])
+
+    def test_invalidate(self):
+        """Invalidation drops the path and its ancestors, not its siblings."""
+        cache = MetadataCache()
+        for path in ("/", "/a", "/a/b", "/a/b/c", "/a/x"):
+            cache.put(path, {})
+        cache.invalidate("/a/b")
+        self.assertFalse(cache.get("/")[0])
+        self.assertFalse(cache.get("/a")[0])
+        self.assertFalse(cache.get("/a/b")[0])
+        self.assertTrue(cache.get("/a/b/c")[0])
+        self.assertTrue(cache.get("/a/x")[0])
+
+    def test_invalidate_subtree(self):
+        """Subtree invalidation drops descendants, and nothing that merely shares a prefix."""
+        cache = MetadataCache()
+        for path in ("/a/b", "/a/b/c", "/a/b/c/d", "/a/bc"):
+            cache.put(path, {})
+        cache.invalidate("/a/b", subtree=True)
+        self.assertFalse(cache.get("/a/b/c")[0])
+        self.assertFalse(cache.get("/a/b/c/d")[0])
+        self.assertTrue(cache.get("/a/bc")[0])
+        cache.invalidate("/", subtree=True)
+        self.assertFalse(cache.get("/a/bc")[0])
+
+    def test_case_insensitive(self):
+        """Writes through one casing are seen through another."""
+        cache = MetadataCache()
+        cache.put("/Dir/x", {"name": "x"})
+        self.assertEqual(cache.get("/dir/X"), (True, {"name": "x"}))
+        cache.invalidate("/dir/x")
+        self.assertEqual(cache.get("/Dir/x"), (False, None))
+        cache.put_missing("/foo")
+        cache.put("/Foo", {"name": "Foo"})
+        self.assertEqual(cache.get("/foo"), (True, {"name": "Foo"}))
+        cache.put("/Dir/Sub/y", {"name": "y"})
+        cache.invalidate("/DIR", subtree=True)
+        self.assertEqual(cache.get("/dir/sub/y"), (False, None))
+
+    def test_pickle(self):
+        """A pickled cache comes back empty, with a working lock."""
+        cache = MetadataCache(ttl=10, max_entries=3)
+        cache.put("/a", {"name": "a"})
+        clone = pickle.loads(pickle.dumps(cache))
+        self.assertEqual((clone.ttl, clone.max_entries), (10, 3))
+        self.assertEqual(clone.get("/a"), (False, None))
+        clone.put("/a", {"name": "a"})
+        self.assertTrue(clone.get("/a")[0])
+        self.assertTrue(cache.get("/a")[0])
+
+if __name__ == "__main__":
+    unittest.main()
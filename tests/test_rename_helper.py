@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.rename_helper."""
+
+import unittest
+
+import onedrive.exceptions
+from onedrive.rename_helper import plan_renames
+
+def apply_plan(names, waves):
+    """Carry out a plan on a set of names, checking every move.
+
+    Each move must find its source and must not clobber an existing
+    item (compared case-insensitively), except when only the case of
+    the name changes.
+
+    """
+    names = {name.lower(): name for name in names}
+    for wave in waves:
+        for _, srcname, dstname in wave:
+            assert srcname.lower() in names, "source '%s' missing" % srcname
+            if dstname.lower() != srcname.lower():
+                assert dstname.lower() not in names, "'%s' clobbered" % dstname
+            del names[srcname.lower()]
+            names[dstname.lower()] = dstname
+    return sorted(names.values())
+
+class TestPlanRenames(unittest.TestCase):
+    """Tests of plan_renames."""
+
+    def test_independent(self):
+        """Renames to free names are made in one wave."""
+        waves, errors = plan_renames("/d", ["a", "b", "c"], [("a", "x"), ("b", "y")])
+        self.assertEqual(errors, {})
+        self.assertEqual(waves, [[(0, "a", "x"), (1, "b", "y")]])
+
+    def test_chain(self):
+        """a => b, b => c goes through a temporary name."""
+        names = ["a", "b"]
+        renames = [("a", "b"), ("b", "c")]
+        waves, errors = plan_renames("/d", names, renames)
+        self.assertEqual(errors, {})
+        self.assertEqual(len(waves), 2)
+        self.assertEqual(apply_plan(names, waves), ["b", "c"])
+
+    def test_cycle(self):
+        """A swap, and a longer cycle, are possible."""
+        for names, renames, expected in (
+                (["a", "b"], [("a", "b"), ("b", "a")], ["a", "b"]),
+                (["a", "b", "c"], [("a", "b"), ("b", "c"), ("c", "a")], ["a", "b", "c"]),
+        ):
+            waves, errors = plan_renames("/d", names, renames)
+            self.assertEqual(errors, {})
+            self.assertEqual(apply_plan(names, waves), expected)
+            # every rename ends up where it was asked to
+            final = {}
+            for wave in waves:
+                for index, _, dstname in wave:
+                    final[index] = dstname
+            self.assertEqual(final, {index: new for index, (_, new) in enumerate(renames)})
+
+    def test_temporary_names_are_free(self):
+        """Temporary names do not collide with existing names."""
+        names = ["a", "b", ".onedrive-rename-1-a"]
+        waves, errors = plan_renames("/d", names, [("a", "b"), ("b", "a")])
+        self.assertEqual(errors, {})
+        tempnames = [dstname for _, _, dstname in waves[0]]
+        self.assertNotIn(".onedrive-rename-1-a", tempnames)
+        self.assertEqual(apply_plan(names, waves), sorted(names))
+
+    def test_case_only(self):
+        """Changing only the case of a name is not a collision."""
+        waves, errors = plan_renames("/d", ["readme", "other"], [("readme", "README")])
+        self.assertEqual(errors, {})
+        self.assertEqual(waves, [[(0, "readme", "README")]])
+
+    def test_case_insensitive_collision(self):
+        """A new name taken by an item staying put is rejected, whatever its case."""
+        waves, errors = plan_renames("/d", ["a", "B"], [("a", "b")])
+        self.assertEqual(waves, [])
+        self.assertIsInstance(errors[0], onedrive.exceptions.FileExistsError)
+
+    def test_same_target(self):
+        """Renames to the same name are all rejected."""
+        waves, errors = plan_renames("/d", ["a", "b", "c"], [("a", "x"), ("b", "X"), ("c", "y")])
+        self.assertEqual(sorted(errors), [0, 1])
+        for index in (0, 1):
+            self.assertIsInstance(errors[index], onedrive.exceptions.FileExistsError)
+        self.assertEqual(waves, [[(2, "c", "y")]])
+
+    def test_blocked_chain(self):
+        """A rejected rename keeps its item in place, blocking renames to it."""
+        # b => c is rejected (c stays put), so a => b is rejected too
+        waves, errors = plan_renames("/d", ["a", "b", "c"], [("a", "b"), ("b", "c")])
+        self.assertEqual(waves, [])
+        self.assertEqual(sorted(errors), [0, 1])
+
+    def test_renamed_more_than_once(self):
+        """An item cannot be renamed more than once, whatever the case."""
+        waves, errors = plan_renames("/d", ["a", "b"], [("a", "x"), ("A", "y"), ("b", "z")])
+        self.assertEqual(sorted(errors), [0, 1])
+        for index in (0, 1):
+            self.assertIsInstance(errors[index], onedrive.exceptions.PermissionError)
+            self.assertIn("more than once", str(errors[index]))
+        self.assertEqual(waves, [[(2, "b", "z")]])
+
+    def test_missing(self):
+        """Renaming a missing item is rejected."""
+        waves, errors = plan_renames("/d", ["a"], [("nope", "x"), ("a", "y")])
+        self.assertIsInstance(errors[0], onedrive.exceptions.FileNotFoundError)
+        self.assertEqual(waves, [[(1, "a", "y")]])
+
+    def test_invalid_names(self):
+        """Empty names, names with slashes, . and .. are rejected."""
+        renames = [("a", ""), ("b", "x/y"), ("c", "."), ("d", "..")]
+        waves, errors = plan_renames("/d", ["a", "b", "c", "d"], renames)
+        self.assertEqual(waves, [])
+        self.assertEqual(sorted(errors), [0, 1, 2, 3])
+        for error in errors.values():
+            self.assertIsInstance(error, onedrive.exceptions.PermissionError)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.retry, and of retries by the OAuth client."""
+
+import configparser
+import unittest
+
+from onedrive.retry import RetryPolicy
+
+from tests.server import StandInServer, make_client
+
+class FakeResponse(object):
+    """Response with a status code and headers."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, status_code, headers=None):
+        """Init."""
+        self.status_code = status_code
+        self.headers = headers or {}
+
+class TestRetryPolicy(unittest.TestCase):
+    """Tests of RetryPolicy."""
+
+    def test_should_retry(self):
+        """Transient errors are retried within the attempt budget."""
+        policy = RetryPolicy(max_attempts=3)
+        self.assertTrue(policy.should_retry(1))
+        self.assertTrue(policy.should_retry(2, FakeResponse(429)))
+        self.assertFalse(policy.should_retry(3, FakeResponse(429)))
+        self.assertFalse(policy.should_retry(1, FakeResponse(404)))
+
+    def test_delay(self):
+        """Retry-After is honored (and capped); otherwise, backoff with jitter."""
+        policy = RetryPolicy(base_delay=1, max_delay=8, max_retry_after=100)
+        self.assertEqual(policy.delay(1, FakeResponse(429, {"Retry-After": "30"})), 30)
+        self.assertEqual(policy.delay(1, FakeResponse(429, {"Retry-After": "1000"})), 100)
+        for attempt, backoff in ((1, 1), (3, 4), (10, 8)):
+            delay = policy.delay(attempt, FakeResponse(503))
+            self.assertTrue(backoff / 2 <= delay <= backoff)
+
+    def test_excluding(self):
+        """A policy can leave some status codes alone, without changing the original."""
+        policy = RetryPolicy()
+        no500 = policy.excluding(500)
+        self.assertFalse(no500.should_retry(1, FakeResponse(500)))
+        self.assertTrue(no500.should_retry(1, FakeResponse(503)))
+        self.assertTrue(policy.should_retry(1, FakeResponse(500)))
+        self.assertEqual(no500.max_attempts, policy.max_attempts)
+
+    def test_from_config(self):
+        """Options of the retry section are used, others are defaults."""
+        conf = configparser.ConfigParser()
+        self.assertEqual(RetryPolicy.from_config(conf).max_attempts, 5)
+        conf.read_dict({"retry": {"max_attempts": "8", "upload_max_attempts": "30"}})
+        policy = RetryPolicy.from_config(conf)
+        self.assertEqual((policy.max_attempts, policy.upload_max_attempts), (8, 30))
+        self.assertEqual(policy.base_delay, 1)
+
+class TestClientRetry(unittest.TestCase):
+    """Tests of retries by onedrive.auth.OneDriveOAuthClient.request."""
+
+    def setUp(self):
+        """Count requests to an endpoint always failing with HTTP 500."""
+        self.count = 0
+
+    def fail(self, body):
+        """Fail with HTTP 500."""
+        # pylint: disable=unused-argument
+        self.count += 1
+        return 500, {}, {"status": "failed", "statusDescription": "copy failed"}
+
+    def test_retry(self):
+        """Transient errors are retried up to max_attempts."""
+        with StandInServer({("GET", "/monitor"): self.fail}) as server:
+            client = make_client(server.url, RetryPolicy(max_attempts=3, base_delay=0))
+            self.assertEqual(client.get("monitor").status_code, 500)
+        self.assertEqual(self.count, 3)
+
+    def test_policy_override(self):
+        """The policy can be overridden per request."""
+        with StandInServer({("GET", "/monitor"): self.fail}) as server:
+            client = make_client(server.url, RetryPolicy(max_attempts=3, base_delay=0))
+            response = client.get("monitor", retry_policy=client.retry_policy.excluding(500))
+            self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.util."""
+
+import os
+import pickle
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+import requests
+
+import onedrive.util
+
+class TestPaths(unittest.TestCase):
+    """Tests of the URL and path helpers."""
+
+    def test_pop_query_from_url(self):
+        """Only the given query variable is stripped."""
+        self.assertEqual(onedrive.util.pop_query_from_url(
+            "https://example.com/a?access_token=1&b=2", "access_token"),
+                         "https://example.com/a?b=2")
+        self.assertEqual(onedrive.util.pop_query_from_url("https://example.com/a", "x"),
+                         "https://example.com/a")
+
+    def test_normalized_paths(self):
+        """Paths are normalized."""
+        self.assertEqual(onedrive.util.normalized_posixpath("a//b/./c"), "a/b/c")
+        self.assertEqual(onedrive.util.normalized_ospath("a//b/./c"),
+                         os.path.join("a", "b", "c"))
+
+    def test_data_dir(self):
+        """The data directory honors XDG_DATA_HOME."""
+        with unittest.mock.patch.dict(os.environ, {"XDG_DATA_HOME": "/xdg"}):
+            self.assertEqual(onedrive.util.data_dir(), "/xdg/onedrive")
+        with unittest.mock.patch.dict(os.environ):
+            os.environ.pop("XDG_DATA_HOME", None)
+            self.assertEqual(onedrive.util.data_dir(),
+                             os.path.expanduser("~/.local/share/onedrive"))
+
+class TestMountPooledAdapter(unittest.TestCase):
+    """Tests of mount_pooled_adapter."""
+
+    def test_replaces_and_closes(self):
+        """The new adapter is mounted for both schemes, and the old ones closed."""
+        session = requests.Session()
+        old_adapters = [session.adapters["https://"], session.adapters["http://"]]
+        with unittest.mock.patch.object(requests.adapters.HTTPAdapter, "close") as close:
+            onedrive.util.mount_pooled_adapter(session, 42)
+        self.assertEqual(close.call_count, len(old_adapters))
+        adapter = session.adapters["https://"]
+        self.assertIs(session.adapters["http://"], adapter)
+        self.assertEqual(adapter._pool_maxsize, 42)  # pylint: disable=protected-access
+        session.close()
+
+class Guarded(onedrive.util.PicklableWithLock):
+    """Example of an object guarded by a lock."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        """Init."""
+        self.value = 1
+        self._lock = threading.Lock()
+
+class TestPicklableWithLock(unittest.TestCase):
+    """Tests of PicklableWithLock."""
+
+    def test_pickle(self):
+        """The state survives pickling, with a new lock."""
+        obj = Guarded()
+        with obj._lock:  # pylint: disable=protected-access
+            clone = pickle.loads(pickle.dumps(obj))
+        self.assertEqual(clone.value, 1)
+        self.assertTrue(clone._lock.acquire(blocking=False))  # pylint: disable=protected-access
+
+class TestSQLiteConnections(unittest.TestCase):
+    """Tests of SQLiteConnections."""
+
+    def setUp(self):
+        """Make a scratch directory."""
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmpdir.name, "sub", "test.sqlite")
+        self.connections = onedrive.util.SQLiteConnections(
+            self.db_path, ["CREATE TABLE IF NOT EXISTS t (x INTEGER)"])
+
+    def tearDown(self):
+        """Remove the scratch directory."""
+        self._tmpdir.cleanup()
+
+    def test_schema_and_wal(self):
+        """The database, its directory and schema are made, in WAL mode."""
+        connection = self.connections.get()
+        self.assertTrue(os.path.exists(self.db_path))
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        connection.execute("INSERT INTO t VALUES (1)")
+        connection.commit()
+
+    def test_per_thread(self):
+        """Each thread gets its own connection, reused within the thread."""
+        main_connection = self.connections.get()
+        self.assertIs(self.connections.get(), main_connection)
+        others = []
+        thread = threading.Thread(target=lambda: others.append(self.connections.get()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(others[0], main_connection)
+
+    def test_pickle(self):
+        """Connections are not pickled; the clone opens its own."""
+        main_connection = self.connections.get()
+        clone = pickle.loads(pickle.dumps(self.connections))
+        self.assertEqual(clone.db_path, self.db_path)
+        self.assertIsNot(clone.get(), main_connection)
+
+if __name__ == "__main__":
+    unittest.main()
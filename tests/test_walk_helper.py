@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""Tests of onedrive.walk_helper."""
+
+import posixpath
+import time
+import unittest
+
+from onedrive.walk_helper import walkn
+
+from tests.fakes import FakeClient
+
+def make_tree(depth, fanout):
+    """Make a tree of directories, each with one file."""
+    tree = {"file": 1}
+    if depth > 0:
+        for index in range(fanout):
+            tree["d%d" % index] = make_tree(depth - 1, fanout)
+    return tree
+
+def serial_walk(client, top, level=0, topdown=True):
+    """Reference serial walk, yielding paths only."""
+    dirs = []
+    files = []
+    for item in client.iterchildren(top):
+        (dirs if "folder" in item else files).append(item["name"])
+    if topdown:
+        yield level, top, dirs, files
+    for name in dirs:
+        yield from serial_walk(client, posixpath.join(top, name), level + 1, topdown)
+    if not topdown:
+        yield level, top, dirs, files
+
+class TestWalkn(unittest.TestCase):
+    """Tests of walkn."""
+
+    def setUp(self):
+        """Make a client serving a tree of 40 directories."""
+        self.client = FakeClient(make_tree(3, 3))
+
+    def test_ordered(self):
+        """Ordered walks match the serial walk, top-down and bottom-up."""
+        for topdown in (True, False):
+            expected = list(serial_walk(self.client, "/", topdown=topdown))
+            self.assertEqual(len(expected), 40)
+            for jobs in (1, 4):
+                self.assertEqual(list(walkn(self.client, "/", topdown=topdown, paths_only=True,
+                                            jobs=jobs)), expected)
+
+    def test_unordered(self):
+        """Unordered walks generate the same tuples, parents first."""
+        expected = list(serial_walk(self.client, "/"))
+        tuples = list(walkn(self.client, "/", paths_only=True, jobs=4, ordered=False))
+        self.assertEqual(sorted(tuples), sorted(expected))
+        seen = set()
+        for _, path, _, _ in tuples:
+            if path != "/":
+                self.assertIn(posixpath.dirname(path), seen)
+            seen.add(path)
+        with self.assertRaises(ValueError):
+            list(walkn(self.client, "/", topdown=False, ordered=False))
+
+    def test_metadata(self):
+        """Without paths_only, metadata objects are generated."""
+        level, metadata, dirs, files = next(walkn(self.client, "/d1", level=2, jobs=2))
+        self.assertEqual(level, 2)
+        self.assertEqual(metadata["name"], "d1")
+        self.assertEqual([item["name"] for item in dirs], ["d0", "d1", "d2"])
+        self.assertEqual([item["name"] for item in files], ["file"])
+
+    def test_pruning(self):
+        """Pruned subdirectories are not walked."""
+        for ordered in (True, False):
+            paths = []
+            for _, path, dirs, _ in walkn(self.client, "/", paths_only=True, jobs=4,
+                                          ordered=ordered):
+                paths.append(path)
+                dirs[:] = [name for name in dirs if name != "d0"]
+            self.assertEqual(len(paths), 1 + 2 + 4 + 8)
+            self.assertFalse([path for path in paths if "/d0" in path])
+
+    def test_bounded_lookahead(self):
+        """Listings are only fetched a bounded distance ahead of the consumer."""
+        jobs = 2
+        walk = walkn(self.client, "/", paths_only=True, jobs=jobs)
+        next(walk)
+        time.sleep(0.2)
+        self.assertLessEqual(len(self.client.listed), 1 + 2 * jobs)
+        walk.close()
+
+if __name__ == "__main__":
+    unittest.main()